@@ -4,13 +4,14 @@ import math
 import time
 import copy
 import json
-from PIL import Image, ImageDraw, ImageFont, ImageEnhance, ImageTk
 from tooltip import Tooltip
 from tools import TextToolDialog
 from utils import rotate_point
 from raster import SimpleRasterization
 from pixel_buffer import PixelBuffer
 from ui_setup import setup_ui
+from layers import LayerRegistry
+from selection import SelectionSet
 
 
 class DrawingApp(ctk.CTk):
@@ -27,6 +28,9 @@ class DrawingApp(ctk.CTk):
         self.current_fill_color = ""
         self.grid_visible = False
         self.grid_spacing = 25
+        self.grid_adaptive = False  # 自适应间距：网格随缩放变化，并按 2 的幂合并/细分
+        self._grid_item = None  # 网格位图对应的 Canvas 图像项
+        self._grid_cache = {}  # (尺寸, 间距, 相位) -> 网格 PhotoImage
         self.drawing_mode = "library"
         self.use_rasterization = False
         self.rasterization_algorithm = "Bresenham"
@@ -45,7 +49,7 @@ class DrawingApp(ctk.CTk):
         self.preview_line = None
         self.CLOSING_TOLERANCE = 15
         self.current_polygon_tag = None
-        self.selection_group = set()
+        self.selection_group = SelectionSet(self)  # 选中对象标签集合（缓存各对象包围盒）
         self.last_x = 0
         self.last_y = 0
         self.current_stroke_tag = None
@@ -53,6 +57,13 @@ class DrawingApp(ctk.CTk):
         self.drag_handle_type = None
         self.original_bbox = None
         self.drag_mode = None
+        self.move_drag = None  # 移动拖拽会话：累计的逻辑位移 {'dx', 'dy'}
+        self.marquee = None  # 框选会话（空间索引、橡皮筋矩形与当前命中）
+        self.erase_session = None  # 局部橡皮擦会话（空间索引、上一点、本次拖动已复制的位图）
+        self.use_transform_proxy = True  # 旋转/缩放拖拽时用缓存位图的仿射变换预览，松开后再完整光栅化
+        self._proxy_sources = {}  # 对象标签 -> (拖拽开始时的显示位图, 屏幕 x, 屏幕 y)
+        self._proxy_pending = {}  # 对象标签 -> (图像项ID, 松开时要光栅化的最终状态)
+        self.last_frame_ms = 0.0  # 最近一次变换拖拽的单帧耗时
         self.object_states = {}
         self.rotation_handle_id = None
         self.drag_start_angle = 0
@@ -62,13 +73,28 @@ class DrawingApp(ctk.CTk):
         self.original_group_states = {}
         self.clipboard = None
         self.eraser_mode = "局部"
+        self.fill_tolerance = 0  # 油漆桶颜色容差（0-128，各通道允许的最大差值）
         self.history_stack = []
         self.history_limit = 50
         self.layers = []
+        self.layer_registry = LayerRegistry()  # 图层ID下标索引与图层对象成员关系
         self.active_layer_id = None
         self.layer_counter = 0
         self.layer_ui_widgets = {}
+        self._layer_ui_order = []  # 图层面板当前的行顺序（自上而下的图层ID）
+        self.layer_ui_stats = {'created': 0, 'destroyed': 0, 'updated': 0, 'reordered': 0}  # 图层面板控件操作计数
         self._image_references = {}
+        self._raster_render_keys = {}  # 图像项 -> (显示位图 id, 采样参数)，缩放比例未变时跳过重新采样
+        self._surface_image_cache = {}  # 曲面填充模式的缓存位图（按曲面标签）
+
+        # --- 图层离屏缓存（非编辑图层以合成位图显示） ---
+        self.use_layer_cache = True
+        self.layer_caches = {}  # 图层ID -> LayerCache
+        self._composited_layers = set()  # 当前以合成位图显示的图层ID
+        self._composite_items = {}  # 合成分组标签 -> Canvas图像项ID
+        self._composite_signatures = {}  # 合成分组标签 -> 上次合成时的输入签名
+        self._live_stipples = {}  # 直接显示的图层ID -> 当前点画图案（近似不透明度）
+        self._opacity_refresh_job = None  # 合并不透明度滑块连续变化的延迟任务
         
         # --- 曲线和曲面工具状态 ---
         self.curve_tool = None  # 当前曲线工具实例
@@ -90,8 +116,9 @@ class DrawingApp(ctk.CTk):
         self.zoom_min = 0.1
         self.zoom_max = 5.0
         
-        # 定义默认画布逻辑尺寸 (2000x1500)
+        # 定义默认画布逻辑尺寸 (2000x1500)，可通过“视图 -> 画布尺寸”修改
         self.logical_canvas_size = (2000, 1500)
+        self.max_logical_canvas_side = 100000
         
         # UI 已从此文件抽取到 ui_setup.setup_ui
         setup_ui(self)
@@ -141,11 +168,15 @@ class DrawingApp(ctk.CTk):
         
         viewmenu = Menu(menubar, tearoff=0)
         viewmenu.add_checkbutton(label="显示网格", onvalue=1, offvalue=0, command=self.toggle_grid)
+        viewmenu.add_checkbutton(label="自适应网格间距", onvalue=1, offvalue=0, command=self.toggle_grid_adaptive)
+        viewmenu.add_command(label="画布尺寸...", command=self.ask_logical_canvas_size)
         menubar.add_cascade(label="视图", menu=viewmenu)
         
         transformmenu = Menu(menubar, tearoff=0)
         transformmenu.add_command(label="左右翻转", command=self.flip_horizontal_selection, accelerator="Ctrl+H")
         transformmenu.add_command(label="上下翻转", command=self.flip_vertical_selection, accelerator="Ctrl+Shift+V")
+        transformmenu.add_command(label="顺时针旋转90°", command=self.rotate_selection_clockwise)
+        transformmenu.add_command(label="逆时针旋转90°", command=self.rotate_selection_counterclockwise)
         menubar.add_cascade(label="变换", menu=transformmenu)
 
         self.config(menu=menubar)
@@ -154,7 +185,7 @@ class DrawingApp(ctk.CTk):
         items_data = []
         for item_id in self.canvas.find_all():
             tags = self.canvas.gettags(item_id)
-            if "handle" in tags or "grid_line" in tags: continue
+            if "handle" in tags or "grid_line" in tags or "layer_composite" in tags: continue
 
             item_type = self.canvas.type(item_id)
             coords = self.canvas.coords(item_id)
@@ -186,7 +217,7 @@ class DrawingApp(ctk.CTk):
         items_data = []
         for item_id in self.canvas.find_all():
             tags = self.canvas.gettags(item_id)
-            if "handle" in tags or "grid_line" in tags:
+            if "handle" in tags or "grid_line" in tags or "layer_composite" in tags:
                 continue
 
             item_type = self.canvas.type(item_id)
@@ -259,181 +290,8 @@ class DrawingApp(ctk.CTk):
             messagebox.showerror("打开失败", f"打开项目时发生错误: \n{e}")
 
     def export_as_image(self):
-        """导出画布为图片，彻底修复曲面塌陷与分辨率问题"""
-        if self.selection_group:
-            self._clear_resize_handles()
-            self.selection_group.clear()
-            self.canvas.update_idletasks()
-
-        file_path = filedialog.asksaveasfilename(
-            defaultextension=".png",
-            filetypes=[("PNG 文件", "*.png"), ("JPEG 文件", "*.jpg")],
-            title="导出为图片"
-        )
-        if not file_path: return
-
-        try:
-            from coordinate_system import get_logical_bounding_box
-            from surfaces import BezierSurface
-            from curves import BezierCurve, BSplineCurve
-            
-            # 1. 计算逻辑边界
-            content_bbox = get_logical_bounding_box(self)
-            
-            # 定义标准画布边界 (0, 0, 2000, 1500)
-            # 这样导出的图片至少是这个尺寸，且包含所有内容
-            canvas_w, canvas_h = getattr(self, 'logical_canvas_size', (2000, 1500))
-            canvas_x1, canvas_y1, canvas_x2, canvas_y2 = 0, 0, canvas_w, canvas_h
-
-            if content_bbox is None:
-                # 如果没有内容，导出空白的标准画布
-                lx1, ly1, lx2, ly2 = canvas_x1, canvas_y1, canvas_x2, canvas_y2
-            else:
-                # 取并集：(内容包围盒) U (标准画布)
-                bx1, by1, bx2, by2 = content_bbox
-                lx1 = min(bx1, canvas_x1)
-                ly1 = min(by1, canvas_y1)
-                lx2 = max(bx2, canvas_x2)
-                ly2 = max(by2, canvas_y2)
-
-            margin = 50 # 逻辑边距
-            export_lx, export_ly = lx1 - margin, ly1 - margin
-            logical_w = (lx2 - lx1) + 2 * margin
-            logical_h = (ly2 - ly1) + 2 * margin
-
-            # 2. 【核心修复】：计算导出缩放比例
-            # 目标：确保导出的图片长边至少为 2000 像素，以保证曲面网格不塌陷
-            # 改进：基于长边计算，防止瘦高图形导致内存溢出
-            max_dim = max(logical_w, logical_h, 1)
-            export_scale = 2000.0 / max_dim
-            export_scale = max(export_scale, 2.0) # 至少放大2倍，保证清晰度
-
-            # 安全检查：防止生成过大的图片导致崩溃 (限制最大边长为 8000)
-            final_w = logical_w * export_scale
-            final_h = logical_h * export_scale
-            max_side = max(final_w, final_h)
-            
-            MAX_SIDE_LIMIT = 8000
-            if max_side > MAX_SIDE_LIMIT:
-                reduction = MAX_SIDE_LIMIT / max_side
-                export_scale *= reduction
-
-            width = int(logical_w * export_scale)
-            height = int(logical_h * export_scale)
-
-            # 3. 创建高分辨率画布
-            final_image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
-
-            for layer in self.layers:
-                if not layer['visible']: continue
-                layer_id = layer['id']
-                layer_image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
-                draw = ImageDraw.Draw(layer_image)
-
-                for unique_tag, state in self.object_states.items():
-                    # 图层过滤
-                    items = list(self.canvas.find_withtag(unique_tag))
-                    if not items or layer_id not in self.canvas.gettags(items[0]):
-                        continue
-
-                    # --- A. 处理曲面 (修复重点) ---
-                    if 'control_grid' in state:
-                        surface = BezierSurface(state['control_grid'])
-                        color = state.get('color', '#FFFFFF')
-                        if state.get('display_mode') == 'wireframe':
-                            u_curves, v_curves = surface.get_isocurves(10, 10)
-                            for curve in u_curves + v_curves:
-                                pts = []
-                                for p in curve:
-                                    pts.append((p[0] - export_lx) * export_scale)
-                                    pts.append((p[1] - export_ly) * export_scale)
-                                if len(pts) >= 4:
-                                    draw.line(pts, fill=color, width=max(1, int(export_scale/2)))
-                        else:
-                            mesh_pts, faces = surface.generate_mesh(20, 20)
-                            for face in faces:
-                                tri = [mesh_pts[i] for i in face]
-                                pts = [((p[0]-export_lx)*export_scale, (p[1]-export_ly)*export_scale) for p in tri]
-                                avg_z = (tri[0][2] + tri[1][2] + tri[2][2]) / 3
-                                gray = int(max(0, min(255, (avg_z + 50) * 2.55)))
-                                draw.polygon(pts, fill=f'#{gray:02x}{gray:02x}{gray:02x}')
-
-                    # --- B. 处理光栅化图形 ---
-                    elif 'original_pil_image' in state or 'original_pil_image_b64' in state:
-                        pil_img = state.get('original_pil_image')
-                        # 尝试从 Base64 恢复图片（针对刚加载的项目）
-                        if pil_img is None and state.get('original_pil_image_b64'):
-                            try:
-                                import base64, io
-                                data = base64.b64decode(state['original_pil_image_b64'])
-                                pil_img = Image.open(io.BytesIO(data)).convert('RGBA')
-                            except:
-                                pil_img = None
-                        
-                        if pil_img:
-                            pil_img = pil_img.copy()
-                            # 旋转
-                            angle = state.get('angle', 0)
-                            if angle != 0:
-                                pil_img = pil_img.rotate(-angle, expand=True, resample=Image.Resampling.BICUBIC)
-                            
-                            # 获取逻辑位置和尺寸（兼容性修复）
-                            lx, ly, lw, lh = 0, 0, 0, 0
-                            if 'start_xy' in state and 'end_xy' in state:
-                                lx, ly = state['start_xy']
-                                lw = abs(state['end_xy'][0] - state['start_xy'][0])
-                                lh = abs(state['end_xy'][1] - state['start_xy'][1])
-                            elif 'original_coords' in state and len(state['original_coords']) >= 2:
-                                lx, ly = state['original_coords'][0], state['original_coords'][1]
-                                # 如果没有记录尺寸，默认使用图片原始尺寸
-                                lw = pil_img.width
-                                lh = pil_img.height
-                            else:
-                                continue # 无法确定位置，跳过
-
-                            # 缩放至匹配 export_scale
-                            target_w = int(lw * export_scale)
-                            target_h = int(lh * export_scale)
-                            pil_img = pil_img.resize((max(1, target_w), max(1, target_h)), Image.Resampling.LANCZOS)
-                            
-                            img_x = int((lx - export_lx) * export_scale)
-                            img_y = int((ly - export_ly) * export_scale)
-                            layer_image.paste(pil_img, (img_x, img_y), pil_img)
-
-                    # --- C. 处理矢量形状 (直线、矩形等) ---
-                    elif 'original_coords' in state:
-                        l_coords = state['original_coords']
-                        ex_pts = [(c - export_lx if i%2==0 else c - export_ly) * export_scale for i, c in enumerate(l_coords)]
-                        
-                        item_type = self.canvas.type(items[0])
-                        # 获取颜色逻辑修复（详见之前的分析）
-                        try:
-                            f = self.canvas.itemcget(items[0], "fill")
-                            o = self.canvas.itemcget(items[0], "outline") if item_type != "line" else f
-                            w = int(float(self.canvas.itemcget(items[0], "width") or 1) * export_scale)
-                        except: f, o, w = "#FFFFFF", "#FFFFFF", int(export_scale)
-
-                        if item_type == "line": draw.line(ex_pts, fill=f, width=w)
-                        elif item_type == "rectangle": draw.rectangle(ex_pts, fill=f or None, outline=o, width=w)
-                        elif item_type == "oval": draw.ellipse(ex_pts, fill=f or None, outline=o, width=w)
-                        elif item_type == "polygon": draw.polygon(ex_pts, fill=f or None, outline=o)
-
-                # 合成图层
-                opacity = layer.get('opacity', 1.0)
-                if opacity < 1.0:
-                    alpha = layer_image.split()[3]
-                    alpha = ImageEnhance.Brightness(alpha).enhance(opacity)
-                    layer_image.putalpha(alpha)
-                final_image = Image.alpha_composite(final_image, layer_image)
-
-            # 4. 加上背景色
-            bg = Image.new("RGB", (width, height), self.canvas_bg_color)
-            bg.paste(final_image, (0, 0), final_image)
-            bg.save(file_path)
-            messagebox.showinfo("成功", f"图片导出成功！分辨率: {width}x{height}")
-
-        except Exception as e:
-            messagebox.showerror("导出失败", f"错误详情: {str(e)}")
+        from export import export_as_image as _export_as_image
+        return _export_as_image(self)
 
     def copy_selection(self, event=None):
         if not self.selection_group or self.current_tool != "select":
@@ -444,10 +302,8 @@ class DrawingApp(ctk.CTk):
         if not bbox: return
         
         min_x, min_y = bbox[0], bbox[1]
-        from coordinate_system import screen_to_logical
-        self.canvas.update_idletasks()
-        canvas_width = max(self.canvas.winfo_width(), 1)
-        canvas_height = max(self.canvas.winfo_height(), 1)
+        from coordinate_system import screen_to_logical, affine_transform_flat, pack_coords, unpack_coords
+        canvas_width, canvas_height = self.viewport.size
 
         origin_logical = screen_to_logical(
             [min_x, min_y],
@@ -479,18 +335,13 @@ class DrawingApp(ctk.CTk):
                 item_group_data['tool'] = state.get('tool', None)
                 item_group_data['state'] = state
             
-            for item_id in self.canvas.find_withtag(unique_tag):
+            item_ids = self.canvas.find_withtag(unique_tag)
+            # 对象的所有部件一次性换算为相对于选区原点的逻辑坐标
+            flat, offsets = pack_coords([self.canvas.coords(item_id) for item_id in item_ids])
+            flat = screen_to_logical(flat, self.zoom_level, self.pan_offset_x, self.pan_offset_y, canvas_width, canvas_height)
+            flat = affine_transform_flat(flat, 1.0, -origin_logical[0], -origin_logical[1])
+            for item_id, relative_coords in zip(item_ids, unpack_coords(flat, offsets)):
                 item_type = self.canvas.type(item_id)
-                coords = self.canvas.coords(item_id)
-                logical_coords = screen_to_logical(
-                    coords,
-                    self.zoom_level,
-                    self.pan_offset_x,
-                    self.pan_offset_y,
-                    canvas_width,
-                    canvas_height
-                )
-                relative_coords = [(lc - origin_logical[0]) if i % 2 == 0 else (lc - origin_logical[1]) for i, lc in enumerate(logical_coords)]
                 
                 options = {}
                 copy_keys = ['width', 'fill', 'outline', 'capstyle', 'smooth', 'joinstyle', 'dash', 'tags', 'text', 'font', 'anchor']
@@ -514,10 +365,8 @@ class DrawingApp(ctk.CTk):
         self._clear_resize_handles()
         self.selection_group.clear()
 
-        from coordinate_system import logical_to_screen, screen_to_logical
-        self.canvas.update_idletasks()
-        canvas_width = max(self.canvas.winfo_width(), 1)
-        canvas_height = max(self.canvas.winfo_height(), 1)
+        from coordinate_system import logical_to_screen, screen_to_logical, affine_transform_flat
+        canvas_width, canvas_height = self.viewport.size
 
         origin_logical = self.clipboard.get('origin_logical', (0, 0))
         offset_logical_x = 20 / self.zoom_level
@@ -549,11 +398,11 @@ class DrawingApp(ctk.CTk):
                         canvas_height
                     ) if rel_logical else []
 
-                abs_logical = []
-                for i, coord in enumerate(rel_logical):
-                    base = origin_logical[0] if i % 2 == 0 else origin_logical[1]
-                    offset = offset_logical_x if i % 2 == 0 else offset_logical_y
-                    abs_logical.append(coord + base + offset)
+                abs_logical = affine_transform_flat(
+                    rel_logical, 1.0,
+                    origin_logical[0] + offset_logical_x,
+                    origin_logical[1] + offset_logical_y
+                ).tolist()
 
                 screen_coords = logical_to_screen(
                     abs_logical,
@@ -580,7 +429,12 @@ class DrawingApp(ctk.CTk):
                 pil_img = state_copy['original_pil_image']
                 pil_img_copy = pil_img.copy()
 
-                # 调整逻辑坐标基于偏移
+                # 调整逻辑坐标基于偏移（位图矩阵在平移前取出，旧状态的矩阵由锚点推出）
+                from transform import raster_matrix, show_raster
+                ma, mb, mc, md, me, mf = raster_matrix(state_copy)
+                state_copy['matrix'] = (ma, mb, mc + offset_logical_x, md, me, mf + offset_logical_y)
+                state_copy['original_pil_image'] = pil_img_copy
+
                 def _shift_point(pt):
                     return (pt[0] + offset_logical_x, pt[1] + offset_logical_y)
 
@@ -594,47 +448,31 @@ class DrawingApp(ctk.CTk):
                         base = offset_logical_x if i % 2 == 0 else offset_logical_y
                         shifted.append(coord + base)
                     state_copy['original_coords'] = shifted
-
-                logical_pos = None
-                if 'start_xy' in state_copy:
-                    logical_pos = state_copy['start_xy']
-                elif 'original_coords' in state_copy and len(state_copy['original_coords']) >= 2:
-                    logical_pos = (state_copy['original_coords'][0], state_copy['original_coords'][1])
-
-                if logical_pos:
-                    screen_pos = logical_to_screen(
-                        list(logical_pos),
-                        self.zoom_level,
-                        self.pan_offset_x,
-                        self.pan_offset_y,
-                        canvas_width,
-                        canvas_height
-                    )
-
-                    display_img = pil_img_copy
-                    if self.zoom_level != 1.0:
-                        new_w = max(int(pil_img_copy.width * self.zoom_level), 1)
-                        new_h = max(int(pil_img_copy.height * self.zoom_level), 1)
-                        display_img = pil_img_copy.resize((new_w, new_h), Image.Resampling.LANCZOS)
-
-                    tk_img = ImageTk.PhotoImage(display_img)
-                    new_tags = [t for t in (item_group_data.get('parts')[0].get('options', {}).get('tags', []) if item_group_data.get('parts') else []) if not (t.startswith('shape_') or t.startswith('stroke_') or t.startswith('layer_'))]
-                    new_tags.extend([new_unique_tag, self.active_layer_id])
-                    img_id = self.canvas.create_image(screen_pos[0], screen_pos[1], image=tk_img, anchor='nw', tags=tuple(new_tags))
-                    self._image_references[img_id] = tk_img
-
-                    state_copy['angle'] = state_copy.get('angle', item_group_data.get('angle', 0))
-                    state_copy['zoom_ref'] = self.zoom_level
-                    state_copy['pan_ref_x'] = self.pan_offset_x
-                    state_copy['pan_ref_y'] = self.pan_offset_y
-                    self.object_states[new_unique_tag] = state_copy
+                if state_copy.get('points'):
+                    state_copy['points'] = [_shift_point(p) for p in state_copy['points']]
+                if state_copy.get('line_segments'):
+                    state_copy['line_segments'] = [
+                        [c + (offset_logical_x if i % 2 == 0 else offset_logical_y) for i, c in enumerate(seg)]
+                        for seg in state_copy['line_segments']
+                    ]
+
+                new_tags = [t for t in (item_group_data.get('parts')[0].get('options', {}).get('tags', []) if item_group_data.get('parts') else []) if not (t.startswith('shape_') or t.startswith('stroke_') or t.startswith('layer_'))]
+                new_tags.extend([new_unique_tag, self.active_layer_id])
+                img_id = self.canvas.create_image(0, 0, anchor='nw', tags=tuple(new_tags))
+                show_raster(self, img_id, state_copy)
+
+                state_copy['angle'] = state_copy.get('angle', item_group_data.get('angle', 0))
+                state_copy['zoom_ref'] = self.zoom_level
+                state_copy['pan_ref_x'] = self.pan_offset_x
+                state_copy['pan_ref_y'] = self.pan_offset_y
+                self.object_states[new_unique_tag] = state_copy
                 continue
 
-            is_stroke = new_unique_tag.startswith("stroke_") or new_unique_tag.startswith("erase_stroke_")
-            if is_stroke:
-                state = state_copy or {}
+            # 多图元对象（笔迹、被局部橡皮擦拆开的直线）按图元保存逻辑坐标，以坐标表而非标签前缀判断
+            if state_copy.get('original_coords_map') or len(all_new_part_coords) > 1:
+                state = state_copy
                 state['angle'] = state.get('angle', item_group_data.get('angle', 0))
-                state['original_coords'] = None
+                state.pop('original_coords', None)
                 state['original_coords_map'] = all_new_part_coords
                 state['zoom_ref'] = self.zoom_level
                 state['pan_ref_x'] = self.pan_offset_x
@@ -647,7 +485,7 @@ class DrawingApp(ctk.CTk):
                     state = state_copy or {}
                     state['angle'] = state.get('angle', item_group_data.get('angle', 0))
                     state['original_coords'] = logical_coords
-                    state['original_coords_map'] = None
+                    state.pop('original_coords_map', None)
                     state['zoom_ref'] = self.zoom_level
                     state['pan_ref_x'] = self.pan_offset_x
                     state['pan_ref_y'] = self.pan_offset_y
@@ -669,11 +507,13 @@ class DrawingApp(ctk.CTk):
                 # 清理图像引用，防止内存泄漏
                 if hasattr(self, "_image_references") and item_id in self._image_references:
                     del self._image_references[item_id]
+                self._raster_render_keys.pop(item_id, None)
                 self.canvas.delete(item_id)
 
             # 清理对象状态
             if tag in self.object_states:
                 self.object_states.pop(tag, None)
+            self._surface_image_cache.pop(tag, None)
 
         # 清理选择与辅助控件
         self.selection_group.clear()
@@ -696,6 +536,14 @@ class DrawingApp(ctk.CTk):
         from layers import duplicate_selected_layer as _duplicate_selected_layer
         return _duplicate_selected_layer(self)
 
+    def flatten_selected_layer(self):
+        from layers import flatten_selected_layer as _flatten_selected_layer
+        return _flatten_selected_layer(self)
+
+    def merge_layer_down(self):
+        from layers import merge_layer_down as _merge_layer_down
+        return _merge_layer_down(self)
+
     def move_layer_up(self):
         from layers import move_layer_up as _move_layer_up
         return _move_layer_up(self)
@@ -728,6 +576,10 @@ class DrawingApp(ctk.CTk):
         from layers import update_layer_stacking as _update_layer_stacking
         return _update_layer_stacking(self)
 
+    def refresh_layer_composites(self):
+        from layer_cache import refresh_layer_composites as _refresh_layer_composites
+        return _refresh_layer_composites(self)
+
     def get_layer_by_id(self, layer_id):
         from layers import get_layer_by_id as _get_layer_by_id
         return _get_layer_by_id(self, layer_id)
@@ -785,6 +637,7 @@ class DrawingApp(ctk.CTk):
         self.color_section.pack_forget()
         self.brush_section.pack_forget()
         self.eraser_section.pack_forget()
+        self.fill_section.pack_forget()
         self.separator1.pack_forget()
         self.drawing_mode_section.pack_forget()
         self.separator2.pack_forget()
@@ -804,6 +657,16 @@ class DrawingApp(ctk.CTk):
             self.separator3.pack(pady=20, padx=15, fill="x")
             self.action_section.pack(fill="x", padx=10)
             
+        elif tool == "fill":
+            # 油漆桶工具：填充容差提到最前
+            self.fill_section.pack(fill="x", padx=10)
+            self.separator1.pack(pady=20, padx=15, fill="x")
+            self.color_section.pack(fill="x", padx=10)
+            self.separator2.pack(pady=20, padx=15, fill="x")
+            self.drawing_mode_section.pack(fill="x", padx=10)
+            self.separator3.pack(pady=20, padx=15, fill="x")
+            self.action_section.pack(fill="x", padx=10)
+
         elif tool in ["bezier", "bspline", "bezier_surface"]:
             # 曲线/曲面工具：曲线/曲面选项提到最前
             self.curve_surface_section.pack(fill="x", padx=10)
@@ -881,9 +744,14 @@ class DrawingApp(ctk.CTk):
         # 清空对象状态
         self.object_states.clear()
         self._image_references.clear()
+        self._raster_render_keys.clear()
+        self._surface_image_cache.clear()
+        from layer_cache import reset_layer_composites
+        reset_layer_composites(self)
         
         # 重置图层
         self.layers.clear()
+        self.layer_registry = LayerRegistry()
         self.layer_counter = 0
         self.active_layer_id = None
         
@@ -937,7 +805,8 @@ class DrawingApp(ctk.CTk):
 
     def _rebuild_stroke_maps_after_restore(self):
         for tag, state_data in self.object_states.items():
-            if tag.startswith("stroke_") and state_data.get('original_coords_map') is not None:
+            # 笔迹，以及被局部橡皮擦拆成多段的矢量直线
+            if state_data.get('original_coords_map') is not None:
                 new_coords_map = {segment_id: self.canvas.coords(segment_id) for segment_id in self.canvas.find_withtag(tag)}
                 self.object_states[tag]['original_coords_map'] = new_coords_map
 
@@ -963,6 +832,10 @@ class DrawingApp(ctk.CTk):
             self.current_fill_color = ""
             self.fill_color_preview.configure(fg_color=self.canvas_bg_color)
     
+    def set_fill_tolerance(self, value):
+        self.fill_tolerance = int(value)
+        self.fill_tolerance_label.configure(text=f"填充容差: {self.fill_tolerance}")
+
     def set_brush_size(self, value): self.brush_size = int(value); self.update_brush_preview()
     def reset_polygon_drawing(self):
         if self.preview_line: self.canvas.delete(self.preview_line); self.preview_line = None
@@ -1010,17 +883,42 @@ class DrawingApp(ctk.CTk):
         from shape_handlers import create_text_object as _create_text_object
         return _create_text_object(self, x, y)
 
+    def ask_logical_canvas_size(self):
+        """弹窗输入新的画布逻辑尺寸（宽x高）"""
+        current = f"{self.logical_canvas_size[0]}x{self.logical_canvas_size[1]}"
+        value = simpledialog.askstring("画布尺寸", "输入画布逻辑尺寸（宽x高）:", initialvalue=current)
+        if not value:
+            return
+        try:
+            width, height = (int(v) for v in value.lower().replace('×', 'x').split('x'))
+        except ValueError:
+            messagebox.showwarning("警告", "格式应为 宽x高，例如 20000x20000")
+            return
+        self.set_logical_canvas_size(width, height)
+
+    def set_logical_canvas_size(self, width, height):
+        """修改画布逻辑尺寸（只影响画布背景、网格与导出范围，不预先分配像素）"""
+        width = max(1, min(int(width), self.max_logical_canvas_side))
+        height = max(1, min(int(height), self.max_logical_canvas_side))
+        self.logical_canvas_size = (width, height)
+        self.draw_canvas_background()
+        if self.grid_visible:
+            self.draw_grid()
+
     def toggle_grid(self):
         self.grid_visible = not self.grid_visible
         self.draw_grid()
 
+    def toggle_grid_adaptive(self):
+        self.grid_adaptive = not self.grid_adaptive
+        self.draw_grid()
+
     def draw_canvas_background(self):
         """绘制画布背景矩形"""
         self.canvas.delete("canvas_bg")
         
         from coordinate_system import logical_to_screen
-        width = max(self.canvas.winfo_width(), 1)
-        height = max(self.canvas.winfo_height(), 1)
+        width, height = self.viewport.size
         
         # 计算画布矩形的屏幕坐标
         # 假设画布从 (0,0) 开始
@@ -1041,46 +939,11 @@ class DrawingApp(ctk.CTk):
             self.canvas.tag_lower("canvas_bg")
 
     def draw_grid(self):
-        self.canvas.delete("grid_line")
-        
         # 确保背景始终存在
         if not self.canvas.find_withtag("canvas_bg"):
             self.draw_canvas_background()
-            
-        if self.grid_visible:
-            width = self.canvas.winfo_width()
-            height = self.canvas.winfo_height()
-            
-            # 计算网格的屏幕坐标偏移，以同步平移
-            # 将逻辑平移量转换为屏幕偏移
-            from coordinate_system import logical_to_screen
-            
-            # 计算基准点 (0, 0) 在屏幕上的位置
-            logical_origin = [0, 0]
-            screen_origin = logical_to_screen(logical_origin, self.zoom_level, self.pan_offset_x, self.pan_offset_y, width, height)
-            
-            grid_offset_x = screen_origin[0] % self.grid_spacing
-            grid_offset_y = screen_origin[1] % self.grid_spacing
-            
-            # 确保偏移在 [0, grid_spacing) 范围内
-            if grid_offset_x < 0:
-                grid_offset_x += self.grid_spacing
-            if grid_offset_y < 0:
-                grid_offset_y += self.grid_spacing
-            
-            # 绘制垂直线（沿 x 轴）
-            x = grid_offset_x
-            while x < width:
-                self.canvas.create_line(x, 0, x, height, fill="#555555", tags="grid_line", dash=(2, 4))
-                x += self.grid_spacing
-            
-            # 绘制水平线（沿 y 轴）
-            y = grid_offset_y
-            while y < height:
-                self.canvas.create_line(0, y, width, y, fill="#555555", tags="grid_line", dash=(2, 4))
-                y += self.grid_spacing
-            
-            self.canvas.tag_lower("grid_line")
+        from grid import draw_grid as _draw_grid
+        return _draw_grid(self)
 
     def _draw_rasterization_shape(self, tool, x0, y0, x1, y1, unique_tag, tags):
         from drawing_utils import draw_rasterization_shape as _draw_rasterization_shape
@@ -1104,8 +967,8 @@ class DrawingApp(ctk.CTk):
     def on_space_release(self, event):
         """当空格键被释放时，禁用画布拖动模式"""
         self.space_pressed = False
-        self.pan_start_x = None
-        self.pan_start_y = None
+        from event_handlers import end_pan
+        end_pan(self)
         # 恢复正常光标
         tool_cursors = {
             "select": "arrow",
@@ -1126,6 +989,16 @@ class DrawingApp(ctk.CTk):
         """竖直翻转（上下翻转）选中的对象"""
         from transform import flip_vertical
         flip_vertical(self)
+
+    def rotate_selection_clockwise(self):
+        """将选中的对象顺时针旋转 90 度"""
+        from transform import rotate_selection_90
+        rotate_selection_90(self, clockwise=True)
+
+    def rotate_selection_counterclockwise(self):
+        """将选中的对象逆时针旋转 90 度"""
+        from transform import rotate_selection_90
+        rotate_selection_90(self, clockwise=False)
     
     # --- 画布缩放功能 ---
     def zoom_in(self):
@@ -1146,10 +1019,16 @@ class DrawingApp(ctk.CTk):
         """设置缩放级别"""
         from coordinate_system import sync_all_objects_to_screen
         
+        # 拖动中途缩放：先把已累计的位移写回逻辑状态，否则同步时对象会跳回原位
+        from selection import flush_move_drag
+        flush_move_drag(self)
+
         self.zoom_level = max(self.zoom_min, min(zoom_level, self.zoom_max))
 
         # 使用统一的坐标转换系统同步所有对象
         sync_all_objects_to_screen(self)
+        # 线宽等屏幕像素边距不随缩放变化，缓存的选区包围盒需重新测量
+        self.selection_group.invalidate()
         
         # 更新背景矩形
         self.draw_canvas_background()
@@ -1158,9 +1037,8 @@ class DrawingApp(ctk.CTk):
         if self.grid_visible:
             self.draw_grid()
         
-        # 重新绘制网格以保持同步
-        if self.grid_visible:
-            self.draw_grid()
+        # 非编辑图层的合成位图按新的缩放重建
+        self.refresh_layer_composites()
         
         # 无副作用修复：强制 Canvas 更新内部拾取索引
         self.canvas.update_idletasks()
@@ -1299,8 +1177,7 @@ class DrawingApp(ctk.CTk):
         from coordinate_system import screen_to_logical
         
         # 在画布中心创建一个4x4的控制网格
-        canvas_width = self.canvas.winfo_width()
-        canvas_height = self.canvas.winfo_height()
+        canvas_width, canvas_height = self.viewport.size
         
         center_x = canvas_width // 2
         center_y = canvas_height // 2
@@ -1404,9 +1281,7 @@ class DrawingApp(ctk.CTk):
             )
             
             # 将屏幕坐标转换为逻辑坐标
-            self.canvas.update_idletasks()
-            canvas_width = max(self.canvas.winfo_width(), 1)
-            canvas_height = max(self.canvas.winfo_height(), 1)
+            canvas_width, canvas_height = self.viewport.size
             
             logical_coords = screen_to_logical(
                 [event.x, event.y],
@@ -1439,9 +1314,14 @@ class DrawingApp(ctk.CTk):
                 old_x, old_y, old_z = self.surface_tool.control_grid[row][col]
                 self.surface_tool.control_grid[row][col] = (logical_x, logical_y, old_z)
                 
-                # 更新曲面显示
-                self.surface_tool.update_surface(self.surface_display_mode)
+                # 更新曲面显示（拖动过程中使用低细节层次）
+                self.surface_tool.update_surface(self.surface_display_mode, interactive=True)
     
     def release_control_point_drag(self, event):
         """释放控制点拖拽"""
+        was_dragging = self.dragging_control_point is not None
         self.dragging_control_point = None
+        
+        # 松开后恢复完整细节层次
+        if was_dragging and self.surface_tool and self.surface_tool.interactive:
+            self.surface_tool.update_surface(self.surface_display_mode)
@@ -6,6 +6,91 @@
 2. Canvas 上的屏幕坐标（screen_coords）是逻辑坐标通过当前 zoom 和 pan 的投影
 3. 转换流程：logical_coords -> (zoom + pan) -> screen_coords
 """
+from array import array
+from itertools import accumulate, chain, islice, repeat
+from operator import add, mul
+
+
+def view_affine(zoom_level, pan_x, pan_y, canvas_width, canvas_height):
+    """
+    逻辑坐标 -> 屏幕坐标的仿射参数：screen = logical * scale + (offset_x, offset_y)
+
+    Returns:
+        (scale, offset_x, offset_y)
+    """
+    canvas_center_x = canvas_width / 2.0
+    canvas_center_y = canvas_height / 2.0
+    # c + (l + pan - c) * z  ==  l * z + (c + (pan - c) * z)
+    return (zoom_level,
+            canvas_center_x + (pan_x - canvas_center_x) * zoom_level,
+            canvas_center_y + (pan_y - canvas_center_y) * zoom_level)
+
+
+def inverse_view_affine(zoom_level, pan_x, pan_y, canvas_width, canvas_height):
+    """屏幕坐标 -> 逻辑坐标的仿射参数，返回 (scale, offset_x, offset_y)"""
+    zoom = max(zoom_level, 1e-9)
+    canvas_center_x = canvas_width / 2.0
+    canvas_center_y = canvas_height / 2.0
+    # (s - c) / z + c - pan  ==  s / z + (c - pan - c / z)
+    return (1.0 / zoom,
+            canvas_center_x - pan_x - canvas_center_x / zoom,
+            canvas_center_y - pan_y - canvas_center_y / zoom)
+
+
+def affine_transform_flat(coords, scale, offset_x, offset_y):
+    """
+    对扁平坐标缓冲区 [x1, y1, x2, y2, ...] 做整体仿射变换
+
+    x、y 分别按切片取出，用 map + operator 在 C 层完成乘加，
+    再通过切片赋值交错写回，不逐个坐标执行 Python 代码。
+    coords 可以是 list / tuple / array('d')，返回 array('d')。
+    """
+    if not isinstance(coords, array):
+        coords = array('d', coords)
+    result = array('d', coords)
+    if not coords:
+        return result
+    xs = coords[0::2]
+    ys = coords[1::2]
+    result[0::2] = array('d', map(add, map(mul, xs, repeat(scale)), repeat(offset_x)))
+    result[1::2] = array('d', map(add, map(mul, ys, repeat(scale)), repeat(offset_y)))
+    return result
+
+
+def matrix_transform_flat(coords, matrix):
+    """
+    对扁平坐标缓冲区做一般 2x3 仿射变换 (a, b, c, d, e, f)：
+    x' = a*x + b*y + c, y' = d*x + e*y + f（同样按 x/y 切片整体计算），返回 array('d')
+    """
+    if not isinstance(coords, array):
+        coords = array('d', coords)
+    result = array('d', coords)
+    if not coords:
+        return result
+    a, b, c, d, e, f = matrix
+    xs = coords[0::2]
+    ys = coords[1::2]
+    result[0::2] = array('d', map(add, map(add, map(mul, xs, repeat(a)), map(mul, ys, repeat(b))), repeat(c)))
+    result[1::2] = array('d', map(add, map(add, map(mul, xs, repeat(d)), map(mul, ys, repeat(e))), repeat(f)))
+    return result
+
+
+def pack_coords(coord_lists):
+    """
+    把多个对象的坐标首尾拼接为一个缓冲区
+
+    Returns:
+        (flat, offsets)：flat 为 array('d')，offsets[i]:offsets[i+1] 是第 i 个对象的切片
+    """
+    flat = array('d', chain.from_iterable(coord_lists))
+    offsets = [0]
+    offsets.extend(accumulate(map(len, coord_lists)))
+    return flat, offsets
+
+
+def unpack_coords(flat, offsets):
+    """按 offsets 将拼接后的缓冲区拆回每个对象的坐标列表"""
+    return [flat[a:b].tolist() for a, b in zip(offsets, islice(offsets, 1, None))]
 
 
 def logical_to_screen(logical_coords, zoom_level, pan_x, pan_y, canvas_width, canvas_height):
@@ -13,7 +98,7 @@ def logical_to_screen(logical_coords, zoom_level, pan_x, pan_y, canvas_width, ca
     将逻辑坐标转换为屏幕坐标
     
     Args:
-        logical_coords: 列表，格式为 [x1, y1, x2, y2, ...] (逻辑坐标)
+        logical_coords: 列表或 array('d')，格式为 [x1, y1, x2, y2, ...] (逻辑坐标)
         zoom_level: 缩放倍数（1.0 = 100%）
         pan_x, pan_y: 平移量（逻辑坐标单位）
         canvas_width, canvas_height: 画布尺寸
@@ -23,21 +108,8 @@ def logical_to_screen(logical_coords, zoom_level, pan_x, pan_y, canvas_width, ca
     """
     if not logical_coords:
         return []
-    
-    canvas_center_x = canvas_width / 2.0
-    canvas_center_y = canvas_height / 2.0
-    
-    screen_coords = []
-    for i, coord in enumerate(logical_coords):
-        if i % 2 == 0:  # x 坐标
-            # 逻辑坐标 + 平移 -> 相对坐标 -> 缩放 -> 屏幕坐标
-            screen_x = canvas_center_x + (coord + pan_x - canvas_center_x) * zoom_level
-            screen_coords.append(screen_x)
-        else:  # y 坐标
-            screen_y = canvas_center_y + (coord + pan_y - canvas_center_y) * zoom_level
-            screen_coords.append(screen_y)
-    
-    return screen_coords
+    affine = view_affine(zoom_level, pan_x, pan_y, canvas_width, canvas_height)
+    return affine_transform_flat(logical_coords, *affine).tolist()
 
 
 def screen_to_logical(screen_coords, zoom_level, pan_x, pan_y, canvas_width, canvas_height):
@@ -45,7 +117,7 @@ def screen_to_logical(screen_coords, zoom_level, pan_x, pan_y, canvas_width, can
     将屏幕坐标转换为逻辑坐标
     
     Args:
-        screen_coords: 屏幕坐标列表
+        screen_coords: 屏幕坐标列表或 array('d')
         zoom_level: 缩放倍数
         pan_x, pan_y: 平移量
         canvas_width, canvas_height: 画布尺寸
@@ -55,21 +127,103 @@ def screen_to_logical(screen_coords, zoom_level, pan_x, pan_y, canvas_width, can
     """
     if not screen_coords:
         return []
-    
-    canvas_center_x = canvas_width / 2.0
-    canvas_center_y = canvas_height / 2.0
-    
-    logical_coords = []
-    for i, coord in enumerate(screen_coords):
-        if i % 2 == 0:  # x 坐标
-            # 屏幕坐标 -> 反缩放 -> 减去平移 -> 逻辑坐标
-            logical_x = (coord - canvas_center_x) / max(zoom_level, 1e-9) + canvas_center_x - pan_x
-            logical_coords.append(logical_x)
-        else:  # y 坐标
-            logical_y = (coord - canvas_center_y) / max(zoom_level, 1e-9) + canvas_center_y - pan_y
-            logical_coords.append(logical_y)
-    
-    return logical_coords
+    affine = inverse_view_affine(zoom_level, pan_x, pan_y, canvas_width, canvas_height)
+    return affine_transform_flat(screen_coords, *affine).tolist()
+
+
+def logical_to_screen_many(coord_lists, zoom_level, pan_x, pan_y, canvas_width, canvas_height):
+    """
+    批量版本：多个对象的逻辑坐标拼接后一次变换，再按对象拆分
+
+    Returns:
+        与 coord_lists 一一对应的屏幕坐标列表
+    """
+    if not coord_lists:
+        return []
+    flat, offsets = pack_coords(coord_lists)
+    affine = view_affine(zoom_level, pan_x, pan_y, canvas_width, canvas_height)
+    return unpack_coords(affine_transform_flat(flat, *affine), offsets)
+
+
+def screen_to_logical_many(coord_lists, zoom_level, pan_x, pan_y, canvas_width, canvas_height):
+    """批量版本：多个对象的屏幕坐标一次性转换为逻辑坐标"""
+    if not coord_lists:
+        return []
+    flat, offsets = pack_coords(coord_lists)
+    affine = inverse_view_affine(zoom_level, pan_x, pan_y, canvas_width, canvas_height)
+    return unpack_coords(affine_transform_flat(flat, *affine), offsets)
+
+
+class Viewport:
+    """
+    画布视口：坐标转换的唯一入口
+
+    画布尺寸由 <Configure> 事件写入缓存，转换时直接读取，
+    不再在每次鼠标事件中调用 update_idletasks() 强制刷新 Tk 空闲队列。
+    缩放与平移仍以 app.zoom_level / app.pan_offset_x / app.pan_offset_y 为准。
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.width = 1
+        self.height = 1
+        self._configured = False
+
+    def on_configure(self, event):
+        """<Configure> 回调：记录画布的新尺寸"""
+        self.width = max(int(event.width), 1)
+        self.height = max(int(event.height), 1)
+        self._configured = True
+
+    @property
+    def size(self):
+        """(宽, 高)；首个 <Configure> 到达前退化为读取当前窗口尺寸"""
+        if not self._configured:
+            canvas = self.app.canvas
+            return max(canvas.winfo_width(), 1), max(canvas.winfo_height(), 1)
+        return self.width, self.height
+
+    def affine(self):
+        """逻辑 -> 屏幕的 (scale, offset_x, offset_y)"""
+        app = self.app
+        return view_affine(app.zoom_level, app.pan_offset_x, app.pan_offset_y, *self.size)
+
+    def inverse_affine(self):
+        """屏幕 -> 逻辑的 (scale, offset_x, offset_y)"""
+        app = self.app
+        return inverse_view_affine(app.zoom_level, app.pan_offset_x, app.pan_offset_y, *self.size)
+
+    def matrix(self):
+        """当前逻辑 -> 屏幕变换的 2x3 矩阵 (a, b, c, d, e, f)：x' = a*x + b*y + c, y' = d*x + e*y + f"""
+        scale, offset_x, offset_y = self.affine()
+        return (scale, 0.0, offset_x, 0.0, scale, offset_y)
+
+    def inverse_matrix(self):
+        """当前屏幕 -> 逻辑变换的 2x3 矩阵"""
+        scale, offset_x, offset_y = self.inverse_affine()
+        return (scale, 0.0, offset_x, 0.0, scale, offset_y)
+
+    def to_screen(self, logical_coords):
+        if not logical_coords:
+            return []
+        return affine_transform_flat(logical_coords, *self.affine()).tolist()
+
+    def to_logical(self, screen_coords):
+        if not screen_coords:
+            return []
+        return affine_transform_flat(screen_coords, *self.inverse_affine()).tolist()
+
+    def to_screen_many(self, coord_lists):
+        if not coord_lists:
+            return []
+        flat, offsets = pack_coords(coord_lists)
+        return unpack_coords(affine_transform_flat(flat, *self.affine()), offsets)
+
+    def to_logical_many(self, coord_lists):
+        if not coord_lists:
+            return []
+        flat, offsets = pack_coords(coord_lists)
+        return unpack_coords(affine_transform_flat(flat, *self.inverse_affine()), offsets)
 
 
 def sync_object_to_screen(app, tag):
@@ -89,9 +243,7 @@ def sync_object_to_screen(app, tag):
     
     logical_coords = state['original_coords']
     
-    app.canvas.update_idletasks()
-    canvas_width = max(app.canvas.winfo_width(), 1)
-    canvas_height = max(app.canvas.winfo_height(), 1)
+    canvas_width, canvas_height = app.viewport.size
     
     screen_coords = logical_to_screen(
         logical_coords, 
@@ -113,14 +265,24 @@ def sync_all_objects_to_screen(app):
     Args:
         app: DrawingApp 实例
     """
-    from PIL import Image, ImageTk
-    from drawing_utils import create_rasterized_image
+    sync_objects_to_screen(app, list(app.object_states.keys()))
+
+
+def sync_objects_to_screen(app, tags):
+    """
+    只同步指定对象（逻辑状态已更新过的对象）到屏幕坐标
     
-    app.canvas.update_idletasks()
-    canvas_width = max(app.canvas.winfo_width(), 1)
-    canvas_height = max(app.canvas.winfo_height(), 1)
+    Args:
+        app: DrawingApp 实例
+        tags: 对象标签列表
+    """
+    from transform import show_raster
+
+    canvas_width, canvas_height = app.viewport.size
     
-    for tag in list(app.object_states.keys()):
+    for tag in tags:
+        if tag not in app.object_states:
+            continue
         if tag.startswith(("stroke_", "shape_")):
             state = app.object_states[tag]
             
@@ -140,32 +302,11 @@ def sync_all_objects_to_screen(app):
                     
                     # 对于 image 类型（光栅化对象），需要特殊处理
                     if item_type == 'image':
-                        # 重新生成光栅化图像（使用当前的缩放级别）
                         if 'original_pil_image' in state:
-                            # 根据当前 zoom 级别计算缩放后的大小
-                            original_img = state['original_pil_image']
-                            original_width, original_height = original_img.size
-                            
-                            # 计算缩放因子（基于当前缩放级别与参考缩放级别的比值）
-                            zoom_ref = state.get('zoom_ref', 1.0)
-                            scale_factor = app.zoom_level / max(zoom_ref, 1e-9)
-                            
-                            # 计算新的图像大小
-                            new_width = max(int(original_width * scale_factor), 1)
-                            new_height = max(int(original_height * scale_factor), 1)
-                            
-                            # 如果大小确实改变了，重新缩放图像
-                            if (new_width, new_height) != (original_width, original_height):
-                                scaled_img = original_img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                                tk_img = ImageTk.PhotoImage(scaled_img)
-                                
-                                # 更新 canvas 上的图像
-                                app.canvas.itemconfig(item_id, image=tk_img)
-                                app._image_references[item_id] = tk_img  # 保持对图像的引用
-                        
-                        # Image 对象的 coords 只需要 (x, y) 两个参数，表示锚点位置
-                        img_x, img_y = screen_coords[0], screen_coords[1]
-                        app.canvas.coords(item_id, img_x, img_y)
+                            # 光栅对象：按对象矩阵与当前视口一次采样（缩放比例未变时只移动）
+                            show_raster(app, item_id, state)
+                        else:
+                            app.canvas.coords(item_id, screen_coords[0], screen_coords[1])
                     elif item_type == 'text':
                         # 文本需按缩放调整字号，保持空间感一致
                         font_spec = state.get('font', '') or ''
@@ -187,16 +328,18 @@ def sync_all_objects_to_screen(app):
                         app.canvas.coords(item_id, *screen_coords)
             
             elif 'original_coords_map' in state:
-                # 对于包含多个 item_id 的对象（如笔触）
-                for item_id, logical_coords in state['original_coords_map'].items():
-                    screen_coords = logical_to_screen(
-                        logical_coords,
-                        app.zoom_level,
-                        app.pan_offset_x,
-                        app.pan_offset_y,
-                        canvas_width,
-                        canvas_height
-                    )
+                # 对于包含多个 item_id 的对象（如笔触）：所有分段拼接后一次变换
+                coords_map = state['original_coords_map']
+                item_ids = list(coords_map.keys())
+                all_screen_coords = logical_to_screen_many(
+                    list(coords_map.values()),
+                    app.zoom_level,
+                    app.pan_offset_x,
+                    app.pan_offset_y,
+                    canvas_width,
+                    canvas_height
+                )
+                for item_id, screen_coords in zip(item_ids, all_screen_coords):
                     item_type = app.canvas.type(item_id)
                     
                     # 对于 image 类型，只使用前两个坐标
@@ -226,9 +369,7 @@ def sync_all_objects_to_screen(app):
                 curve_points = curve.generate_points(num_segments=100)
                 
                 # 将曲线点转换为屏幕坐标
-                logical_curve_coords = []
-                for x, y in curve_points:
-                    logical_curve_coords.extend([x, y])
+                logical_curve_coords = list(chain.from_iterable(curve_points))
                 
                 screen_curve_coords = logical_to_screen(
                     logical_curve_coords,
@@ -277,6 +418,7 @@ def sync_all_objects_to_screen(app):
                     # 不要删除控制点标签，除非是在非编辑状态
                     if 'control_point' not in app.canvas.gettags(item):
                         app.canvas.delete(item)
+                        app._image_references.pop(item, None)
                 
                 # 重新调用绘制逻辑
                 # 我们模拟一个 Tool 实例来调用内部方法
@@ -336,7 +478,15 @@ def get_logical_bounding_box(app):
                 text_padding = len(text_content) * 20.0
                 padding = max(padding, text_padding, 100.0)
 
-        if 'original_coords' in state:
+        if state.get('original_pil_image') is not None:
+            # 光栅对象：取矩阵变换后的位图四角
+            from transform import raster_corners
+            coords = raster_corners(state)
+            has_object = True
+            min_x, max_x = min(min_x, *coords[0::2]), max(max_x, *coords[0::2])
+            min_y, max_y = min(min_y, *coords[1::2]), max(max_y, *coords[1::2])
+
+        elif 'original_coords' in state:
             coords = state['original_coords']
             if coords:
                 has_object = True
@@ -5,6 +5,7 @@
 """
 
 import math
+from PIL import Image, ImageDraw, ImageTk
 from curves import BezierCurve, BSplineCurve, CatmullRomSpline
 from surfaces import BezierSurface, TriangularBezierSurface
 from raster import SimpleRasterization
@@ -29,9 +30,7 @@ class CurveTool:
         from coordinate_system import screen_to_logical
         
         # 将屏幕坐标转换为逻辑坐标存储
-        self.canvas.update_idletasks()
-        canvas_width = max(self.canvas.winfo_width(), 1)
-        canvas_height = max(self.canvas.winfo_height(), 1)
+        canvas_width, canvas_height = self.app.viewport.size
         
         logical_coords = screen_to_logical(
             [screen_x, screen_y],
@@ -156,9 +155,7 @@ class BSplineCurveTool(CurveTool):
             self.canvas.delete(line_id)
         self.preview_lines = []
         
-        self.canvas.update_idletasks()
-        canvas_width = max(self.canvas.winfo_width(), 1)
-        canvas_height = max(self.canvas.winfo_height(), 1)
+        canvas_width, canvas_height = self.app.viewport.size
         
         for i in range(len(self.control_points) - 1):
             # 将逻辑坐标转换为屏幕坐标
@@ -221,6 +218,7 @@ class SurfaceTool:
         self.surface_tag = None
         self.display_mode = 'wireframe'  # 'wireframe' or 'filled'
         self.surface_color = color  # 曲面颜色
+        self.interactive = False  # 是否处于控制点拖动中（使用低细节层次）
         
     def clear(self):
         """清除所有元素"""
@@ -255,9 +253,7 @@ class BezierSurfaceTool(SurfaceTool):
         
         self.control_grid = grid
         
-        self.canvas.update_idletasks()
-        canvas_width = max(self.canvas.winfo_width(), 1)
-        canvas_height = max(self.canvas.winfo_height(), 1)
+        canvas_width, canvas_height = self.app.viewport.size
         
         # 绘制控制点
         for row in grid:
@@ -281,13 +277,18 @@ class BezierSurfaceTool(SurfaceTool):
                 )
                 self.control_point_ids.append(point_id)
     
-    def update_surface(self, display_mode='wireframe'):
-        """更新曲面显示"""
+    def update_surface(self, display_mode='wireframe', interactive=False):
+        """
+        更新曲面显示
+        interactive: 为True时（拖动控制点过程中）使用低细节层次，松开后应再以False调用恢复完整细节
+        """
         self.display_mode = display_mode
+        self.interactive = interactive
         
         # 清除旧的曲面显示
         for line_id in self.grid_lines:
             self.canvas.delete(line_id)
+            self.app._image_references.pop(line_id, None)
         self.grid_lines = []
         
         if not self.control_grid:
@@ -302,100 +303,233 @@ class BezierSurfaceTool(SurfaceTool):
             self._draw_filled(surface)
     
     def _draw_wireframe(self, surface):
-        """绘制网格线模式（将逻辑坐标转换为屏幕坐标）"""
+        """绘制网格线模式（所有等参曲线串成一条折线，只占用一个Canvas项）"""
         from coordinate_system import logical_to_screen
         
-        self.canvas.update_idletasks()
-        canvas_width = max(self.canvas.winfo_width(), 1)
-        canvas_height = max(self.canvas.winfo_height(), 1)
+        canvas_width, canvas_height = self.app.viewport.size
         
-        # 获取等参曲线
-        u_curves, v_curves = surface.get_isocurves(num_u_curves=10, num_v_curves=10)
+        # 获取串联后的等参曲线（逻辑坐标），细分密度由细节层次决定
+        lod = surface_lod(self.control_grid, self.app.zoom_level, self.interactive)
+        points = serpentine_isocurve_points(
+            surface,
+            num_u_curves=lod['isocurves'],
+            num_v_curves=lod['isocurves'],
+            segments_per_curve=lod['segments_per_curve']
+        )
+        logical_points = []
+        for x, y, z in points:
+            logical_points.extend([x, y])
         
-        # 绘制u方向曲线（使用主颜色）
-        for curve in u_curves:
-            # 将逻辑坐标转换为屏幕坐标
-            logical_points = []
-            for x, y, z in curve:
-                logical_points.extend([x, y])
-            
-            screen_points = logical_to_screen(
-                logical_points,
-                self.app.zoom_level,
-                self.app.pan_offset_x,
-                self.app.pan_offset_y,
-                canvas_width,
-                canvas_height
-            )
-            
-            line_id = self.canvas.create_line(
-                screen_points,
-                fill=self.surface_color, width=1,
-                tags=(self.surface_tag, 'surface_grid')
-            )
-            self.grid_lines.append(line_id)
+        # 一次性转换为屏幕坐标
+        screen_points = logical_to_screen(
+            logical_points,
+            self.app.zoom_level,
+            self.app.pan_offset_x,
+            self.app.pan_offset_y,
+            canvas_width,
+            canvas_height
+        )
         
-        # 绘制v方向曲线（使用稍浅的颜色）
-        for curve in v_curves:
-            # 将逻辑坐标转换为屏幕坐标
-            logical_points = []
-            for x, y, z in curve:
-                logical_points.extend([x, y])
-            
-            screen_points = logical_to_screen(
-                logical_points,
-                self.app.zoom_level,
-                self.app.pan_offset_x,
-                self.app.pan_offset_y,
-                canvas_width,
-                canvas_height
-            )
-            
-            line_id = self.canvas.create_line(
-                screen_points,
-                fill=self.surface_color, width=1,
-                tags=(self.surface_tag, 'surface_grid')
-            )
-            self.grid_lines.append(line_id)
+        line_id = self.canvas.create_line(
+            screen_points,
+            fill=self.surface_color, width=1, joinstyle='round',
+            tags=(self.surface_tag, 'surface_grid')
+        )
+        self.grid_lines.append(line_id)
     
     def _draw_filled(self, surface):
-        """绘制填充模式（使用投影后的坐标）"""
+        """绘制填充模式（整张着色网格光栅化为一张缓存位图，作为单个Canvas图像项显示）"""
         from coordinate_system import logical_to_screen
         
-        self.canvas.update_idletasks()
-        canvas_width = max(self.canvas.winfo_width(), 1)
-        canvas_height = max(self.canvas.winfo_height(), 1)
+        canvas_width, canvas_height = self.app.viewport.size
         
-        # 生成网格
-        mesh_points, faces = surface.generate_mesh(u_segments=20, v_segments=20)
+        zoom = self.app.zoom_level
+        pil_img, (origin_lx, origin_ly), render_scale = self._get_cached_surface_image(surface, zoom)
+        if pil_img is None:
+            return
         
-        for face in faces:
-            p0, p1, p2 = [mesh_points[i] for i in face]
-            
-            # 提取逻辑坐标并投影到屏幕坐标
-            # 注意：p0, p1, p2 是 (x, y, z)
-            logical_pts = [p0[0], p0[1], p1[0], p1[1], p2[0], p2[1]]
-            screen_pts = logical_to_screen(
-                logical_pts,
-                self.app.zoom_level,
-                self.app.pan_offset_x,
-                self.app.pan_offset_y,
-                canvas_width,
-                canvas_height
-            )
-            
-            # 根据z值计算颜色（简单的深度着色）
-            avg_z = (p0[2] + p1[2] + p2[2]) / 3
-            gray = int(max(0, min(255, (avg_z + 50) * 2.55)))  # 稍微调整映射范围
-            color = f'#{gray:02x}{gray:02x}{gray:02x}'
-            
-            # 使用投影后的屏幕坐标绘制
-            poly_id = self.canvas.create_polygon(
-                screen_pts,
-                fill=color, outline='',
-                tags=(self.surface_tag, 'surface_fill')
+        # 缓存位图按2的幂次档位渲染，这里只做一次小幅缩放以匹配当前缩放级别；
+        # 缩放结果同样缓存，缩放级别不变时（平移、重绘）不再重复缩放
+        display_w = max(int(round(pil_img.width * zoom / render_scale)), 1)
+        display_h = max(int(round(pil_img.height * zoom / render_scale)), 1)
+        display_img = pil_img
+        if (display_w, display_h) != pil_img.size:
+            entry = self.app._surface_image_cache[self.surface_tag]
+            display = entry.get('display')
+            if display is None or display[0] is not pil_img or display[1] != (display_w, display_h):
+                display = (pil_img, (display_w, display_h),
+                           pil_img.resize((display_w, display_h), Image.Resampling.BILINEAR))
+                entry['display'] = display
+            display_img = display[2]
+        tk_img = ImageTk.PhotoImage(display_img)
+        
+        screen_pos = logical_to_screen(
+            [origin_lx, origin_ly],
+            zoom,
+            self.app.pan_offset_x,
+            self.app.pan_offset_y,
+            canvas_width,
+            canvas_height
+        )
+        
+        image_id = self.canvas.create_image(
+            screen_pos[0], screen_pos[1],
+            image=tk_img, anchor='nw',
+            tags=(self.surface_tag, 'surface_fill')
+        )
+        self.app._image_references[image_id] = tk_img
+        self.grid_lines.append(image_id)
+    
+    def _get_cached_surface_image(self, surface, zoom):
+        """
+        获取曲面的缓存位图
+        缓存按曲面标签存放在 app._surface_image_cache 中，只有控制网格变化时才失效；
+        同一控制网格下按渲染档位（1、2、4、8倍）分别保存，缩放时直接复用；
+        档位受 SURFACE_IMAGE_MAX_PIXELS 限制，大曲面会降到更低（可小于1）的档位
+        """
+        cache = self.app._surface_image_cache
+        grid_key = tuple(tuple(p) for row in self.control_grid for p in row)
+        
+        entry = cache.get(self.surface_tag)
+        if entry is None or entry['grid_key'] != grid_key:
+            entry = {'grid_key': grid_key, 'images': {}}
+            cache[self.surface_tag] = entry
+        
+        # 控制网格的包围盒包含整张曲面，用来估算各档位的位图像素数
+        xs = [p[0] for row in self.control_grid for p in row]
+        ys = [p[1] for row in self.control_grid for p in row]
+        area = (max(xs) - min(xs) + 2) * (max(ys) - min(ys) + 2)
+        render_scale = 1
+        while render_scale < zoom and render_scale < 8 and area * (render_scale * 2) ** 2 <= SURFACE_IMAGE_MAX_PIXELS:
+            render_scale *= 2
+        while render_scale > 1 / 8 and area * render_scale ** 2 > SURFACE_IMAGE_MAX_PIXELS:
+            render_scale /= 2
+        
+        mesh_segments = surface_lod(self.control_grid, zoom, self.interactive)['mesh']
+        image_key = (render_scale, mesh_segments)
+        if image_key not in entry['images']:
+            entry['images'][image_key] = render_surface_image(
+                surface, render_scale, u_segments=mesh_segments, v_segments=mesh_segments
             )
-            self.grid_lines.append(poly_id)
+        pil_img, origin = entry['images'][image_key]
+        return pil_img, origin, render_scale
+
+
+# 曲面填充缓存位图的像素上限（约 16 MB RGBA）
+SURFACE_IMAGE_MAX_PIXELS = 4_000_000
+
+# 曲面细节层次（LOD）参数
+SURFACE_LOD_PIXELS_PER_MESH_SEGMENT = 16   # 屏幕上每个网格分段约占的像素数
+SURFACE_LOD_PIXELS_PER_CURVE_SEGMENT = 8   # 等参曲线上每个折线段约占的像素数
+SURFACE_LOD_MESH_RANGE = (4, 48)
+SURFACE_LOD_CURVE_RANGE = (6, 64)
+SURFACE_LOD_INTERACTIVE = {'mesh': 8, 'isocurves': 6, 'segments_per_curve': 10}
+
+
+def surface_lod(control_grid, zoom_level, interactive=False):
+    """
+    根据曲面在屏幕上的投影尺寸选择细分密度
+    control_grid: 逻辑坐标的控制网格（凸包性质保证曲面位于其包围盒内）
+    zoom_level: 当前缩放倍数（导出时传入导出缩放比例）
+    interactive: 拖动控制点时为True，使用固定的低细节层次
+    返回：{'mesh': 网格每个方向的分段数, 'isocurves': 每个方向的等参线条数, 'segments_per_curve': 每条等参线的分段数}
+    """
+    xs = [p[0] for row in control_grid for p in row]
+    ys = [p[1] for row in control_grid for p in row]
+    if not xs:
+        return dict(SURFACE_LOD_INTERACTIVE)
+    
+    # 投影到屏幕后的较长边（像素）
+    screen_extent = max(max(xs) - min(xs), max(ys) - min(ys)) * zoom_level
+    
+    mesh = int(screen_extent / SURFACE_LOD_PIXELS_PER_MESH_SEGMENT)
+    mesh = max(SURFACE_LOD_MESH_RANGE[0], min(SURFACE_LOD_MESH_RANGE[1], mesh))
+    segments_per_curve = int(screen_extent / SURFACE_LOD_PIXELS_PER_CURVE_SEGMENT)
+    segments_per_curve = max(SURFACE_LOD_CURVE_RANGE[0], min(SURFACE_LOD_CURVE_RANGE[1], segments_per_curve))
+    lod = {'mesh': mesh, 'isocurves': 10, 'segments_per_curve': segments_per_curve}
+    
+    if interactive:
+        lod = {key: min(value, SURFACE_LOD_INTERACTIVE[key]) for key, value in lod.items()}
+    return lod
+
+
+def serpentine_isocurve_points(surface, num_u_curves=10, num_v_curves=10, segments_per_curve=30):
+    """
+    将两组等参曲线按蛇形顺序串联成一条连续折线
+    相邻曲线之间沿曲面边界（同样在曲面上求值）连接，连接段与边界等参线重合，因此视觉上与分开绘制一致
+    返回：[(x, y, z), ...]
+    """
+    u_curves, v_curves = surface.get_isocurves(num_u_curves, num_v_curves, segments_per_curve)
+    u_fixed = [i / (num_u_curves - 1) for i in range(num_u_curves)]
+    v_fixed = [j / (num_v_curves - 1) for j in range(num_v_curves)]
+    
+    def connector(t0, t1, fixed, along_u):
+        # 在两条相邻等参线之间沿边界取若干内部点
+        steps = max(2, segments_per_curve // max(1, len(u_fixed if along_u else v_fixed) - 1))
+        params = [t0 + (t1 - t0) * k / steps for k in range(1, steps)]
+        if along_u:
+            xs, ys, zs = surface.evaluate_grid(params, (fixed,))
+        else:
+            xs, ys, zs = surface.evaluate_grid((fixed,), params)
+        return list(zip(xs, ys, zs))
+    
+    points = []
+    # u方向曲线：偶数条沿v正向，奇数条沿v反向
+    for a, curve in enumerate(u_curves):
+        if a > 0:
+            v_edge = 1.0 if a % 2 == 1 else 0.0
+            points.extend(connector(u_fixed[a - 1], u_fixed[a], v_edge, along_u=True))
+        points.extend(curve if a % 2 == 0 else reversed(curve))
+    
+    # 此时位于 u=1 边界，从最近的v方向曲线开始反向遍历
+    v_end = 1.0 if (num_u_curves - 1) % 2 == 0 else 0.0
+    order = list(range(num_v_curves))
+    if v_end == 1.0:
+        order.reverse()
+    for step, b in enumerate(order):
+        curve = v_curves[b]
+        # 第一条从 u=1 走向 u=0，之后交替
+        if step > 0:
+            u_edge = 0.0 if step % 2 == 1 else 1.0
+            points.extend(connector(v_fixed[order[step - 1]], v_fixed[b], u_edge, along_u=False))
+        points.extend(reversed(curve) if step % 2 == 0 else curve)
+    
+    return points
+
+
+def render_surface_image(surface, scale=1.0, u_segments=20, v_segments=20):
+    """
+    将曲面的着色网格光栅化为一张RGBA位图
+    面片按平均z值从低到高绘制（深度排序），颜色沿用按平均z值映射灰度的着色规则
+    scale: 每逻辑单位对应的像素数
+    返回：(PIL图像, (左上角逻辑x, 左上角逻辑y))，网格为空时返回 (None, (0, 0))
+    """
+    mesh_points, faces = surface.generate_mesh(u_segments=u_segments, v_segments=v_segments)
+    if not mesh_points or not faces:
+        return None, (0, 0)
+    
+    xs = [p[0] for p in mesh_points]
+    ys = [p[1] for p in mesh_points]
+    min_x, min_y = min(xs) - 1, min(ys) - 1
+    width = max(int(math.ceil((max(xs) + 1 - min_x) * scale)), 1)
+    height = max(int(math.ceil((max(ys) + 1 - min_y) * scale)), 1)
+    
+    pixel_pts = [((p[0] - min_x) * scale, (p[1] - min_y) * scale) for p in mesh_points]
+    shaded_faces = []
+    for face in faces:
+        avg_z = (mesh_points[face[0]][2] + mesh_points[face[1]][2] + mesh_points[face[2]][2]) / 3
+        shaded_faces.append((avg_z, face))
+    shaded_faces.sort(key=lambda item: item[0])
+    
+    img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    for avg_z, face in shaded_faces:
+        gray = int(max(0, min(255, (avg_z + 50) * 2.55)))
+        color = (gray, gray, gray, 255)
+        # 描边与填充同色，避免相邻三角形之间出现缝隙
+        draw.polygon([pixel_pts[i] for i in face], fill=color, outline=color)
+    
+    return img, (min_x, min_y)
 
 
 def interpolate_color(color1, color2, t):
@@ -421,33 +555,64 @@ def interpolate_color(color1, color2, t):
     return f'#{r:02x}{g:02x}{b:02x}'
 
 
-def rasterize_curve_with_color(canvas, curve_points, start_color, end_color, width=2):
+def gradient_color_ramp(start_color, end_color, color_steps):
+    """
+    预先计算量化后的渐变色表
+    返回长度为 color_steps 的十六进制颜色列表，色阶均匀分布在起止颜色之间（包含两端）
+    """
+    color_steps = max(1, int(color_steps))
+    if color_steps == 1:
+        return [interpolate_color(start_color, end_color, 0.5)]
+    return [interpolate_color(start_color, end_color, k / (color_steps - 1)) for k in range(color_steps)]
+
+
+def rasterize_curve_with_color(canvas, curve_points, start_color, end_color, width=2, color_steps=16, tags=None):
     """
     使用光栅化算法绘制带颜色渐变的曲线
+    渐变被量化为 color_steps 个色阶：颜色表只计算一次，同一色阶内相邻线段的Bresenham像素
+    合并成一条折线，因此Canvas项数量至多为 color_steps，而不是每个线段/像素一项
+    color_steps: 色阶数量，越大渐变越平滑、Canvas项越多
+    返回：创建的Canvas项ID列表
     """
-    rasterized_points = []
     num_points = len(curve_points)
+    if num_points < 2:
+        return []
+    
+    ramp = gradient_color_ramp(start_color, end_color, color_steps)
+    steps = len(ramp)
     
+    # 按色阶把线段分组为连续的像素折线
+    runs = []  # [(色阶, [x0, y0, x1, y1, ...]), ...]
     for i in range(num_points - 1):
         x0, y0 = int(curve_points[i][0]), int(curve_points[i][1])
         x1, y1 = int(curve_points[i + 1][0]), int(curve_points[i + 1][1])
         
-        # 使用Bresenham算法
-        segment_points = SimpleRasterization.bresenham_line(x0, y0, x1, y1)
-        
-        # 计算颜色
         t = i / max(1, num_points - 1)
-        color = interpolate_color(start_color, end_color, t)
+        step = min(steps - 1, int(t * steps))
         
-        # 绘制线段
-        if segment_points:
-            flat_points = []
-            for px, py in segment_points:
-                flat_points.extend([px, py])
-            
-            if len(flat_points) >= 4:
-                canvas.create_line(
-                    flat_points,
-                    fill=color, width=width,
-                    capstyle='round', joinstyle='round'
-                )
+        # 使用Bresenham算法
+        segment_points = SimpleRasterization.bresenham_line(x0, y0, x1, y1)
+        if not segment_points:
+            continue
+        
+        if not runs or runs[-1][0] != step:
+            # 新色阶的折线从上一段的终点开始，保证曲线连续
+            start = runs[-1][1][-2:] if runs else []
+            runs.append((step, list(start)))
+        flat = runs[-1][1]
+        for px, py in segment_points:
+            if len(flat) >= 2 and flat[-2] == px and flat[-1] == py:
+                continue
+            flat.extend([px, py])
+    
+    item_ids = []
+    for step, flat_points in runs:
+        if len(flat_points) == 2:
+            flat_points = flat_points * 2
+        if len(flat_points) < 4:
+            continue
+        options = {'fill': ramp[step], 'width': width, 'capstyle': 'round', 'joinstyle': 'round'}
+        if tags:
+            options['tags'] = tags
+        item_ids.append(canvas.create_line(flat_points, **options))
+    return item_ids
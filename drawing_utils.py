@@ -132,8 +132,9 @@ def create_rasterized_image(app, state):
                 draw.point((px,py), fill=outline_rgba)
     
     # 5. 应用旋转（如果有angle字段）
+    # 显式点集/笔迹的点已随变换旋转到最终位置，只有参数化形状需要按角度旋转
     angle = state.get('angle', 0)
-    if angle != 0:
+    if angle != 0 and tool in ['line', 'rectangle', 'circle']:
         img = img.rotate(-angle, expand=True, resample=Image.Resampling.BICUBIC)
         # 旋转后重新计算位置（expand=True会改变图像尺寸）
         # 旋转中心是原图像中心
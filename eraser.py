@@ -0,0 +1,302 @@
+# eraser.py
+"""
+局部橡皮擦：直接修改对象几何，而不是叠加背景色圆点
+
+- 每次拖动取上一点到当前点的一段，连同橡皮半径构成一个“胶囊”区域（逻辑坐标）；
+- 矢量笔迹 / 直线：折线在胶囊内的部分被剪掉，剩余部分拆成新的线段图元，全部剪掉时删除对象；
+- 光栅对象：把胶囊映射到源位图像素空间，直接清除该区域的 alpha，松开时裁掉全透明的边缘；
+- 候选对象来自逻辑坐标下的空间索引（与框选同一种网格索引），不逐个遍历 Canvas 图元。
+"""
+import math
+from PIL import Image, ImageChops, ImageDraw
+from marquee import SpatialIndex, geometry_bbox, object_geometry
+from transform import (compose_matrix, invert_matrix, raster_corners, raster_matrix, show_raster,
+                       update_raster_anchor)
+
+LINE_OPTIONS = ('fill', 'width', 'capstyle', 'joinstyle', 'smooth', 'dash')
+
+
+def capsule_interval(ax, ay, bx, by, cx, cy, dx, dy, radius):
+    """
+    线段 A->B 落在胶囊（线段 C-D 外扩 radius）内的参数区间
+
+    胶囊是凸集，与直线的交集为一个区间，取两端圆盘与中间矩形各自区间的并即可。
+
+    Returns:
+        (t0, t1)，0 <= t0 <= t1 <= 1；不相交时返回 None
+    """
+    vx, vy = bx - ax, by - ay
+    lo, hi = math.inf, -math.inf
+
+    # 两端圆盘：|A + t v - P|^2 = r^2
+    qa = vx * vx + vy * vy
+    for px, py in ((cx, cy), (dx, dy)):
+        fx, fy = ax - px, ay - py
+        qc = fx * fx + fy * fy - radius * radius
+        if qa < 1e-12:
+            if qc <= 0:
+                lo, hi = min(lo, 0.0), max(hi, 1.0)
+            continue
+        qb = 2 * (fx * vx + fy * vy)
+        disc = qb * qb - 4 * qa * qc
+        if disc < 0:
+            continue
+        root = math.sqrt(disc)
+        lo = min(lo, (-qb - root) / (2 * qa))
+        hi = max(hi, (-qb + root) / (2 * qa))
+
+    # 中间矩形：在以 C-D 为轴的局部坐标中做 Liang-Barsky 裁剪
+    ux, uy = dx - cx, dy - cy
+    length = math.hypot(ux, uy)
+    if length > 1e-12:
+        ux, uy = ux / length, uy / length
+        su = (ax - cx) * ux + (ay - cy) * uy
+        sw = -(ax - cx) * uy + (ay - cy) * ux
+        du = vx * ux + vy * uy
+        dw = -vx * uy + vy * ux
+        t0, t1 = -math.inf, math.inf
+        inside = True
+        for p, q in ((-du, su), (du, length - su), (-dw, sw + radius), (dw, radius - sw)):
+            if abs(p) < 1e-12:
+                if q < 0:
+                    inside = False
+                    break
+            else:
+                t = q / p
+                if p < 0:
+                    t0 = max(t0, t)
+                else:
+                    t1 = min(t1, t)
+        if inside and t0 <= t1:
+            lo, hi = min(lo, t0), max(hi, t1)
+
+    lo, hi = max(lo, 0.0), min(hi, 1.0)
+    if lo > hi:
+        return None
+    return lo, hi
+
+
+def split_polyline(flat, segment, radius):
+    """
+    从扁平折线中剪掉胶囊覆盖的部分
+
+    Returns:
+        剩余的折线列表（每条为扁平坐标）；与胶囊不相交时返回 None
+    """
+    cx, cy, dx, dy = segment
+    pieces = []
+    current = [flat[0], flat[1]]
+    touched = False
+    for i in range(0, len(flat) - 3, 2):
+        ax, ay, bx, by = flat[i], flat[i + 1], flat[i + 2], flat[i + 3]
+        hit = capsule_interval(ax, ay, bx, by, cx, cy, dx, dy, radius)
+        if hit is None:
+            current.extend((bx, by))
+            continue
+        touched = True
+        t0, t1 = hit
+        if t0 > 0:
+            current.extend((ax + (bx - ax) * t0, ay + (by - ay) * t0))
+        if len(current) >= 4:
+            pieces.append(current)
+        current = [ax + (bx - ax) * t1, ay + (by - ay) * t1, bx, by] if t1 < 1 else [bx, by]
+    if not touched:
+        return None
+    if len(current) >= 4:
+        pieces.append(current)
+    # 去掉退化为一点的残段
+    return [p for p in pieces if abs(p[0] - p[-2]) + abs(p[1] - p[-1]) > 1e-6 or len(p) > 4]
+
+
+def _erase_lines(app, tag, state, segment, radius):
+    """矢量笔迹（多段图元）或矢量直线：剪切折线并重建图元，返回是否有改动"""
+    canvas = app.canvas
+    coords_map = state.get('original_coords_map')
+    if not coords_map:
+        coords_map = {item_id: state['original_coords'] for item_id in canvas.find_withtag(tag)}
+
+    new_map = {}
+    changed = False
+    for item_id, flat in coords_map.items():
+        if not flat or len(flat) < 4 or not canvas.type(item_id):
+            continue
+        pieces = split_polyline(list(flat), segment, radius)
+        if pieces is None:
+            new_map[item_id] = flat
+            continue
+        changed = True
+        options = {name: canvas.itemcget(item_id, name) for name in LINE_OPTIONS}
+        tags = canvas.gettags(item_id)
+        canvas.delete(item_id)
+        for piece, screen in zip(pieces, app.viewport.to_screen_many(pieces)):
+            new_id = canvas.create_line(*screen, tags=tags, **options)
+            new_map[new_id] = piece
+
+    if not changed:
+        return False
+    if not new_map:
+        _delete_object(app, tag)
+        return True
+    # 矢量直线拆分后与笔迹一样按图元保存逻辑坐标
+    state.pop('original_coords', None)
+    state['original_coords_map'] = new_map
+    return True
+
+
+def _erase_raster(app, tag, state, segment, radius):
+    """光栅对象：在源位图上清除胶囊覆盖区域的 alpha，返回是否有像素被擦除"""
+    pil_img = state.get('original_pil_image')
+    inverse = invert_matrix(raster_matrix(state))
+    if pil_img is None or inverse is None:
+        return False
+    ia, ib, ic, id_, ie, if_ = inverse
+    cx, cy, dx, dy = segment
+    p0 = (ia * cx + ib * cy + ic, id_ * cx + ie * cy + if_)
+    p1 = (ia * dx + ib * dy + ic, id_ * dx + ie * dy + if_)
+    pixel_radius = radius * math.sqrt(abs(ia * ie - ib * id_))
+
+    # 只处理胶囊覆盖的像素范围
+    left = max(int(math.floor(min(p0[0], p1[0]) - pixel_radius)) - 1, 0)
+    top = max(int(math.floor(min(p0[1], p1[1]) - pixel_radius)) - 1, 0)
+    right = min(int(math.ceil(max(p0[0], p1[0]) + pixel_radius)) + 1, pil_img.width)
+    bottom = min(int(math.ceil(max(p0[1], p1[1]) + pixel_radius)) + 1, pil_img.height)
+    if left >= right or top >= bottom:
+        return False
+
+    box = (left, top, right, bottom)
+    mask = Image.new("L", (right - left, bottom - top), 0)
+    draw = ImageDraw.Draw(mask)
+    x0, y0, x1, y1 = p0[0] - left, p0[1] - top, p1[0] - left, p1[1] - top
+    draw.line((x0, y0, x1, y1), fill=255, width=max(int(round(pixel_radius * 2)), 1))
+    for x, y in ((x0, y0), (x1, y1)):
+        draw.ellipse((x - pixel_radius, y - pixel_radius, x + pixel_radius, y + pixel_radius), fill=255)
+
+    region = pil_img.getchannel('A').crop(box) if pil_img.mode == "RGBA" else Image.new("L", mask.size, 255)
+    erased = ImageChops.subtract(region, mask)
+    if ImageChops.difference(region, erased).getbbox() is None:
+        return False
+
+    session = app.erase_session
+    if tag not in session['owned']:
+        # 写时复制：位图可能与复制出的对象共享，每次拖动只复制一次
+        pil_img = pil_img.convert("RGBA") if pil_img.mode != "RGBA" else pil_img.copy()
+        state['original_pil_image'] = pil_img
+        session['owned'].add(tag)
+    alpha = pil_img.getchannel('A')
+    alpha.paste(erased, box)
+    pil_img.putalpha(alpha)
+
+    for item_id in app.canvas.find_withtag(tag):
+        if app.canvas.type(item_id) == 'image':
+            # 位图原地修改，需强制重新采样
+            app._raster_render_keys.pop(item_id, None)
+            show_raster(app, item_id, state)
+    return True
+
+
+def _trim_raster(app, tag, state):
+    """松开时裁掉位图四周全透明的部分；完全擦空时删除对象"""
+    pil_img = state['original_pil_image']
+    bbox = pil_img.getchannel('A').getbbox()
+    if bbox is None:
+        _delete_object(app, tag)
+        return
+    if bbox == (0, 0) + pil_img.size:
+        return
+    state['original_pil_image'] = pil_img.crop(bbox)
+    state['matrix'] = compose_matrix(raster_matrix(state), (1.0, 0.0, bbox[0], 0.0, 1.0, bbox[1]))
+    update_raster_anchor(state)
+    for item_id in app.canvas.find_withtag(tag):
+        if app.canvas.type(item_id) == 'image':
+            show_raster(app, item_id, state)
+
+
+def _delete_object(app, tag):
+    for item_id in app.canvas.find_withtag(tag):
+        app._image_references.pop(item_id, None)
+        app._raster_render_keys.pop(item_id, None)
+    app.canvas.delete(tag)
+    app.object_states.pop(tag, None)
+    app._surface_image_cache.pop(tag, None)
+    app.selection_group.discard(tag)
+
+
+def _erasable_kind(state):
+    if state.get('original_pil_image') is not None:
+        return 'raster'
+    if state.get('original_coords_map'):
+        return 'lines'
+    if state.get('tool') == 'line' and len(state.get('original_coords') or ()) >= 4:
+        return 'lines'
+    return None
+
+
+def build_erase_index(app, layer_id):
+    """活动图层上可擦除对象的空间索引（光栅对象按位图实际覆盖范围）"""
+    index = SpatialIndex()
+    for tag in app.layer_registry.objects_on(layer_id):
+        state = app.object_states.get(tag)
+        kind = _erasable_kind(state) if state else None
+        if kind == 'raster':
+            corners = raster_corners(state)
+            bbox = (min(corners[0::2]), min(corners[1::2]), max(corners[0::2]), max(corners[1::2]))
+        elif kind == 'lines':
+            bbox = geometry_bbox(object_geometry(state))
+        else:
+            continue
+        if bbox is not None:
+            index.insert(tag, bbox)
+    return index
+
+
+def begin_erase(app, x, y):
+    """按下局部橡皮擦：为活动图层建立空间索引，并擦除落点处，返回是否有改动"""
+    index = build_erase_index(app, app.active_layer_id)
+    app.erase_session = {
+        'index': index,
+        'last': tuple(app.viewport.to_logical([x, y])),
+        'owned': set(),
+        'rasters': set(),
+    }
+    return update_erase(app, x, y)
+
+
+def update_erase(app, x, y):
+    """拖动局部橡皮擦：擦除上一点到当前点扫过的区域，返回是否有改动"""
+    session = app.erase_session
+    if session is None:
+        return False
+    lx, ly = app.viewport.to_logical([x, y])
+    cx, cy = session['last']
+    session['last'] = (lx, ly)
+    # 橡皮尺寸以屏幕像素计
+    radius = app.brush_size / 2.0 / max(app.zoom_level, 1e-9)
+    segment = (cx, cy, lx, ly)
+    rect = (min(cx, lx) - radius, min(cy, ly) - radius, max(cx, lx) + radius, max(cy, ly) + radius)
+
+    changed = False
+    for tag in session['index'].query(rect):
+        state = app.object_states.get(tag)
+        kind = _erasable_kind(state) if state else None
+        if kind == 'raster':
+            if _erase_raster(app, tag, state, segment, radius):
+                session['rasters'].add(tag)
+                changed = True
+        elif kind == 'lines':
+            changed = _erase_lines(app, tag, state, segment, radius) or changed
+    if changed and app.selection_group:
+        app.selection_group.invalidate()
+        app._draw_resize_handles()
+    return changed
+
+
+def end_erase(app):
+    """松开局部橡皮擦：收紧被擦过的位图"""
+    session = app.erase_session
+    if session is None:
+        return
+    app.erase_session = None
+    for tag in session['rasters']:
+        state = app.object_states.get(tag)
+        if state and state.get('original_pil_image') is not None:
+            _trim_raster(app, tag, state)
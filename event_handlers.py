@@ -6,8 +6,9 @@ Event handlers for drawing, selection, and transformation in DrawingApp.
 import time
 import math
 from utils import rotate_point
-from PIL import ImageTk, Image
 from drawing_utils import create_rasterized_image
+from transform import (scale_about_matrix, rotate_about_matrix, show_proxy_transform, show_raster,
+                       compose_matrix, raster_matrix, raster_corners, placement_matrix)
 
 
 def on_mouse_move_canvas(app, event):
@@ -37,6 +38,7 @@ def start_drawing(app, event):
     if app.space_pressed:
         app.pan_start_x = event.x
         app.pan_start_y = event.y
+        app.canvas.scan_mark(event.x, event.y)
         return
     
     if app.current_tool == "select":
@@ -83,6 +85,16 @@ def start_drawing(app, event):
             return
 
         clicked_tag = None
+        if app._composited_layers and (not item_id or app.active_layer_id not in app.canvas.gettags(item_id)):
+            # 未点中活动图层的对象：检查非编辑图层（以合成位图显示）在该处是否有内容，
+            # 有则切换到该图层，再拾取其真实Canvas项
+            from layer_cache import pick_composited_layer
+            layer_id = pick_composited_layer(app, event.x, event.y)
+            if layer_id:
+                app.select_layer(layer_id)
+                hits = [i for i in app.canvas.find_overlapping(event.x - 1, event.y - 1, event.x + 1, event.y + 1)
+                        if layer_id in app.canvas.gettags(i)]
+                item_id = hits[-1] if hits else None
         if item_id:
             item_tags = app.canvas.gettags(item_id)
             if app.active_layer_id not in item_tags and "grid_line" not in item_tags: 
@@ -110,8 +122,14 @@ def start_drawing(app, event):
         app._draw_resize_handles()
 
         if clicked_tag and clicked_tag in app.selection_group:
+            from selection import begin_move_drag
             app.drag_mode = "move"
-            app.last_x, app.last_y = event.x, event.y
+            begin_move_drag(app, event.x, event.y)
+        elif not clicked_tag:
+            # 点在空白处：开始框选（按住 Shift 时在现有选区上追加）
+            from marquee import begin_marquee
+            app.drag_mode = "marquee"
+            begin_marquee(app, event.x, event.y, shift_pressed)
         else:
             app.drag_mode = None
     
@@ -148,8 +166,11 @@ def start_drawing(app, event):
                     break
     elif app.current_tool == "eraser":
         app.erased_in_drag = False
-        app.current_stroke_tag = f"erase_stroke_{time.time()}"
-        app.draw(event)
+        if app.eraser_mode == "对象":
+            app.draw(event)
+        else:
+            from eraser import begin_erase
+            app.erased_in_drag = begin_erase(app, event.x, event.y)
     else:
         app.start_x, app.start_y = event.x, event.y
         if app.current_tool == "pencil":
@@ -161,8 +182,7 @@ def stop_drawing(app, event):
     
     # 如果空格键拖动结束，不需要做其他处理
     if app.space_pressed and app.pan_start_x is not None:
-        app.pan_start_x = None
-        app.pan_start_y = None
+        end_pan(app)
         return
     
     # 释放曲线/曲面控制点拖拽
@@ -170,8 +190,21 @@ def stop_drawing(app, event):
         app.release_control_point_drag(event)
         return
     
+    if app.current_tool == "select" and app.drag_mode == "marquee":
+        from marquee import end_marquee
+        end_marquee(app)
+        app.drag_mode = None
+        return
+
     if app.current_tool == "select" and app.drag_mode:
         action_completed = True
+
+        # 代理预览过的光栅对象按最终状态完整光栅化一次
+        if app._proxy_pending:
+            from transform import finish_proxy_transforms
+            finish_proxy_transforms(app)
+        if app.drag_mode != "move":
+            app.selection_group.invalidate()
         
         # If there were temporary state updates from resizing, commit them now.
         if hasattr(app, '_temp_state_updates'):
@@ -180,45 +213,61 @@ def stop_drawing(app, event):
                     app.object_states[tag].update(updates)
             del app._temp_state_updates
 
+        # 移动：累计的逻辑位移一次性写回，不再从屏幕坐标反推
+        moved = app.drag_mode == "move"
+        if moved:
+            from selection import end_move_drag
+            end_move_drag(app)
+
+        vector_targets, vector_screen_coords = [], []
         for tag in app.selection_group:
             if tag in app.object_states:
                 state = app.object_states[tag]
                 item_ids = app.canvas.find_withtag(tag)
                 if not item_ids: continue
                 
-                # 图像变换结束时，不再将旋转/缩放后的临时位图“烘焙”回原图。
-                # 这样可以：
-                # 1) 保持 state['angle'] 的真实累积值，后续缩放基于对象自身轴向，不会被当作 0 度导致剪切；
-                # 2) 避免重复对已旋转过的位图再次旋转，防止包围盒膨胀与画质劣化。
-                if app.canvas.type(item_ids[0]) == 'image' and hasattr(app, '_temp_pil_image'):
-                    # 仅清理临时缓存，保持 original_pil_image 为未叠加变换的基准图。
-                    del app._temp_pil_image
-
-                # For vector shapes, update their coords (convert screen to logical first)
-                if app.canvas.type(item_ids[0]) != 'image':
-                    from coordinate_system import screen_to_logical
-                    app.canvas.update_idletasks()
-                    canvas_width = max(app.canvas.winfo_width(), 1)
-                    canvas_height = max(app.canvas.winfo_height(), 1)
-                    
-                    screen_coords = app.canvas.coords(item_ids[0])
-                    logical_coords = screen_to_logical(
-                        screen_coords,
-                        app.zoom_level,
-                        app.pan_offset_x,
-                        app.pan_offset_y,
-                        canvas_width,
-                        canvas_height
-                    )
-                    state['original_coords'] = logical_coords
+                # 图像变换只复合到 state['matrix']，original_pil_image 始终是未变换的源位图，
+                # 多次旋转/缩放不会叠加重采样，也不会使包围盒膨胀。
+
+                # For vector shapes, update their coords (collected and converted to logical in one pass below)
+                if not moved and app.canvas.type(item_ids[0]) != 'image':
+                    coords_map = state.get('original_coords_map')
+                    if coords_map:
+                        # 多图元对象逐图元写回坐标表
+                        for item_id in item_ids:
+                            if item_id in coords_map:
+                                vector_targets.append((tag, item_id))
+                                vector_screen_coords.append(app.canvas.coords(item_id))
+                    else:
+                        vector_targets.append((tag, None))
+                        vector_screen_coords.append(app.canvas.coords(item_ids[0]))
 
                 # 更新参考变换状态，确保后续缩放使用最新的逻辑基准
-                state['zoom_ref'] = app.zoom_level
+                # （光栅对象的像素比例由 matrix 决定；旧状态仍依赖 zoom_ref，不能改写）
+                if 'original_pil_image' not in state:
+                    state['zoom_ref'] = app.zoom_level
                 state['pan_ref_x'] = app.pan_offset_x
                 state['pan_ref_y'] = app.pan_offset_y
 
                 # 保留累积的角度信息，避免后续重绘时被强制“回正”
 
+        if vector_targets:
+            from coordinate_system import screen_to_logical_many
+            canvas_width, canvas_height = app.viewport.size
+            all_logical_coords = screen_to_logical_many(
+                vector_screen_coords,
+                app.zoom_level,
+                app.pan_offset_x,
+                app.pan_offset_y,
+                canvas_width,
+                canvas_height
+            )
+            for (tag, item_id), logical_coords in zip(vector_targets, all_logical_coords):
+                if item_id is None:
+                    app.object_states[tag]['original_coords'] = logical_coords
+                else:
+                    app.object_states[tag]['original_coords_map'][item_id] = logical_coords
+
         app.drag_mode = None
         app.original_group_states.clear()
         
@@ -234,10 +283,8 @@ def stop_drawing(app, event):
             action_completed = True
             if app.temp_shape: app.canvas.delete(app.temp_shape)
             app.temp_shape = None
-            from coordinate_system import screen_to_logical, logical_to_screen
-            app.canvas.update_idletasks()
-            canvas_width = max(app.canvas.winfo_width(), 1)
-            canvas_height = max(app.canvas.winfo_height(), 1)
+            from coordinate_system import screen_to_logical
+            canvas_width, canvas_height = app.viewport.size
 
             logical_coords = screen_to_logical(
                 [app.start_x, app.start_y, event.x, event.y],
@@ -259,27 +306,12 @@ def stop_drawing(app, event):
             img, (x1, y1) = create_rasterized_image(app, state)
             
             if img:
-                # 根据缩放级别调整显示尺寸
-                display_img = img
-                if app.zoom_level != 1.0:
-                    new_w = max(int(img.width * app.zoom_level), 1)
-                    new_h = max(int(img.height * app.zoom_level), 1)
-                    display_img = img.resize((new_w, new_h), Image.Resampling.LANCZOS)
-                
-                tk_img = ImageTk.PhotoImage(display_img)
-                screen_xy = logical_to_screen(
-                    [x1, y1],
-                    app.zoom_level,
-                    app.pan_offset_x,
-                    app.pan_offset_y,
-                    canvas_width,
-                    canvas_height
-                )
-                img_id = app.canvas.create_image(screen_xy[0], screen_xy[1], image=tk_img, anchor='nw', tags=tags)
-                app._image_references[img_id] = tk_img
-                
-                state['original_coords'] = logical_coords
+                # 位图以逻辑像素为单位，左上角位于 (x1, y1)
+                state['original_coords'] = [x1, y1]
                 state['original_pil_image'] = img
+                state['matrix'] = placement_matrix(x1, y1)
+                img_id = app.canvas.create_image(0, 0, anchor='nw', tags=tags)
+                show_raster(app, img_id, state)
                 app.object_states[tags[0]] = state
         else:
             action_completed = True
@@ -291,9 +323,7 @@ def stop_drawing(app, event):
             if item_id:
                 # 将屏幕坐标转换为逻辑坐标后保存
                 from coordinate_system import screen_to_logical
-                app.canvas.update_idletasks()
-                canvas_width = max(app.canvas.winfo_width(), 1)
-                canvas_height = max(app.canvas.winfo_height(), 1)
+                canvas_width, canvas_height = app.viewport.size
                 
                 screen_coords = app.canvas.coords(item_id)
                 logical_coords = screen_to_logical(
@@ -306,6 +336,7 @@ def stop_drawing(app, event):
                 )
                 
                 app.object_states[tags[0]] = {
+                    'tool': app.current_tool,
                     'angle': 0,
                     'original_coords': logical_coords,
                     'zoom_ref': app.zoom_level, 'pan_ref_x': app.pan_offset_x, 'pan_ref_y': app.pan_offset_y
@@ -319,7 +350,17 @@ def stop_drawing(app, event):
         if stroke_ids:
             if app.use_rasterization:
                 action_completed = True
-                all_coords = [app.canvas.coords(item_id) for item_id in stroke_ids]
+                # 笔触线段转换为逻辑坐标后再光栅化，位图与其他光栅对象一样以逻辑像素为单位
+                from coordinate_system import screen_to_logical_many
+                canvas_width, canvas_height = app.viewport.size
+                all_coords = screen_to_logical_many(
+                    [app.canvas.coords(item_id) for item_id in stroke_ids],
+                    app.zoom_level,
+                    app.pan_offset_x,
+                    app.pan_offset_y,
+                    canvas_width,
+                    canvas_height
+                )
                 app.canvas.delete(app.current_stroke_tag)
                 
                 state = {
@@ -331,66 +372,28 @@ def stop_drawing(app, event):
                 img, (x1, y1) = create_rasterized_image(app, state)
                 
                 if img:
-                    # 根据缩放级别调整显示尺寸
-                    from coordinate_system import screen_to_logical, logical_to_screen
-                    app.canvas.update_idletasks()
-                    canvas_width = max(app.canvas.winfo_width(), 1)
-                    canvas_height = max(app.canvas.winfo_height(), 1)
-                    
-                    display_img = img
-                    if app.zoom_level != 1.0:
-                        new_w = max(int(img.width * app.zoom_level), 1)
-                        new_h = max(int(img.height * app.zoom_level), 1)
-                        display_img = img.resize((new_w, new_h), Image.Resampling.LANCZOS)
-                    
-                    tk_img = ImageTk.PhotoImage(display_img)
-                    
-                    # 转换逻辑坐标为屏幕坐标
-                    screen_coords = [x1, y1]
-                    logical_coords = screen_to_logical(
-                        screen_coords,
-                        app.zoom_level,
-                        app.pan_offset_x,
-                        app.pan_offset_y,
-                        canvas_width,
-                        canvas_height
-                    )
-                    screen_pos = logical_to_screen(
-                        logical_coords[:2],
-                        app.zoom_level,
-                        app.pan_offset_x,
-                        app.pan_offset_y,
-                        canvas_width,
-                        canvas_height
-                    )
-                    
-                    img_id = app.canvas.create_image(screen_pos[0], screen_pos[1], image=tk_img, anchor='nw', tags=tags)
-                    app._image_references[img_id] = tk_img
-                    
-                    state['original_coords'] = logical_coords
+                    state['original_coords'] = [x1, y1]
                     state['original_pil_image'] = img
+                    state['matrix'] = placement_matrix(x1, y1)
+                    img_id = app.canvas.create_image(0, 0, anchor='nw', tags=tags)
+                    show_raster(app, img_id, state)
                     app.object_states[tags[0]] = state
             else:
                 action_completed = True
                 
-                # 将所有笔触行段的屏幕坐标转换为逻辑坐标
-                from coordinate_system import screen_to_logical
-                app.canvas.update_idletasks()
-                canvas_width = max(app.canvas.winfo_width(), 1)
-                canvas_height = max(app.canvas.winfo_height(), 1)
+                # 将所有笔触行段的屏幕坐标拼接后一次转换为逻辑坐标
+                from coordinate_system import screen_to_logical_many
+                canvas_width, canvas_height = app.viewport.size
                 
-                logical_coords_map = {}
-                for item_id in stroke_ids:
-                    screen_coords = app.canvas.coords(item_id)
-                    logical_coords = screen_to_logical(
-                        screen_coords,
-                        app.zoom_level,
-                        app.pan_offset_x,
-                        app.pan_offset_y,
-                        canvas_width,
-                        canvas_height
-                    )
-                    logical_coords_map[item_id] = logical_coords
+                all_logical_coords = screen_to_logical_many(
+                    [app.canvas.coords(item_id) for item_id in stroke_ids],
+                    app.zoom_level,
+                    app.pan_offset_x,
+                    app.pan_offset_y,
+                    canvas_width,
+                    canvas_height
+                )
+                logical_coords_map = dict(zip(stroke_ids, all_logical_coords))
                 
                 app.object_states[app.current_stroke_tag] = {
                     'angle': 0,
@@ -399,36 +402,54 @@ def stop_drawing(app, event):
                 }
         app.current_stroke_tag = None
         
-    elif app.current_tool == "eraser" and app.erased_in_drag:
-        action_completed, app.erased_in_drag, app.current_stroke_tag = True, False, None
+    elif app.current_tool == "eraser":
+        if app.erase_session is not None:
+            from eraser import end_erase
+            end_erase(app)
+        if app.erased_in_drag:
+            action_completed, app.erased_in_drag = True, False
         
     if action_completed:
         app.update_layer_stacking()
         app._capture_and_save_state()
 
 
-def draw_on_canvas(app, event):
-    # 如果按住空格键，拖动画布
-    if app.space_pressed and app.pan_start_x is not None:
-        dx = event.x - app.pan_start_x
-        dy = event.y - app.pan_start_y
-        
-        # 物理移动所有对象
+def end_pan(app):
+    """
+    结束画布拖动：把拖动期间的视图偏移一次性落实到图元与 pan_offset
+
+    拖动过程中仅通过 scan_dragto 平移 Canvas 视图（不触碰任何图元），
+    松开时将视图复位，再对全部图元做一次 move，并按位移更新逻辑平移量。
+    """
+    if app.pan_start_x is None:
+        return
+    app.pan_start_x = None
+    app.pan_start_y = None
+
+    # 视图左上角在 Canvas 坐标中的位置即为内容的反向位移
+    view_x = int(app.canvas.canvasx(0))
+    view_y = int(app.canvas.canvasy(0))
+    if view_x or view_y:
+        app.canvas.scan_mark(0, 0)
+        app.canvas.scan_dragto(view_x, view_y, gain=1)
+        dx, dy = -view_x, -view_y
         app.canvas.move("all", dx, dy)
-        
-        # 核心修正：严格按照当前缩放倍率反推逻辑偏移量
-        # 强制使用 max 防止 zoom 为 0 导致的崩溃
+
+        # 严格按照当前缩放倍率反推逻辑偏移量
         zoom = max(app.zoom_level, 1e-9)
         app.pan_offset_x += dx / zoom
         app.pan_offset_y += dy / zoom
-        
-        app.pan_start_x = event.x
-        app.pan_start_y = event.y
-        
-        # 重新绘制网格以保持同步
+
+        # 新露出的区域需要补画网格
         if app.grid_visible:
             app.draw_grid()
-        
+    app.refresh_layer_composites()
+
+
+def draw_on_canvas(app, event):
+    # 如果按住空格键，拖动画布：只平移 Canvas 视图，不移动任何图元
+    if app.space_pressed and app.pan_start_x is not None:
+        app.canvas.scan_dragto(event.x, event.y, gain=1)
         return
     
     # 处理曲线和曲面控制点拖拽
@@ -437,83 +458,43 @@ def draw_on_canvas(app, event):
             app.handle_curve_control_point_drag(event)
         return
     
+    if app.current_tool == "select" and app.drag_mode == "marquee":
+        from marquee import update_marquee
+        update_marquee(app, event.x, event.y)
+        return
+
     if app.current_tool == "select" and app.selection_group and app.drag_mode:
         if app.drag_mode == "move":
-            dx, dy = event.x - app.last_x, event.y - app.last_y
-            for tag in app.selection_group:
-                app.canvas.move(tag, dx, dy)
-                
-                # 修复：同步更新 object_states 里的逻辑数据，防止曲面/曲线"传送回中心"
-                state = app.object_states.get(tag)
-                if state:
-                    # 将屏幕像素位移转换为逻辑位移
-                    zoom = max(app.zoom_level, 1e-9)
-                    dlx, dly = dx / zoom, dy / zoom
-                    
-                    # 更新曲面的控制网格
-                    if 'control_grid' in state:
-                        state['control_grid'] = [
-                            [(p[0] + dlx, p[1] + dly, p[2]) for p in row] 
-                            for row in state['control_grid']
-                        ]
-                    
-                    # 更新曲线的控制点
-                    if 'control_points' in state:
-                        state['control_points'] = [
-                            (p[0] + dlx, p[1] + dly) for p in state['control_points']
-                        ]
-                    
-                    # 更新普通图形的逻辑坐标（但不包括光栅图像，它们有特殊处理）
-                    if 'original_coords' in state:
-                        item_ids = app.canvas.find_withtag(tag)
-                        if item_ids:
-                            item_type = app.canvas.type(item_ids[0])
-                            if item_type != 'image':
-                                state['original_coords'] = [
-                                    c + (dlx if i % 2 == 0 else dly) 
-                                    for i, c in enumerate(state['original_coords'])
-                                ]
-                    
-                    # 更新曲线的逻辑坐标（曲线对象同时有control_points和original_coords）
-                    if 'original_coords' in state and tag.startswith("curve_"):
-                        state['original_coords'] = [
-                            c + (dlx if i % 2 == 0 else dly) 
-                            for i, c in enumerate(state['original_coords'])
-                        ]
-                    
-                    # 更新光栅图像的逻辑位置
-                    if 'start_xy' in state:
-                        state['start_xy'] = (state['start_xy'][0] + dlx, state['start_xy'][1] + dly)
-                    if 'end_xy' in state:
-                        state['end_xy'] = (state['end_xy'][0] + dlx, state['end_xy'][1] + dly)
-                    
-                    # 更新笔触的坐标映射
-                    if 'original_coords_map' in state:
-                        for seg_id in state['original_coords_map']:
-                            state['original_coords_map'][seg_id] = [
-                                c + (dlx if i % 2 == 0 else dly)
-                                for i, c in enumerate(state['original_coords_map'][seg_id])
-                            ]
-            
-            app.canvas.move("handle", dx, dy) 
-            app.last_x, app.last_y = event.x, event.y
-        elif app.drag_mode == "resize" and app.original_bbox: _handle_resize(app, event)
-        elif app.drag_mode == "rotate": _handle_rotate(app, event)
+            from selection import update_move_drag
+            update_move_drag(app, event.x, event.y)
+        elif app.drag_mode in ("resize", "rotate"):
+            frame_start = time.perf_counter()
+            if app.drag_mode == "resize":
+                if app.original_bbox: _handle_resize(app, event)
+            else:
+                _handle_rotate(app, event)
+            _report_frame_time(app, time.perf_counter() - frame_start)
     
     elif app.current_tool == "eraser":
-        app.erased_in_drag = True
         if app.eraser_mode == "对象":
+            app.erased_in_drag = True
             items_under_cursor = app.canvas.find_overlapping(event.x - app.brush_size / 2, event.y - app.brush_size / 2, event.x + app.brush_size / 2, event.y + app.brush_size / 2)
             tags_to_delete = {t for item in items_under_cursor for t in app.canvas.gettags(item) if t.startswith(("stroke_", "shape_")) and app.active_layer_id in app.canvas.gettags(item)}
             if tags_to_delete:
                 for tag in tags_to_delete:
+                    for item_id in app.canvas.find_withtag(tag):
+                        app._image_references.pop(item_id, None)
+                        app._raster_render_keys.pop(item_id, None)
                     app.canvas.delete(tag)
                     if tag in app.object_states: del app.object_states[tag]
+                    app._surface_image_cache.pop(tag, None)
                     if tag in app.selection_group: app.selection_group.remove(tag)
                 app._draw_resize_handles()
-        else: 
-            r = app.brush_size / 2
-            app.canvas.create_oval(event.x - r, event.y - r, event.x + r, event.y + r, fill=app.canvas_bg_color, outline=app.canvas_bg_color, tags=("eraser_mark", app.current_stroke_tag, app.active_layer_id))
+        else:
+            # 局部擦除：直接剪切笔迹几何 / 清除位图 alpha，不再叠加背景色圆点
+            from eraser import update_erase
+            if update_erase(app, event.x, event.y):
+                app.erased_in_drag = True
     
     elif app.current_tool not in ["polygon", "fill", "select", "text"] and app.start_x is not None:
         # 根据缩放调整预览线宽
@@ -529,6 +510,15 @@ def draw_on_canvas(app, event):
             elif app.current_tool == "circle": app.temp_shape = app.canvas.create_oval(app.start_x, app.start_y, event.x, event.y, outline=app.current_color, width=display_width, fill=app.current_fill_color)
 
 
+def _report_frame_time(app, seconds):
+    """记录并显示变换拖拽单帧耗时（毫秒），超过 16 ms 时标红"""
+    app.last_frame_ms = seconds * 1000.0
+    label = getattr(app, 'frame_time_label', None)
+    if label is not None:
+        color = "#FF6666" if app.last_frame_ms > 16.0 else ("gray10", "gray90")
+        label.configure(text=f"{app.last_frame_ms:.1f} ms", text_color=color)
+
+
 def _handle_resize(app, event):
     x1_orig_bbox, y1_orig_bbox, x2_orig_bbox, y2_orig_bbox = app.original_bbox
     origin_x, origin_y = (x1_orig_bbox + x2_orig_bbox) / 2, (y1_orig_bbox + y2_orig_bbox) / 2
@@ -537,20 +527,8 @@ def _handle_resize(app, event):
     if "top" in app.drag_handle_type: origin_y = y2_orig_bbox
     elif "bottom" in app.drag_handle_type: origin_y = y1_orig_bbox
     
-    from coordinate_system import screen_to_logical, logical_to_screen
-    app.canvas.update_idletasks()
-    canvas_width = max(app.canvas.winfo_width(), 1)
-    canvas_height = max(app.canvas.winfo_height(), 1)
-
-    logical_bbox = screen_to_logical(
-        [x1_orig_bbox, y1_orig_bbox, x2_orig_bbox, y2_orig_bbox],
-        app.zoom_level,
-        app.pan_offset_x,
-        app.pan_offset_y,
-        canvas_width,
-        canvas_height
-    )
-    lx1, ly1, lx2, ly2 = logical_bbox
+    # 原包围盒与当前鼠标位置一起做一次坐标变换
+    lx1, ly1, lx2, ly2, ex_l, ey_l = app.viewport.to_logical([x1_orig_bbox, y1_orig_bbox, x2_orig_bbox, y2_orig_bbox, event.x, event.y])
     origin_lx, origin_ly = (lx1 + lx2) / 2, (ly1 + ly2) / 2
     if "left" in app.drag_handle_type: origin_lx = lx2
     elif "right" in app.drag_handle_type: origin_lx = lx1
@@ -558,15 +536,6 @@ def _handle_resize(app, event):
     elif "bottom" in app.drag_handle_type: origin_ly = ly1
 
     old_w_logical, old_h_logical = (lx2 - lx1) or 1, (ly2 - ly1) or 1
-    event_logical = screen_to_logical(
-        [event.x, event.y],
-        app.zoom_level,
-        app.pan_offset_x,
-        app.pan_offset_y,
-        canvas_width,
-        canvas_height
-    )
-    ex_l, ey_l = event_logical[0], event_logical[1]
 
     new_w_logical, new_h_logical = old_w_logical, old_h_logical
     if "left" in app.drag_handle_type: new_w_logical = origin_lx - ex_l
@@ -578,14 +547,7 @@ def _handle_resize(app, event):
     if "center" in app.drag_handle_type: scale_x = 1.0
     if "middle" in app.drag_handle_type: scale_y = 1.0
 
-    origin_screen = logical_to_screen(
-        [origin_lx, origin_ly],
-        app.zoom_level,
-        app.pan_offset_x,
-        app.pan_offset_y,
-        canvas_width,
-        canvas_height
-    )
+    origin_screen = app.viewport.to_screen([origin_lx, origin_ly])
     origin_x, origin_y = origin_screen[0], origin_screen[1]
 
     # 定义局部坐标变换函数:全局->局部(逆旋转)->缩放->全局(正旋转)
@@ -657,16 +619,14 @@ def _handle_resize(app, event):
             scale_x = new_w_logical / old_w_logical if "center" not in app.drag_handle_type else 1.0
             scale_y = new_h_logical / old_h_logical if "middle" not in app.drag_handle_type else 1.0
 
-            temp_state = original_state.copy()
-            temp_state['angle'] = angle_deg
+            # 参数化形状（未旋转）以拖动手柄的对侧为锚点；其余沿对象自身轴向绕几何中心缩放
+            if 'start_xy' in original_state and 'end_xy' in original_state and not angle_deg:
+                scale_matrix = scale_about_matrix(anchor_x, anchor_y, scale_x, scale_y)
+            else:
+                scale_matrix = scale_about_matrix(center_lx, center_ly, scale_x, scale_y, angle_rad)
+            ma, mb, mc, md, me, mf = scale_matrix
 
-            # 定义：局部坐标变换函数（仅供显式点使用）
-            def transform_point_locally(px, py, center_x, center_y, angle_rad, sx, sy):
-                tx, ty = px - center_x, py - center_y
-                rx, ry = rotate_point(tx, ty, -angle_rad, 0, 0)
-                scaled_rx, scaled_ry = rx * sx, ry * sy
-                fx, fy = rotate_point(scaled_rx, scaled_ry, angle_rad, 0, 0)
-                return fx + center_x, fy + center_y
+            temp_state = original_state.copy()
 
             # 处理矩形/圆（参数化）：在全局空间中直接缩放，保留角度
             if 'start_xy' in original_state and 'end_xy' in original_state:
@@ -680,67 +640,40 @@ def _handle_resize(app, event):
                 temp_state['start_xy'] = (new_sx, new_sy)
                 temp_state['end_xy'] = (new_ex, new_ey)
 
+            # 显式点集与笔迹线段：与位图使用同一矩阵
             if 'points' in original_state and original_state['points']:
-                # 计算多边形几何中心作为缩放基准
-                xs, ys = zip(*original_state['points'])
-                geom_cx, geom_cy = (min(xs) + max(xs)) / 2, (min(ys) + max(ys)) / 2
-                # 在局部坐标系中缩放（正确处理旋转）
-                scaled_points = []
-                for px, py in original_state['points']:
-                    nx, ny = transform_point_locally(px, py, geom_cx, geom_cy, angle_deg, scale_x, scale_y)
-                    scaled_points.append((nx, ny))
-                temp_state['points'] = scaled_points
-                # 点已在最终位置,不需要 rasterizer 再旋转
-                temp_state['angle'] = 0
+                temp_state['points'] = [(ma * px + mb * py + mc, md * px + me * py + mf)
+                                        for px, py in original_state['points']]
 
             if 'line_segments' in original_state and original_state['line_segments']:
-                # 计算笔迹几何中心
-                xs, ys = [], []
-                for seg in original_state['line_segments']:
-                    xs.extend([seg[0], seg[2]])
-                    ys.extend([seg[1], seg[3]])
-                geom_cx, geom_cy = (min(xs) + max(xs)) / 2, (min(ys) + max(ys)) / 2
-                # 在局部坐标系中缩放线段端点
-                scaled_segments = []
-                for seg in original_state['line_segments']:
-                    x1, y1 = transform_point_locally(seg[0], seg[1], geom_cx, geom_cy, angle_deg, scale_x, scale_y)
-                    x2, y2 = transform_point_locally(seg[2], seg[3], geom_cx, geom_cy, angle_deg, scale_x, scale_y)
-                    scaled_segments.append([x1, y1, x2, y2])
-                temp_state['line_segments'] = scaled_segments
-                # 点已在最终位置,不需要 rasterizer 再旋转
-                temp_state['angle'] = 0
-
-            resized_img, (img_x, img_y) = create_rasterized_image(app, temp_state)
-            if not resized_img: continue
-
-            app._temp_pil_image = resized_img
+                temp_state['line_segments'] = [
+                    [ma * seg[0] + mb * seg[1] + mc, md * seg[0] + me * seg[1] + mf,
+                     ma * seg[2] + mb * seg[3] + mc, md * seg[2] + me * seg[3] + mf]
+                    for seg in original_state['line_segments']
+                ]
+
+            # 位图：在逻辑空间中复合缩放矩阵，源位图保持不变
+            temp_state['matrix'] = compose_matrix(scale_matrix, raster_matrix(original_state))
+            temp_state['angle'] = angle_deg
+            corners = raster_corners(temp_state)
+            temp_state['original_coords'] = [min(corners[0::2]), min(corners[1::2])]
+
             if not hasattr(app, '_temp_state_updates'): app._temp_state_updates = {}
-            updates = {'angle': angle_deg}
+            updates = {'angle': angle_deg, 'matrix': temp_state['matrix'], 'original_coords': temp_state['original_coords']}
             if 'start_xy' in temp_state: updates['start_xy'] = temp_state['start_xy']
             if 'end_xy' in temp_state: updates['end_xy'] = temp_state['end_xy']
             if 'points' in temp_state: updates['points'] = temp_state['points']
             if 'line_segments' in temp_state: updates['line_segments'] = temp_state['line_segments']
             app._temp_state_updates[tag] = updates
 
-            img_coords_screen = logical_to_screen(
-                [img_x, img_y],
-                app.zoom_level,
-                app.pan_offset_x,
-                app.pan_offset_y,
-                canvas_width,
-                canvas_height
-            )
-
-            display_img = resized_img
-            if app.zoom_level != 1.0:
-                new_w = max(int(resized_img.width * app.zoom_level), 1)
-                new_h = max(int(resized_img.height * app.zoom_level), 1)
-                display_img = resized_img.resize((new_w, new_h), Image.Resampling.LANCZOS)
+            if app.use_transform_proxy:
+                # 预览：缓存的显示位图做同一缩放的屏幕空间仿射，松开时再从源位图采样
+                view = app.viewport.matrix()
+                matrix = compose_matrix(compose_matrix(view, scale_matrix), app.viewport.inverse_matrix())
+                show_proxy_transform(app, tag, item_id, matrix, temp_state)
+                continue
 
-            tk_img = ImageTk.PhotoImage(display_img)
-            app.canvas.itemconfig(item_id, image=tk_img)
-            app._image_references[item_id] = tk_img
-            app.canvas.coords(item_id, img_coords_screen[0], img_coords_screen[1])
+            show_raster(app, item_id, temp_state)
         else: # Vector objects can be scaled directly
             original_coords_or_map = app.original_group_states.get(tag)
             if isinstance(original_coords_or_map, dict):
@@ -780,24 +713,13 @@ def _handle_resize(app, event):
                         new_points.append((nx, ny))
                     app._temp_state_updates[tag]['control_points'] = new_points
     
+    app.selection_group.invalidate()
     app._draw_resize_handles()
 
 
 def _handle_rotate(app, event):
-    from coordinate_system import screen_to_logical, logical_to_screen
-    app.canvas.update_idletasks()
-    canvas_width = max(app.canvas.winfo_width(), 1)
-    canvas_height = max(app.canvas.winfo_height(), 1)
-    
     # 将屏幕旋转中心转换为逻辑坐标
-    shape_center_logical = screen_to_logical(
-        [app.shape_center[0], app.shape_center[1]],
-        app.zoom_level,
-        app.pan_offset_x,
-        app.pan_offset_y,
-        canvas_width,
-        canvas_height
-    )
+    shape_center_logical = app.viewport.to_logical([app.shape_center[0], app.shape_center[1]])
     center_lx, center_ly = shape_center_logical[0], shape_center_logical[1]
     
     current_angle_rad = math.atan2(event.y - app.shape_center[1], event.x - app.shape_center[0])
@@ -815,16 +737,18 @@ def _handle_rotate(app, event):
             base_angle_deg = state.get('angle', orig_state.get('angle', 0))
             new_angle_deg = base_angle_deg + math.degrees(rotation_delta_rad)
 
-            temp_state = state.copy()
-            
-            # 对于显式点集,需要更新点坐标而不是角度(防止二次旋转)
+            # 位图：逻辑空间中绕旋转中心复合旋转矩阵，源位图保持不变
+            rotation = rotate_about_matrix(center_lx, center_ly, rotation_delta_rad)
+            temp_state = orig_state.copy()
+            temp_state['matrix'] = compose_matrix(rotation, raster_matrix(orig_state))
+            temp_state['angle'] = new_angle_deg
+            corners = raster_corners(temp_state)
+            temp_state['original_coords'] = [min(corners[0::2]), min(corners[1::2])]
+
+            # 几何随之旋转（用于命中判定与重新着色）
             if 'points' in orig_state and orig_state['points']:
-                rotated_points = []
-                for px, py in orig_state['points']:
-                    nx, ny = rotate_point(px, py, rotation_delta_rad, center_lx, center_ly)
-                    rotated_points.append((nx, ny))
-                temp_state['points'] = rotated_points
-                temp_state['angle'] = 0  # 点已转好,不需再旋转
+                temp_state['points'] = [rotate_point(px, py, rotation_delta_rad, center_lx, center_ly)
+                                        for px, py in orig_state['points']]
             elif 'line_segments' in orig_state and orig_state['line_segments']:
                 rotated_segments = []
                 for seg in orig_state['line_segments']:
@@ -832,40 +756,26 @@ def _handle_rotate(app, event):
                     x2, y2 = rotate_point(seg[2], seg[3], rotation_delta_rad, center_lx, center_ly)
                     rotated_segments.append([x1, y1, x2, y2])
                 temp_state['line_segments'] = rotated_segments
-                temp_state['angle'] = 0  # 同上
-            else:
-                # 参数化形状(矩形/圆),只更新角度
-                temp_state['angle'] = new_angle_deg
-
-            rotated_img, (img_x, img_y) = create_rasterized_image(app, temp_state)
-            if not rotated_img: continue
-
-            app._temp_pil_image = rotated_img
+            elif 'start_xy' in orig_state and 'end_xy' in orig_state:
+                # 参数化形状(矩形/圆)：保持轴向尺寸，按角度记录旋转，中心随旋转中心移动
+                (sx, sy), (ex, ey) = orig_state['start_xy'], orig_state['end_xy']
+                ncx, ncy = rotate_point((sx + ex) / 2, (sy + ey) / 2, rotation_delta_rad, center_lx, center_ly)
+                dx, dy = ncx - (sx + ex) / 2, ncy - (sy + ey) / 2
+                temp_state['start_xy'] = (sx + dx, sy + dy)
+                temp_state['end_xy'] = (ex + dx, ey + dy)
 
-            display_img = rotated_img
-            if app.zoom_level != 1.0:
-                new_w = max(int(rotated_img.width * app.zoom_level), 1)
-                new_h = max(int(rotated_img.height * app.zoom_level), 1)
-                display_img = rotated_img.resize((new_w, new_h), Image.Resampling.LANCZOS)
+            if not hasattr(app, '_temp_state_updates'): app._temp_state_updates = {}
+            app._temp_state_updates[tag] = {key: temp_state[key] for key in
+                                            ('angle', 'matrix', 'original_coords', 'points', 'line_segments', 'start_xy', 'end_xy')
+                                            if key in temp_state}
 
-            tk_img = ImageTk.PhotoImage(display_img)
-            app.canvas.itemconfig(item_id, image=tk_img)
-            app._image_references[item_id] = tk_img
+            if app.use_transform_proxy:
+                # 预览：缓存位图绕旋转中心做仿射旋转，松开时再从源位图采样
+                matrix = rotate_about_matrix(app.shape_center[0], app.shape_center[1], rotation_delta_rad)
+                show_proxy_transform(app, tag, item_id, matrix, temp_state)
+                continue
 
-            screen_pos = logical_to_screen(
-                [img_x, img_y],
-                app.zoom_level,
-                app.pan_offset_x,
-                app.pan_offset_y,
-                canvas_width,
-                canvas_height
-            )
-            app.canvas.coords(item_id, screen_pos[0], screen_pos[1])
-
-            if not hasattr(app, '_temp_state_updates'): app._temp_state_updates = {}
-            app._temp_state_updates[tag] = {
-                'angle': new_angle_deg
-            }
+            show_raster(app, item_id, temp_state)
         else:
             original_coords_or_map = app.original_group_states.get(tag)
             if isinstance(original_coords_or_map, dict):
@@ -876,4 +786,5 @@ def _handle_rotate(app, event):
                 new_coords = [c for p in zip(original_coords_or_map[::2], original_coords_or_map[1::2]) for c in rotate_point(p[0], p[1], rotation_delta_rad, app.shape_center[0], app.shape_center[1])]
                 app.canvas.coords(item_id, *new_coords)
     
-    app._draw_resize_handles()
\ No newline at end of file
+    app.selection_group.invalidate()
+    app._draw_resize_handles()
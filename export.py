@@ -0,0 +1,286 @@
+# export.py
+"""
+导出为图片
+
+- 先把每个可见图层的对象整理为“导出像素坐标”下的绘制指令（曲面网格、位图矩阵只计算一次）；
+- 按 EXPORT_TILE_SIZE 行一条的条带逐条渲染：每条只绘制与其相交的指令，光栅对象只重采样条带内的部分；
+- 结果不超过 EXPORT_MAX_IMAGE_SIDE 时整张保存（支持 PNG / JPEG），否则条带逐条压缩写入 PNG，
+  内存占用只与条带大小有关，20000x20000 的海报画布也能按 1:1 全分辨率导出。
+"""
+import struct
+import zlib
+from tkinter import filedialog, messagebox
+from PIL import Image, ImageDraw, ImageEnhance
+
+EXPORT_TILE_SIZE = 256          # 条带高度（像素）
+EXPORT_MAX_IMAGE_SIDE = 8000    # 整张在内存中生成的最大边长，超过时分条带写入 PNG
+
+
+def _write_png_bands(file_path, width, height, render_band, band_height=EXPORT_TILE_SIZE):
+    """逐条带生成 RGB 像素并流式压缩为 PNG；render_band(y0, h) 返回 width x h 的 RGB 图像"""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    compressor = zlib.compressobj(6)
+    stride = width * 3
+    with open(file_path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        for y0 in range(0, height, band_height):
+            raw = render_band(y0, min(band_height, height - y0)).tobytes()
+            # 每行前加滤波类型 0（None）
+            rows = b"".join(b"\x00" + raw[i:i + stride] for i in range(0, len(raw), stride))
+            data = compressor.compress(rows)
+            if data:
+                f.write(chunk(b"IDAT", data))
+        f.write(chunk(b"IDAT", compressor.flush()))
+        f.write(chunk(b"IEND", b""))
+
+
+def _flat_bbox(pts, pad=0):
+    xs, ys = pts[0::2], pts[1::2]
+    return (min(xs) - pad, min(ys) - pad, max(xs) + pad, max(ys) + pad)
+
+
+def _collect_layer_ops(app, layer_id, export_lx, export_ly, export_scale):
+    """
+    图层上对象的导出绘制指令（导出像素坐标，各条带共用）
+    每条为 (类型, 包围盒, 参数...)，包围盒用于跳过与条带不相交的指令
+    """
+    from surfaces import BezierSurface
+    from curve_surface_tools import surface_lod
+    from transform import compose_matrix, raster_matrix
+    from layer_cache import smooth_coords, smooth_method
+
+    canvas = app.canvas
+    ops = []
+
+    def smoothed(item_id, coords, closed=False):
+        """Canvas 上 smooth 的折线 / 多边形按相同的样条展开"""
+        try:
+            method = smooth_method(canvas.itemcget(item_id, "smooth"))
+            steps = int(canvas.itemcget(item_id, "splinesteps") or 12)
+        except Exception:
+            return coords
+        return smooth_coords(coords, closed, method, steps) if method else coords
+
+    def to_px(coords):
+        return [(c - export_lx if i % 2 == 0 else c - export_ly) * export_scale for i, c in enumerate(coords)]
+
+    for unique_tag, state in app.object_states.items():
+        # 图层过滤（按图层索引中的成员关系，保持对象创建顺序）
+        if app.layer_registry.layer_of(unique_tag) != layer_id:
+            continue
+        items = list(canvas.find_withtag(unique_tag))
+        if not items:
+            continue
+
+        # --- A. 曲面 ---
+        if 'control_grid' in state:
+            surface = BezierSurface(state['control_grid'])
+            color = state.get('color', '#FFFFFF')
+            # 导出始终使用完整细节层次（按导出缩放比例计算）
+            lod = surface_lod(state['control_grid'], export_scale)
+            if state.get('display_mode') == 'wireframe':
+                u_curves, v_curves = surface.get_isocurves(
+                    lod['isocurves'], lod['isocurves'], lod['segments_per_curve']
+                )
+                width = max(1, int(export_scale / 2))
+                for curve in u_curves + v_curves:
+                    pts = to_px([c for p in curve for c in p[:2]])
+                    if len(pts) >= 4:
+                        ops.append(('line', _flat_bbox(pts, width), pts, color, width, None))
+            else:
+                mesh_pts, faces = surface.generate_mesh(lod['mesh'], lod['mesh'])
+                export_pts = [((p[0] - export_lx) * export_scale, (p[1] - export_ly) * export_scale) for p in mesh_pts]
+                for face in faces:
+                    tri = [mesh_pts[i] for i in face]
+                    pts = [c for i in face for c in export_pts[i]]
+                    avg_z = (tri[0][2] + tri[1][2] + tri[2][2]) / 3
+                    gray = int(max(0, min(255, (avg_z + 50) * 2.55)))
+                    ops.append(('polygon', _flat_bbox(pts, 1), pts, f'#{gray:02x}{gray:02x}{gray:02x}', None))
+
+        # --- B. 光栅化图形 ---
+        elif 'original_pil_image' in state or 'original_pil_image_b64' in state:
+            pil_img = state.get('original_pil_image')
+            # 尝试从 Base64 恢复图片（针对刚加载的项目）
+            if pil_img is None and state.get('original_pil_image_b64'):
+                try:
+                    import base64, io
+                    data = base64.b64decode(state['original_pil_image_b64'])
+                    pil_img = Image.open(io.BytesIO(data)).convert('RGBA')
+                except:
+                    pil_img = None
+            if pil_img:
+                # 对象矩阵（位图像素 -> 逻辑）与导出变换（逻辑 -> 导出像素）复合，条带内再按需采样
+                export_matrix = (export_scale, 0.0, -export_lx * export_scale,
+                                 0.0, export_scale, -export_ly * export_scale)
+                matrix = compose_matrix(export_matrix, raster_matrix(state))
+                w, h = pil_img.size
+                corners = [matrix[0] * x + matrix[1] * y + matrix[2] if i % 2 == 0 else matrix[3] * x + matrix[4] * y + matrix[5]
+                           for x, y in ((0, 0), (w, 0), (0, h), (w, h)) for i in (0, 1)]
+                ops.append(('raster', _flat_bbox(corners, 1), pil_img, matrix))
+
+        # --- C. 多图元矢量对象（笔迹、被局部橡皮擦拆开的直线），逐图元按其颜色与线宽绘制 ---
+        elif state.get('original_coords_map'):
+            for item_id, l_coords in state['original_coords_map'].items():
+                if not l_coords or len(l_coords) < 4 or canvas.type(item_id) != "line":
+                    continue
+                pts = to_px(smoothed(item_id, l_coords))
+                try:
+                    f = canvas.itemcget(item_id, "fill")
+                    w = int(float(canvas.itemcget(item_id, "width") or 1) * export_scale)
+                except: f, w = "#FFFFFF", int(export_scale)
+                ops.append(('line', _flat_bbox(pts, w), pts, f, w, "curve"))
+
+        # --- D. 矢量形状 (直线、矩形等) ---
+        elif 'original_coords' in state:
+            item_type = canvas.type(items[0])
+            l_coords = state['original_coords'] or []
+            if item_type in ("line", "polygon"):
+                l_coords = smoothed(items[0], l_coords, item_type == "polygon")
+            pts = to_px(l_coords)
+            if len(pts) < 4:
+                continue
+            try:
+                f = canvas.itemcget(items[0], "fill")
+                o = canvas.itemcget(items[0], "outline") if item_type != "line" else f
+                w = int(float(canvas.itemcget(items[0], "width") or 1) * export_scale)
+            except: f, o, w = "#FFFFFF", "#FFFFFF", int(export_scale)
+            bbox = _flat_bbox(pts, w)
+            if item_type == "line": ops.append(('line', bbox, pts, f, w, None))
+            elif item_type == "rectangle": ops.append(('rectangle', bbox, pts, f or None, o, w))
+            elif item_type == "oval": ops.append(('ellipse', bbox, pts, f or None, o, w))
+            elif item_type == "polygon": ops.append(('polygon', bbox, pts, f or None, o))
+    return ops
+
+
+def _draw_ops(image, ops, y0):
+    """把导出指令绘制到条带图像上，条带左上角对应导出像素 (0, y0)"""
+    draw = ImageDraw.Draw(image)
+    band_w, band_h = image.size
+    y1 = y0 + band_h
+
+    def shift(pts):
+        return [c - y0 if i % 2 else c for i, c in enumerate(pts)]
+
+    for op in ops:
+        bbox = op[1]
+        if bbox[3] < y0 or bbox[1] > y1 or bbox[2] < 0 or bbox[0] > band_w:
+            continue
+        kind = op[0]
+        if kind == 'raster':
+            from transform import render_raster_region
+            out_img, img_x, img_y = render_raster_region(op[2], op[3], (0, y0, band_w, y1))
+            if out_img is None:
+                continue
+            if out_img.mode != 'RGBA':
+                out_img = out_img.convert('RGBA')
+            image.paste(out_img, (img_x, img_y - y0), out_img)
+        elif kind == 'line':
+            _, _, pts, fill, width, joint = op
+            draw.line(shift(pts), fill=fill, width=width, joint=joint)
+        elif kind == 'rectangle':
+            _, _, pts, fill, outline, width = op
+            draw.rectangle(shift(pts), fill=fill, outline=outline, width=width)
+        elif kind == 'ellipse':
+            _, _, pts, fill, outline, width = op
+            draw.ellipse(shift(pts), fill=fill, outline=outline, width=width)
+        elif kind == 'polygon':
+            _, _, pts, fill, outline = op
+            draw.polygon(shift(pts), fill=fill, outline=outline)
+
+
+def _render_band(layer_ops, bg_color, width, y0, height):
+    """渲染导出图像中从第 y0 行开始、高 height 的条带（逐图层合成后铺上背景色），返回 RGB 图像"""
+    final_image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    for layer, ops in layer_ops:
+        layer_image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+        _draw_ops(layer_image, ops, y0)
+        # 合成图层
+        opacity = layer.get('opacity', 1.0)
+        if opacity < 1.0:
+            alpha = layer_image.split()[3]
+            alpha = ImageEnhance.Brightness(alpha).enhance(opacity)
+            layer_image.putalpha(alpha)
+        final_image = Image.alpha_composite(final_image, layer_image)
+    bg = Image.new("RGB", (width, height), bg_color)
+    bg.paste(final_image, (0, 0), final_image)
+    return bg
+
+
+def export_as_image(app):
+    """导出画布为图片，彻底修复曲面塌陷与分辨率问题"""
+    if app.selection_group:
+        app._clear_resize_handles()
+        app.selection_group.clear()
+        app.canvas.update_idletasks()
+
+    file_path = filedialog.asksaveasfilename(
+        defaultextension=".png",
+        filetypes=[("PNG 文件", "*.png"), ("JPEG 文件", "*.jpg")],
+        title="导出为图片"
+    )
+    if not file_path: return
+
+    try:
+        from coordinate_system import get_logical_bounding_box
+
+        # 1. 计算逻辑边界
+        content_bbox = get_logical_bounding_box(app)
+
+        # 导出的图片至少覆盖整个画布（logical_canvas_size），且包含所有内容
+        canvas_w, canvas_h = getattr(app, 'logical_canvas_size', (2000, 1500))
+        canvas_x1, canvas_y1, canvas_x2, canvas_y2 = 0, 0, canvas_w, canvas_h
+
+        if content_bbox is None:
+            # 如果没有内容，导出空白的标准画布
+            lx1, ly1, lx2, ly2 = canvas_x1, canvas_y1, canvas_x2, canvas_y2
+        else:
+            # 取并集：(内容包围盒) U (标准画布)
+            bx1, by1, bx2, by2 = content_bbox
+            lx1 = min(bx1, canvas_x1)
+            ly1 = min(by1, canvas_y1)
+            lx2 = max(bx2, canvas_x2)
+            ly2 = max(by2, canvas_y2)
+
+        margin = 50 # 逻辑边距
+        export_lx, export_ly = lx1 - margin, ly1 - margin
+        logical_w = (lx2 - lx1) + 2 * margin
+        logical_h = (ly2 - ly1) + 2 * margin
+
+        # 2. 计算导出缩放比例
+        # 目标：确保导出的图片长边至少为 2000 像素，以保证曲面网格不塌陷
+        max_dim = max(logical_w, logical_h, 1)
+        export_scale = 2000.0 / max_dim
+        export_scale = max(export_scale, 2.0) # 至少放大2倍，保证清晰度
+
+        # 超过 EXPORT_MAX_IMAGE_SIDE 时：PNG 分条带写入，最多降到 1:1 全分辨率；
+        # JPEG 无法流式写入，仍整张生成并限制边长
+        is_png = not file_path.lower().endswith(('.jpg', '.jpeg'))
+        max_side = max(logical_w, logical_h) * export_scale
+        if max_side > EXPORT_MAX_IMAGE_SIDE:
+            reduction = EXPORT_MAX_IMAGE_SIDE / max_side
+            export_scale = max(export_scale * reduction, 1.0) if is_png else export_scale * reduction
+
+        width = int(logical_w * export_scale)
+        height = int(logical_h * export_scale)
+
+        # 3. 各可见图层的绘制指令
+        layer_ops = [
+            (layer, _collect_layer_ops(app, layer['id'], export_lx, export_ly, export_scale))
+            for layer in app.layers if layer['visible']
+        ]
+
+        # 4. 渲染并保存（背景色在每个条带上铺底）
+        if max(width, height) <= EXPORT_MAX_IMAGE_SIDE:
+            _render_band(layer_ops, app.canvas_bg_color, width, 0, height).save(file_path)
+        else:
+            _write_png_bands(
+                file_path, width, height,
+                lambda y0, h: _render_band(layer_ops, app.canvas_bg_color, width, y0, h)
+            )
+        messagebox.showinfo("成功", f"图片导出成功！分辨率: {width}x{height}")
+
+    except Exception as e:
+        messagebox.showerror("导出失败", f"错误详情: {str(e)}")
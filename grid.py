@@ -0,0 +1,121 @@
+# grid.py
+"""
+背景网格：整张视口网格渲染为一张缓存位图，以单个 Canvas 图像项显示。
+
+- 位图按 (视口尺寸, 间距, 子像素相位) 缓存，平移时通常只需移动图像项；
+- 自适应模式下网格按逻辑间距随缩放变化，并按 2 的幂合并/细分，
+  缩小时屏幕间距不会低于 MIN_GRID_SCREEN_SPACING，线条数量有上限。
+"""
+import math
+from PIL import Image, ImageDraw, ImageColor, ImageTk
+
+GRID_TAG = "grid_line"
+GRID_COLOR = "#555555"
+GRID_DASH = (2, 4)  # 与原先 create_line(dash=(2, 4)) 一致：画 2 像素，空 4 像素
+MIN_GRID_SCREEN_SPACING = 8
+GRID_CACHE_LIMIT = 8
+PHASE_STEPS = 4  # 子像素相位量化为 1/4 像素
+
+
+def effective_grid_spacing(app):
+    """当前网格在屏幕上的间距（像素）"""
+    base = max(float(app.grid_spacing), 1.0)
+    if not getattr(app, 'grid_adaptive', False):
+        # 固定模式：间距为屏幕像素，与缩放无关
+        return max(base, MIN_GRID_SCREEN_SPACING)
+    spacing = base * app.zoom_level
+    while spacing < MIN_GRID_SCREEN_SPACING:
+        spacing *= 2
+    # 放大时回落到接近基础间距，但不低于最小屏幕间距（base 很小时两者冲突，以后者为准）
+    while spacing >= base * 4 and spacing / 2 >= MIN_GRID_SCREEN_SPACING:
+        spacing /= 2
+    return spacing
+
+
+def _dash_strip(length, vertical, rgba):
+    """一条沿指定方向的虚线（宽 1 像素），作为印章反复粘贴"""
+    size = (1, length) if vertical else (length, 1)
+    strip = Image.new("RGBA", size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(strip)
+    on, off = GRID_DASH
+    for start in range(0, length, on + off):
+        end = min(start + on, length) - 1
+        if vertical:
+            draw.line((0, start, 0, end), fill=rgba)
+        else:
+            draw.line((start, 0, end, 0), fill=rgba)
+    return strip
+
+
+def render_grid_image(width, height, spacing, phase_x, phase_y):
+    """
+    渲染网格位图：竖线位于 round(phase_x + k * spacing)，横线同理
+
+    Returns:
+        RGBA 的 PIL 图像，线条以外完全透明
+    """
+    rgba = ImageColor.getcolor(GRID_COLOR, "RGBA")
+    image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    column = _dash_strip(height, True, rgba)
+    row = _dash_strip(width, False, rgba)
+    count_x = int((width - phase_x) / spacing) + 1
+    for k in range(count_x):
+        x = int(round(phase_x + k * spacing))
+        if 0 <= x < width:
+            image.paste(column, (x, 0))
+    count_y = int((height - phase_y) / spacing) + 1
+    for k in range(count_y):
+        y = int(round(phase_y + k * spacing))
+        if 0 <= y < height:
+            image.paste(row, (0, y), row)
+    return image
+
+
+def _get_grid_photo(app, key):
+    cache = app._grid_cache
+    photo = cache.get(key)
+    if photo is None:
+        width, height, spacing, phase_x, phase_y = key
+        photo = ImageTk.PhotoImage(render_grid_image(width, height, spacing, phase_x, phase_y))
+        if len(cache) >= GRID_CACHE_LIMIT:
+            cache.pop(next(iter(cache)))
+        cache[key] = photo
+    return photo
+
+
+def draw_grid(app):
+    """显示、更新或隐藏网格图像项"""
+    canvas = app.canvas
+    item = app._grid_item
+    if item is not None and not canvas.type(item):
+        item = app._grid_item = None
+
+    if not app.grid_visible:
+        if item is not None:
+            canvas.delete(item)
+            app._grid_item = None
+        return
+
+    width, height = app.viewport.size
+    spacing = effective_grid_spacing(app)
+    # 逻辑原点 (0, 0) 的屏幕位置决定网格相位
+    origin_x, origin_y = app.viewport.to_screen([0, 0])
+    # 位图左上角对齐到整数像素，并向左上多留一个间距，平移时不会露出空白
+    start_x = origin_x - spacing * (math.floor(origin_x / spacing) + 1)
+    start_y = origin_y - spacing * (math.floor(origin_y / spacing) + 1)
+    left, top = math.floor(start_x), math.floor(start_y)
+    phase_x = round((start_x - left) * PHASE_STEPS) / PHASE_STEPS
+    phase_y = round((start_y - top) * PHASE_STEPS) / PHASE_STEPS
+    key = (width + int(math.ceil(spacing)) + 1, height + int(math.ceil(spacing)) + 1,
+           round(spacing, 3), phase_x, phase_y)
+
+    photo = _get_grid_photo(app, key)
+    if item is None:
+        app._grid_item = canvas.create_image(left, top, image=photo, anchor='nw', tags=GRID_TAG, state='disabled')
+    else:
+        if canvas.itemcget(item, 'image') != str(photo):
+            canvas.itemconfigure(item, image=photo)
+        canvas.coords(item, left, top)
+    # 网格位于画布背景之上、所有对象之下
+    canvas.tag_lower(GRID_TAG)
+    canvas.tag_lower("canvas_bg")
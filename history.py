@@ -11,6 +11,9 @@ def capture_and_save_state(app):
         app.history_stack.pop(0)
     state['object_states'] = copy.deepcopy(state['object_states'])
     app.history_stack.append(state)
+    # 快照已遍历了全部画布项，顺带刷新图层索引中的对象成员关系
+    app.layer_registry.reindex(app.layers)
+    app.layer_registry.rebuild_membership(state['items'])
 
 
 def restore_state_from_history(app, state):
@@ -19,6 +22,8 @@ def restore_state_from_history(app, state):
     app._clear_resize_handles()
     app.selection_group.clear()
     app.canvas.delete("all")
+    # 图像项全部重建，旧项的采样记录随之失效
+    app._raster_render_keys.clear()
 
     # 2. 恢复关键颜色状态
     # 修复核心：Canvas控件的背景色应保持为Viewport颜色，而不是画布颜色
@@ -33,6 +38,7 @@ def restore_state_from_history(app, state):
 
     # 4. 恢复图层元数据
     app.layers = copy.deepcopy(state["layers"])
+    app.layer_registry.reindex(app.layers)
     app.active_layer_id = state["active_layer_id"]
     app.layer_counter = state.get("layer_counter", app.layer_counter)
 
@@ -91,11 +97,15 @@ def restore_state_from_history(app, state):
                         app.canvas.itemconfig(new_item, state='hidden')
                     break
 
+    app.layer_registry.rebuild_membership(state["items"])
+
     # 8. 强制坐标同步（同步当前 zoom 和 pan 到所有物体）
     from coordinate_system import sync_all_objects_to_screen
     sync_all_objects_to_screen(app)
     
-    # 9. 更新UI
+    # 9. 更新UI（Canvas项已全部重建，图层缓存随之失效）
+    from layer_cache import reset_layer_composites
+    reset_layer_composites(app)
     app.update_layer_list_ui()
     app.update_layer_stacking()
     if hasattr(app, 'zoom_label'):
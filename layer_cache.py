@@ -0,0 +1,692 @@
+# layer_cache.py
+"""
+图层离屏缓存与视图合成
+
+核心思路：
+1. 每个图层维护一份按瓦片（TILE_SIZE x TILE_SIZE 像素）划分的RGBA缓存，瓦片坐标基于“逻辑坐标 x 当前缩放”
+2. 图层内容以“渲染记录”的形式从Canvas项收集（逻辑坐标 + 绘制选项），重新收集时与旧记录比对，
+   只有发生变化的对象所覆盖的矩形区域（脏矩形）对应的瓦片才会被丢弃并重绘
+3. 视图中，非编辑图层的Canvas项被隐藏，活动图层之下/之上的所有图层各自合成为一张图像项显示
+"""
+import math
+import os
+import sys
+from PIL import Image, ImageDraw, ImageFont, ImageTk
+
+TILE_SIZE = 256
+COMPOSITE_TAG = "layer_composite"
+COMPOSITE_BELOW_TAG = "layer_composite_below"
+COMPOSITE_ABOVE_TAG = "layer_composite_above"
+
+_UNIQUE_PREFIXES = ('shape_', 'stroke_', 'erase_stroke_', 'curve_', 'surface_')
+_SKIP_TAGS = ("handle", "grid_line", "control_point", "control_polygon", COMPOSITE_TAG)
+_font_cache = {}
+_font_files = None   # (字体族小写, 样式小写) -> (字体文件路径, ttc 内序号)
+_tk_font_cache = {}  # Tk 字体描述 -> (实际字体族, 是否粗体, 是否斜体)
+
+
+def _font_dirs():
+    if sys.platform.startswith('win'):
+        return [os.path.join(os.environ.get('WINDIR', r'C:\Windows'), 'Fonts'),
+                os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Microsoft', 'Windows', 'Fonts')]
+    if sys.platform == 'darwin':
+        return ['/System/Library/Fonts', '/Library/Fonts', os.path.expanduser('~/Library/Fonts')]
+    return ['/usr/share/fonts', '/usr/local/share/fonts',
+            os.path.expanduser('~/.fonts'), os.path.expanduser('~/.local/share/fonts')]
+
+
+def _scan_font_files():
+    """扫描系统字体目录，按字体内部记录的 (字体族, 样式) 建立索引（首次使用时执行一次）"""
+    index = {}
+    for root_dir in _font_dirs():
+        for dirpath, _, filenames in os.walk(root_dir):
+            for name in filenames:
+                if not name.lower().endswith(('.ttf', '.otf', '.ttc')):
+                    continue
+                path = os.path.join(dirpath, name)
+                for face in range(16 if name.lower().endswith('.ttc') else 1):
+                    try:
+                        family, style = ImageFont.truetype(path, 12, index=face).getname()
+                    except Exception:
+                        break
+                    index.setdefault(((family or '').lower(), (style or '').lower()), (path, face))
+    return index
+
+
+def resolve_tk_font(canvas, font_spec):
+    """
+    Tk 字体描述 -> (实际使用的字体族, 粗体, 斜体)
+    用 `font actual` 解析，不创建具名字体；结果按描述缓存
+    """
+    resolved = _tk_font_cache.get(font_spec)
+    if resolved is None:
+        try:
+            actual = canvas.tk.splitlist(canvas.tk.call('font', 'actual', font_spec))
+            options = dict(zip(actual[0::2], actual[1::2]))
+            resolved = (options.get('-family', ''), options.get('-weight') == 'bold',
+                        options.get('-slant') == 'italic')
+        except Exception:
+            parts = canvas.tk.splitlist(font_spec) if font_spec else ()
+            resolved = (parts[0] if parts else '', 'bold' in parts, 'italic' in parts)
+        _tk_font_cache[font_spec] = resolved
+    return resolved
+
+
+def _get_font(family, pixel_size, bold=False, italic=False):
+    """
+    按字体族、像素大小与样式获取PIL字体
+    依次尝试：系统字体索引中的同族同样式 / 同族常规体 / 同族任意样式，
+    再按文件名交给 truetype，最后退回默认字体
+    """
+    global _font_files
+    key = (family, pixel_size, bold, italic)
+    font = _font_cache.get(key)
+    if font is not None:
+        return font
+    if _font_files is None:
+        _font_files = _scan_font_files()
+
+    family_key = (family or '').lower()
+    wanted = ' '.join(w for w, on in (('bold', bold), ('italic', italic)) if on) or 'regular'
+    candidates = [(family_key, wanted), (family_key, 'regular'), (family_key, 'book'), (family_key, 'normal')]
+    found = next((_font_files[c] for c in candidates if c in _font_files), None)
+    if found is None:
+        found = next((v for (fam, _), v in _font_files.items() if fam == family_key), None)
+    try:
+        if found is not None:
+            font = ImageFont.truetype(found[0], pixel_size, index=found[1])
+        else:
+            font = ImageFont.truetype(family, pixel_size)
+    except Exception:
+        try:
+            font = ImageFont.load_default(size=pixel_size)
+        except Exception:
+            font = ImageFont.load_default()
+    _font_cache[key] = font
+    return font
+
+
+def smooth_coords(coords, closed=False, method='true', steps=12):
+    """
+    按 Tk 的 smooth 规则把控制点折线展开为曲线采样点（扁平坐标）
+    method 为 'raw' 时每 3 段为一条三次 Bézier；否则为 Tk 默认的二次样条：
+    曲线经过相邻控制点的中点（开放折线两端经过首末点），以各控制点为二次 Bézier 的控制点；
+    steps 对应 Canvas 的 splinesteps
+    """
+    pts = [(coords[i], coords[i + 1]) for i in range(0, len(coords) - 1, 2)]
+    if len(pts) > 2 and pts[0] == pts[-1]:
+        # 与 Tk 相同：首末点重合的折线按闭合曲线处理
+        closed = True
+        pts.pop()
+    if len(pts) < 3:
+        return list(coords)
+    steps = max(int(steps), 1)
+    out = []
+
+    if method == 'raw':
+        if closed:
+            pts = pts + [pts[0]]
+        out.extend(pts[0])
+        for i in range(0, len(pts) - 3, 3):
+            (x0, y0), (x1, y1), (x2, y2), (x3, y3) = pts[i:i + 4]
+            for k in range(1, steps + 1):
+                t = k / steps
+                u = 1 - t
+                out.extend((u * u * u * x0 + 3 * u * u * t * x1 + 3 * u * t * t * x2 + t * t * t * x3,
+                            u * u * u * y0 + 3 * u * u * t * y1 + 3 * u * t * t * y2 + t * t * t * y3))
+        return out
+
+    n = len(pts)
+    if closed:
+        spans = [(((pts[i - 1][0] + pts[i][0]) / 2, (pts[i - 1][1] + pts[i][1]) / 2), pts[i],
+                  ((pts[i][0] + pts[(i + 1) % n][0]) / 2, (pts[i][1] + pts[(i + 1) % n][1]) / 2))
+                 for i in range(n)]
+    else:
+        spans = []
+        for i in range(1, n - 1):
+            start = pts[0] if i == 1 else ((pts[i - 1][0] + pts[i][0]) / 2, (pts[i - 1][1] + pts[i][1]) / 2)
+            end = pts[-1] if i == n - 2 else ((pts[i][0] + pts[i + 1][0]) / 2, (pts[i][1] + pts[i + 1][1]) / 2)
+            spans.append((start, pts[i], end))
+    out.extend(spans[0][0])
+    for (x0, y0), (x1, y1), (x2, y2) in spans:
+        for k in range(1, steps + 1):
+            t = k / steps
+            u = 1 - t
+            out.extend((u * u * x0 + 2 * u * t * x1 + t * t * x2, u * u * y0 + 2 * u * t * y1 + t * t * y2))
+    return out
+
+
+def smooth_method(value):
+    """Canvas 的 smooth 选项值 -> 平滑方式（None 表示不平滑）"""
+    value = str(value or '').strip().lower()
+    if value in ('', '0', 'false', 'no', 'off'):
+        return None
+    return 'raw' if value == 'raw' else 'true'
+
+
+def _option(config, key, default=""):
+    """从 itemconfigure() 的返回值中取出当前选项值"""
+    entry = config.get(key)
+    if not entry:
+        return default
+    return entry[-1]
+
+
+def build_layer_records(app, layer_id):
+    """
+    收集图层上所有Canvas项的渲染记录（逻辑坐标），按Canvas的堆叠顺序排列
+    每条记录包含：kind, key（用于比对变化）, bbox（逻辑包围盒）, tag（对象唯一标签）以及绘制所需的数据
+    """
+    from coordinate_system import screen_to_logical
+    from transform import raster_matrix
+
+    canvas = app.canvas
+    canvas_width, canvas_height = app.viewport.size
+    zoom = max(app.zoom_level, 1e-9)
+
+    records = []
+    seen_surfaces = set()
+    for item_id in canvas.find_withtag(layer_id):
+        tags = canvas.gettags(item_id)
+        if any(t in tags for t in _SKIP_TAGS):
+            continue
+        unique_tag = next((t for t in tags if t.startswith(_UNIQUE_PREFIXES)), None)
+        state = app.object_states.get(unique_tag) if unique_tag else None
+
+        # 曲面：直接由控制网格渲染，任意分辨率下都保持清晰
+        if state and 'control_grid' in state:
+            if unique_tag in seen_surfaces:
+                continue
+            seen_surfaces.add(unique_tag)
+            grid = state['control_grid']
+            xs = [p[0] for row in grid for p in row]
+            ys = [p[1] for row in grid for p in row]
+            if not xs:
+                continue
+            grid_key = tuple(tuple(p) for row in grid for p in row)
+            mode = state.get('display_mode', 'wireframe')
+            color = state.get('color', '#FFFFFF')
+            records.append({
+                'kind': 'surface', 'control_grid': grid, 'display_mode': mode, 'color': color,
+                'bbox': (min(xs) - 1, min(ys) - 1, max(xs) + 1, max(ys) + 1),
+                'key': ('surface', unique_tag, grid_key, mode, color), 'tag': unique_tag,
+            })
+            continue
+
+        item_type = canvas.type(item_id)
+        coords = canvas.coords(item_id)
+        if not coords:
+            continue
+        logical = screen_to_logical(
+            coords, app.zoom_level, app.pan_offset_x, app.pan_offset_y, canvas_width, canvas_height
+        )
+        config = canvas.itemconfigure(item_id)
+
+        if item_type == 'image':
+            photo = app._image_references.get(item_id)
+            pil_img = state.get('original_pil_image') if state else None
+            if photo is None or pil_img is None:
+                continue
+            lx, ly = logical[0], logical[1]
+            lw, lh = photo.width() / zoom, photo.height() / zoom
+            matrix = raster_matrix(state)
+            records.append({
+                'kind': 'image', 'image': pil_img, 'matrix': matrix,
+                'bbox': (lx, ly, lx + lw, ly + lh),
+                'key': ('image', item_id, id(pil_img)) + tuple(round(v, 3) for v in matrix), 'tag': unique_tag,
+            })
+        elif item_type == 'text':
+            text = _option(config, 'text')
+            font_spec = _option(config, 'font')
+            font_parts = canvas.tk.splitlist(font_spec) or ('Arial', '16')
+            # Tk 字体族名交给 `font actual` 解析为实际使用的字体族与样式，渲染时据此查找字体文件
+            family, bold, italic = resolve_tk_font(canvas, font_spec or 'Arial 16')
+            try:
+                point_size = abs(int(font_parts[1]))
+            except Exception:
+                point_size = 16
+            # Tk字号单位为磅，按 96dpi 换算为像素后折算到逻辑尺寸
+            logical_size = point_size * 4 / 3 / zoom
+            pad = logical_size * max(len(text), 1)
+            lx, ly = logical[0], logical[1]
+            records.append({
+                'kind': 'text', 'xy': (lx, ly), 'text': text, 'family': family, 'size': logical_size,
+                'bold': bold, 'italic': italic,
+                'fill': _option(config, 'fill') or None, 'anchor': _option(config, 'anchor', 'center'),
+                'bbox': (lx - pad, ly - pad, lx + pad, ly + pad),
+                'key': ('text', item_id, round(lx, 3), round(ly, 3), text, family, bold, italic, point_size,
+                        _option(config, 'fill')),
+                'tag': unique_tag,
+            })
+        else:
+            try:
+                width = float(_option(config, 'width', 1) or 1)
+            except Exception:
+                width = 1.0
+            fill = _option(config, 'fill') or None
+            outline = (_option(config, 'outline') or None) if item_type != 'line' else None
+            smooth = smooth_method(_option(config, 'smooth')) if item_type in ('line', 'polygon') else None
+            try:
+                splinesteps = int(_option(config, 'splinesteps', 12) or 12)
+            except Exception:
+                splinesteps = 12
+            xs, ys = logical[0::2], logical[1::2]
+            pad = width / zoom / 2 + 1
+            records.append({
+                'kind': item_type, 'coords': logical, 'fill': fill, 'outline': outline, 'width': width,
+                'round': _option(config, 'capstyle') == 'round',
+                'smooth': smooth, 'splinesteps': splinesteps,
+                'bbox': (min(xs) - pad, min(ys) - pad, max(xs) + pad, max(ys) + pad),
+                'key': (item_type, item_id, tuple(round(c, 3) for c in logical), fill, outline, width, smooth),
+                'tag': unique_tag,
+            })
+    return records
+
+
+def render_records(image, records, origin_lx, origin_ly, scale, width_scale=1.0):
+    """
+    将渲染记录绘制到PIL图像上
+    image: 目标RGBA图像，其左上角对应逻辑坐标 (origin_lx, origin_ly)
+    scale: 每逻辑单位对应的像素数
+    width_scale: 线宽倍率（Canvas线宽以屏幕像素计，视图缓存取1，导出时取导出缩放比例）
+    返回绘制失败的记录列表（视图缓存可忽略，烘焙等不可逆操作据此中止）
+    """
+    from surfaces import BezierSurface
+    from curve_surface_tools import render_surface_image, serpentine_isocurve_points, surface_lod
+    from transform import compose_matrix, render_raster
+
+    draw = ImageDraw.Draw(image)
+    failed = []
+
+    def to_pixels(coords):
+        return [
+            (c - origin_lx) * scale if i % 2 == 0 else (c - origin_ly) * scale
+            for i, c in enumerate(coords)
+        ]
+
+    for record in records:
+        kind = record['kind']
+        try:
+            if kind == 'surface':
+                surface = BezierSurface(record['control_grid'])
+                lod = surface_lod(record['control_grid'], scale)
+                if record['display_mode'] == 'wireframe':
+                    points = serpentine_isocurve_points(
+                        surface, lod['isocurves'], lod['isocurves'], lod['segments_per_curve']
+                    )
+                    flat = to_pixels([c for p in points for c in p[:2]])
+                    draw.line(flat, fill=record['color'], width=max(1, int(round(width_scale))))
+                else:
+                    surf_img, (slx, sly) = render_surface_image(
+                        surface, scale, u_segments=lod['mesh'], v_segments=lod['mesh']
+                    )
+                    if surf_img is not None:
+                        px, py = to_pixels([slx, sly])
+                        _paste_clipped(image, surf_img, int(round(px)), int(round(py)))
+            elif kind == 'image':
+                # 对象矩阵（位图像素 -> 逻辑）与目标变换复合后一次采样
+                target = (scale, 0.0, -origin_lx * scale, 0.0, scale, -origin_ly * scale)
+                src, px, py = render_raster(record['image'], compose_matrix(target, record['matrix']),
+                                            Image.Resampling.BILINEAR)
+                if src is not None:
+                    if src.mode != 'RGBA':
+                        src = src.convert('RGBA')
+                    _paste_clipped(image, src, px, py)
+            elif kind == 'text':
+                px, py = to_pixels(record['xy'])
+                size = max(int(round(record['size'] * scale)), 1)
+                anchor = {'center': 'mm', 'nw': 'la', 'n': 'ma', 'ne': 'ra', 'w': 'lm',
+                          'e': 'rm', 'sw': 'ld', 's': 'md', 'se': 'rd'}.get(record['anchor'], 'mm')
+                draw.text((px, py), record['text'], fill=record['fill'] or '#FFFFFF',
+                          font=_get_font(record['family'], size, record.get('bold'), record.get('italic')),
+                          anchor=anchor)
+            else:
+                coords = record['coords']
+                if record.get('smooth'):
+                    # 与 Canvas 一致地把 smooth 折线展开为样条采样点
+                    coords = smooth_coords(coords, kind == 'polygon', record['smooth'], record['splinesteps'])
+                pts = to_pixels(coords)
+                width = max(1, int(round(record['width'] * width_scale)))
+                fill, outline = record['fill'], record['outline']
+                if kind == 'line':
+                    if len(pts) < 4:
+                        continue
+                    draw.line(pts, fill=fill, width=width, joint='curve')
+                    if record['round'] and width > 2:
+                        r = width / 2
+                        for x, y in ((pts[0], pts[1]), (pts[-2], pts[-1])):
+                            draw.ellipse([x - r, y - r, x + r, y + r], fill=fill)
+                elif kind == 'rectangle':
+                    x1, y1, x2, y2 = pts[:4]
+                    draw.rectangle([min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)],
+                                   fill=fill, outline=outline, width=width)
+                elif kind == 'oval':
+                    x1, y1, x2, y2 = pts[:4]
+                    draw.ellipse([min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)],
+                                 fill=fill, outline=outline, width=width)
+                elif kind == 'polygon':
+                    if len(pts) < 6:
+                        continue
+                    draw.polygon(pts, fill=fill, outline=outline, width=width)
+        except Exception:
+            # 单个对象绘制失败（如无法识别的颜色名）不影响其余内容，由调用方决定如何处理
+            failed.append(record)
+    return failed
+
+
+def _paste_clipped(target, src, x, y):
+    """把 src 以alpha合成方式贴到 target 的 (x, y)，自动裁剪超出边界的部分"""
+    tw, th = target.size
+    sx1, sy1 = max(0, -x), max(0, -y)
+    sx2, sy2 = min(src.width, tw - x), min(src.height, th - y)
+    if sx1 >= sx2 or sy1 >= sy2:
+        return
+    target.alpha_composite(src, dest=(x + sx1, y + sy1), source=(sx1, sy1, sx2, sy2))
+
+
+class LayerCache:
+    """单个图层的瓦片化离屏缓存"""
+
+    def __init__(self, layer_id, tile_size=TILE_SIZE):
+        self.layer_id = layer_id
+        self.tile_size = tile_size
+        self.scale = None          # 瓦片渲染时的缩放（像素/逻辑单位）
+        self.records = []          # 渲染记录（按堆叠顺序）
+        self.record_bboxes = {}    # 记录key -> 逻辑包围盒，用于比对变化
+        self.buckets = {}          # (tx, ty) -> 覆盖该瓦片的记录下标列表
+        self.tiles = {}            # (tx, ty) -> PIL图像（空瓦片为None）；缺失即为脏瓦片
+        self.faded_tiles = {}      # (tx, ty) -> (不透明度, 乘上不透明度后的瓦片)
+        self.stale = True          # 图层对象可能已改变，下次使用前需要重新收集记录
+        self.version = 0           # 内容版本号，任何瓦片失效都会递增
+        self.tiles_rendered = 0    # 统计：累计重绘的瓦片数
+
+    def mark_stale(self):
+        """图层上的对象可能发生了变化（下次使用时重新收集并比对记录）"""
+        self.stale = True
+
+    def invalidate(self):
+        """丢弃全部瓦片"""
+        self.tiles.clear()
+        self.faded_tiles.clear()
+        self.version += 1
+
+    def mark_dirty(self, logical_rect):
+        """将逻辑矩形覆盖的瓦片标记为脏（下次合成时重绘）"""
+        if self.scale is None or logical_rect is None:
+            return
+        for key in self._tile_range(logical_rect):
+            self.tiles.pop(key, None)
+            self.faded_tiles.pop(key, None)
+        self.version += 1
+
+    def _tile_range(self, logical_rect):
+        x1, y1, x2, y2 = logical_rect
+        t = self.tile_size
+        s = self.scale
+        tx1, ty1 = int(math.floor(x1 * s / t)), int(math.floor(y1 * s / t))
+        tx2, ty2 = int(math.floor(x2 * s / t)), int(math.floor(y2 * s / t))
+        for tx in range(tx1, tx2 + 1):
+            for ty in range(ty1, ty2 + 1):
+                yield (tx, ty)
+
+    def _rebuild_buckets(self):
+        self.buckets = {}
+        if self.scale is None:
+            return
+        for index, record in enumerate(self.records):
+            for key in self._tile_range(record['bbox']):
+                self.buckets.setdefault(key, []).append(index)
+
+    def update_records(self, app):
+        """若图层被标记为可能变化，则重新收集记录，并把新增/消失对象的区域标记为脏"""
+        if not self.stale:
+            return
+        records = build_layer_records(app, self.layer_id)
+        new_bboxes = {r['key']: r['bbox'] for r in records}
+        for key, bbox in self.record_bboxes.items():
+            if key not in new_bboxes:
+                self.mark_dirty(bbox)
+        for key, bbox in new_bboxes.items():
+            if key not in self.record_bboxes:
+                self.mark_dirty(bbox)
+        self.records = records
+        self.record_bboxes = new_bboxes
+        self.stale = False
+        self._rebuild_buckets()
+
+    def set_scale(self, scale):
+        """缩放变化时所有瓦片失效"""
+        if self.scale != scale:
+            self.scale = scale
+            self.invalidate()
+            self._rebuild_buckets()
+
+    def get_tile(self, tx, ty):
+        """获取瓦片（脏瓦片按需重绘），空瓦片返回None"""
+        key = (tx, ty)
+        if key in self.tiles:
+            return self.tiles[key]
+        indices = self.buckets.get(key)
+        tile = None
+        if indices:
+            t = self.tile_size
+            tile = Image.new("RGBA", (t, t), (0, 0, 0, 0))
+            render_records(
+                tile, [self.records[i] for i in indices],
+                tx * t / self.scale, ty * t / self.scale, self.scale
+            )
+            self.tiles_rendered += 1
+        self.tiles[key] = tile
+        return tile
+
+    def get_faded_tile(self, tx, ty, opacity):
+        """获取乘上图层不透明度后的瓦片（按不透明度缓存，同一不透明度只计算一次）"""
+        tile = self.get_tile(tx, ty)
+        if tile is None or opacity >= 1.0:
+            return tile
+        key = (tx, ty)
+        cached = self.faded_tiles.get(key)
+        if cached is not None and cached[0] == opacity:
+            return cached[1]
+        faded = tile.copy()
+        faded.putalpha(tile.getchannel('A').point(_opacity_lut(opacity)))
+        self.faded_tiles[key] = (opacity, faded)
+        return faded
+
+    def compose_into(self, target, offset_x, offset_y, opacity=1.0):
+        """
+        将覆盖目标区域的瓦片按不透明度合成到 target 上，返回是否有内容被合成
+        offset_x, offset_y: 缩放后逻辑像素坐标到目标像素坐标的偏移
+        """
+        t = self.tile_size
+        tw, th = target.size
+        tx1, ty1 = int(math.floor(-offset_x / t)), int(math.floor(-offset_y / t))
+        tx2, ty2 = int(math.floor((tw - offset_x) / t)), int(math.floor((th - offset_y) / t))
+        composed = False
+        for tx in range(tx1, tx2 + 1):
+            for ty in range(ty1, ty2 + 1):
+                tile = self.get_faded_tile(tx, ty, opacity)
+                if tile is not None:
+                    _paste_clipped(target, tile, tx * t + offset_x, ty * t + offset_y)
+                    composed = True
+        return composed
+
+
+def _opacity_lut(opacity):
+    return [int(a * opacity + 0.5) for a in range(256)]
+
+
+def get_layer_cache(app, layer_id):
+    cache = app.layer_caches.get(layer_id)
+    if cache is None:
+        cache = LayerCache(layer_id)
+        app.layer_caches[layer_id] = cache
+    return cache
+
+
+def mark_layer_changed(app, layer_id):
+    """通知图层内容可能已变化（比如在该图层上完成了一次编辑）"""
+    cache = app.layer_caches.get(layer_id)
+    if cache is not None:
+        cache.mark_stale()
+
+
+def reset_layer_composites(app):
+    """画布项被整体重建（撤销/打开项目）后调用：清空所有缓存并重新建立合成"""
+    app.layer_caches.clear()
+    app._composited_layers = set()
+    app._composite_items = {}
+    app._composite_signatures = {}
+    app._live_stipples = {}
+
+
+def _set_layer_items_state(app, layer, hidden):
+    state = 'hidden' if hidden or not layer.get('visible', True) else 'normal'
+    try:
+        app.canvas.itemconfig(layer['id'], state=state)
+    except Exception:
+        pass
+
+
+def _compose_group(app, layers, canvas_width, canvas_height, offset_x, offset_y):
+    """把一组图层（自下而上）合成为一张视口大小的图像，没有可见内容时返回None"""
+    # 各图层的瓦片依次“叠加”到同一张图上；不透明度只作用在该图层自己的瓦片上
+    result = Image.new("RGBA", (canvas_width, canvas_height), (0, 0, 0, 0))
+    composed = False
+    for layer in layers:
+        if not layer.get('visible', True) or layer.get('opacity', 1.0) <= 0:
+            continue
+        cache = get_layer_cache(app, layer['id'])
+        if cache.compose_into(result, offset_x, offset_y, layer.get('opacity', 1.0)):
+            composed = True
+    return result if composed else None
+
+
+def opacity_stipple(opacity):
+    """Canvas项无法真正半透明，直接显示的图层用点画图案近似不透明度"""
+    if 0.75 <= opacity < 1.0: return "gray75"
+    if 0.5 <= opacity < 0.75: return "gray50"
+    if 0.25 <= opacity < 0.5: return "gray25"
+    if 0 < opacity < 0.25: return "gray12"
+    return ""
+
+
+def _sync_live_opacity(app, layer):
+    """给直接显示（未合成）的图层设置点画图案，仅在图案变化时遍历一次图层内的项"""
+    pattern = opacity_stipple(layer.get('opacity', 1.0))
+    if app._live_stipples.get(layer['id'], "") == pattern:
+        return
+    for item_id in app.canvas.find_withtag(layer['id']):
+        try:
+            app.canvas.itemconfig(item_id, stipple=pattern)
+        except Exception:
+            pass
+    app._live_stipples[layer['id']] = pattern
+
+
+def refresh_layer_composites(app):
+    """
+    更新视图中的图层合成：
+    - 活动图层：显示真实Canvas项，便于编辑
+    - 其它图层：隐藏Canvas项，按活动图层之下/之上分两组，各合成为一张图像项
+    """
+    canvas = app.canvas
+    enabled = getattr(app, 'use_layer_cache', False) and len(app.layers) > 1
+
+    # 同步各图层Canvas项的显示状态
+    layer_ids = {layer['id'] for layer in app.layers}
+    for layer_id in list(app._composited_layers):
+        if layer_id not in layer_ids:
+            app._composited_layers.discard(layer_id)
+            app.layer_caches.pop(layer_id, None)
+    for layer in app.layers:
+        should_composite = enabled and layer['id'] != app.active_layer_id
+        if should_composite and layer['id'] not in app._composited_layers:
+            _set_layer_items_state(app, layer, hidden=True)
+            app._composited_layers.add(layer['id'])
+            # 图层刚离开编辑状态：重新收集记录，只重绘变化区域
+            mark_layer_changed(app, layer['id'])
+        elif not should_composite and layer['id'] in app._composited_layers:
+            _set_layer_items_state(app, layer, hidden=False)
+            app._composited_layers.discard(layer['id'])
+        if not should_composite:
+            _sync_live_opacity(app, layer)
+
+    if not enabled:
+        canvas.delete(COMPOSITE_TAG)
+        app._composite_items.clear()
+        app._composite_signatures.clear()
+        return
+
+    canvas_width, canvas_height = app.viewport.size
+    zoom = max(app.zoom_level, 1e-9)
+    # 屏幕坐标 = 逻辑坐标 * zoom + offset
+    offset_x = canvas_width / 2.0 + (app.pan_offset_x - canvas_width / 2.0) * zoom
+    offset_y = canvas_height / 2.0 + (app.pan_offset_y - canvas_height / 2.0) * zoom
+    offset_x, offset_y = int(round(offset_x)), int(round(offset_y))
+
+    active_index = next((i for i, l in enumerate(app.layers) if l['id'] == app.active_layer_id), len(app.layers))
+    groups = {
+        COMPOSITE_BELOW_TAG: app.layers[:active_index],
+        COMPOSITE_ABOVE_TAG: app.layers[active_index + 1:],
+    }
+
+    for group_tag, group_layers in groups.items():
+        for layer in group_layers:
+            cache = get_layer_cache(app, layer['id'])
+            cache.set_scale(zoom)
+            cache.update_records(app)
+
+        signature = (
+            canvas_width, canvas_height, zoom, offset_x, offset_y,
+            tuple((l['id'], app.layer_caches[l['id']].version, l.get('visible', True), l.get('opacity', 1.0))
+                  for l in group_layers)
+        )
+        item_id = app._composite_items.get(group_tag)
+        if item_id is not None and not canvas.type(item_id):
+            item_id = None  # Canvas项已被删除（例如清空画布）
+        if item_id is not None and app._composite_signatures.get(group_tag) == signature:
+            canvas.coords(item_id, 0, 0)
+            continue
+
+        composite = _compose_group(app, group_layers, canvas_width, canvas_height, offset_x, offset_y)
+        if composite is None:
+            if item_id is not None:
+                canvas.delete(item_id)
+                app._image_references.pop(item_id, None)
+            app._composite_items.pop(group_tag, None)
+            app._composite_signatures[group_tag] = signature
+            continue
+
+        tk_img = ImageTk.PhotoImage(composite)
+        if item_id is None:
+            # disabled：合成位图不参与鼠标拾取，点击会落到其下方的真实Canvas项上
+            item_id = canvas.create_image(0, 0, image=tk_img, anchor='nw', state='disabled',
+                                          tags=(COMPOSITE_TAG, group_tag))
+            app._composite_items[group_tag] = item_id
+        else:
+            canvas.itemconfig(item_id, image=tk_img)
+            canvas.coords(item_id, 0, 0)
+        app._image_references[item_id] = tk_img
+        app._composite_signatures[group_tag] = signature
+
+
+def pick_composited_layer(app, screen_x, screen_y):
+    """在合成显示的图层中查找屏幕点下最上层有内容的图层，返回图层ID或None"""
+    from coordinate_system import screen_to_logical
+
+    canvas_width, canvas_height = app.viewport.size
+    lx, ly = screen_to_logical(
+        [screen_x, screen_y], app.zoom_level, app.pan_offset_x, app.pan_offset_y, canvas_width, canvas_height
+    )
+    for layer in reversed(app.layers):
+        if layer['id'] not in app._composited_layers or not layer.get('visible', True):
+            continue
+        cache = app.layer_caches.get(layer['id'])
+        if cache is None:
+            continue
+        for record in cache.records:
+            x1, y1, x2, y2 = record['bbox']
+            if x1 <= lx <= x2 and y1 <= ly <= y2:
+                return layer['id']
+    return None
@@ -1,11 +1,66 @@
 import time
 import copy
+import math
 from tkinter import messagebox, simpledialog
 import customtkinter as ctk
-from PIL import ImageTk
+from PIL import Image
 
 # layers utilities extracted from app_core
 
+OPACITY_REFRESH_DELAY_MS = 40  # 不透明度滑块变化的合并间隔
+OBJECT_TAG_PREFIXES = ('shape_', 'stroke_', 'erase_stroke_', 'curve_', 'surface_')
+FLATTEN_MAX_SIDE = 8000  # 展平/合并生成位图的最大边长（像素）
+
+
+class LayerRegistry:
+    """
+    图层索引：维护 图层ID -> 在 app.layers 中的下标，
+    以及 图层ID -> 对象唯一标签集合、唯一标签 -> 图层ID 的成员关系，
+    避免通过 canvas.find_withtag + gettags 过滤来回答“某图层上有哪些对象”
+    """
+
+    def __init__(self):
+        self.index = {}
+        self.members = {}
+        self.object_layer = {}
+
+    def reindex(self, layers):
+        """图层列表增删或调整顺序后重建下标"""
+        self.index = {layer['id']: i for i, layer in enumerate(layers)}
+        for layer_id in [l_id for l_id in self.members if l_id not in self.index]:
+            for tag in self.members.pop(layer_id):
+                self.object_layer.pop(tag, None)
+
+    def add_object(self, unique_tag, layer_id):
+        old_layer = self.object_layer.get(unique_tag)
+        if old_layer is not None and old_layer != layer_id:
+            self.members.get(old_layer, set()).discard(unique_tag)
+        self.object_layer[unique_tag] = layer_id
+        self.members.setdefault(layer_id, set()).add(unique_tag)
+
+    def discard_object(self, unique_tag):
+        layer_id = self.object_layer.pop(unique_tag, None)
+        if layer_id is not None:
+            self.members.get(layer_id, set()).discard(unique_tag)
+
+    def objects_on(self, layer_id):
+        return self.members.get(layer_id, set())
+
+    def layer_of(self, unique_tag):
+        return self.object_layer.get(unique_tag)
+
+    def rebuild_membership(self, items):
+        """根据画布项信息列表（history 中的 items 格式）重建对象成员关系"""
+        self.members = {}
+        self.object_layer = {}
+        for item_info in items:
+            tags = item_info["options"].get('tags', '')
+            tag_list = tags.split() if isinstance(tags, str) else tags
+            layer_id = next((t for t in tag_list if t in self.index), None)
+            unique_tag = next((t for t in tag_list if t.startswith(OBJECT_TAG_PREFIXES)), None)
+            if layer_id and unique_tag:
+                self.add_object(unique_tag, layer_id)
+
 def add_new_layer(app, name=None, insert_index=None):
     app.layer_counter += 1
     layer_name = name or f"图层 {app.layer_counter}"
@@ -16,6 +71,7 @@ def add_new_layer(app, name=None, insert_index=None):
         app.layers.insert(insert_index, new_layer)
     else:
         app.layers.append(new_layer)
+    app.layer_registry.reindex(app.layers)
 
     app.active_layer_id = layer_id
     update_layer_list_ui(app)
@@ -23,11 +79,18 @@ def add_new_layer(app, name=None, insert_index=None):
     return new_layer
 
 
+def get_layer_index(app, layer_id):
+    """通过图层索引查找下标；索引与列表不一致时（列表被直接替换）重建索引"""
+    registry = app.layer_registry
+    index = registry.index.get(layer_id)
+    if index is not None and index < len(app.layers) and app.layers[index]['id'] == layer_id:
+        return index
+    registry.reindex(app.layers)
+    return registry.index.get(layer_id)
+
+
 def _get_selected_layer_index(app):
-    for i, layer in enumerate(app.layers):
-        if layer['id'] == app.active_layer_id:
-            return i
-    return None
+    return get_layer_index(app, app.active_layer_id)
 
 
 def delete_selected_layer(app):
@@ -37,6 +100,7 @@ def delete_selected_layer(app):
     selected_index = _get_selected_layer_index(app)
     if selected_index is not None:
         layer_to_delete = app.layers.pop(selected_index)
+        app.layer_registry.reindex(app.layers)
         tags_to_remove = set()
         for tag in app.selection_group:
             first_item = app.canvas.find_withtag(tag)
@@ -50,108 +114,245 @@ def delete_selected_layer(app):
             selected_index = len(app.layers) - 1
         app.active_layer_id = app.layers[selected_index]['id']
         update_layer_list_ui(app)
+        update_layer_stacking(app)
         app._capture_and_save_state()
 
 
+_DUPLICATE_OPTION_KEYS = ('width', 'fill', 'outline', 'capstyle', 'smooth', 'joinstyle', 'dash',
+                          'text', 'font', 'anchor', 'stipple')
+
+
+def _clone_state(state, new_layer_id):
+    """
+    克隆对象状态：坐标等小型结构深拷贝，光栅位图直接共享
+    （位图只会被整体替换而不会原地修改，相当于写时复制）
+    笔画的 original_coords_map 以新的Canvas项ID为键，由调用方重建
+    """
+    new_state = {}
+    for key, value in state.items():
+        if key == 'original_pil_image':
+            new_state[key] = value
+        elif key != 'original_coords_map':
+            new_state[key] = copy.deepcopy(value)
+    if 'layer_id' in new_state:
+        new_state['layer_id'] = new_layer_id
+    return new_state
+
+
 def duplicate_selected_layer(app):
+    """
+    复制当前图层：以 object_states 为数据源克隆逻辑状态，
+    每个对象只读取一次Canvas选项，光栅图像共享同一份位图和 PhotoImage
+    """
+    from coordinate_system import logical_to_screen
+
     selected_index = _get_selected_layer_index(app)
     if selected_index is None: return
     source_layer = app.layers[selected_index]
+    source_layer_id = source_layer['id']
+
+    # 由图层索引和笔画坐标表得到 Canvas项 -> 对象唯一标签 的映射，避免逐项 gettags
+    item_tags = {}
+    for unique_tag in app.layer_registry.objects_on(source_layer_id):
+        state = app.object_states.get(unique_tag)
+        coords_map = state.get('original_coords_map') if state else None
+        for item_id in (coords_map or app.canvas.find_withtag(unique_tag)):
+            item_tags[item_id] = unique_tag
+    source_items = app.canvas.find_withtag(source_layer_id)
+
     new_layer_data = add_new_layer(app, name=f"{source_layer['name']} 副本", insert_index=selected_index + 1)
     new_layer_id = new_layer_data['id']
-    new_layer = get_layer_by_id(app, new_layer_id)
-    new_layer['opacity'] = source_layer['opacity']
+    new_layer_data['opacity'] = source_layer['opacity']
 
-    tag_mapping = {}  # old unique_tag -> new unique_tag
-    part_mapping = {} # old unique_tag -> list of (old_part_id, new_part_id)
-    state_cache = {}  # old unique_tag -> original state copy
+    canvas_width, canvas_height = app.viewport.size
 
-    items_to_copy = app.canvas.find_withtag(source_layer['id'])
-    for item_id in items_to_copy:
+    tag_mapping = {}     # 旧唯一标签 -> 新唯一标签
+    style_cache = {}     # (旧唯一标签, 项类型) -> (新标签元组, 选项)，同一对象的各段共享
+    new_coords_maps = {} # 新唯一标签 -> {新项ID: 逻辑坐标}
+    for item_id in source_items:
+        unique_tag = item_tags.get(item_id)
         item_type = app.canvas.type(item_id)
-        coords = app.canvas.coords(item_id)
-        cleaned_options = {}
-        copy_keys = ['tags', 'width', 'fill', 'outline', 'capstyle', 'smooth', 'joinstyle', 'dash', 'text', 'font', 'anchor']
-        for key in copy_keys:
-            try:
-                cleaned_options[key] = app.canvas.itemcget(item_id, key)
-            except: pass
-        original_tags = list(app.canvas.gettags(item_id))
-        new_tags = [t for t in original_tags if t != source_layer['id']]
-        new_tags.append(new_layer_id)
-        unique_tag = next((t for t in original_tags if t.startswith(('shape_', 'stroke_', 'erase_stroke_'))), None)
-        new_unique_tag = None
-        if unique_tag:
-            if unique_tag not in tag_mapping:
-                tag_mapping[unique_tag] = f"{unique_tag.split('_')[0]}_{time.time()}"
-            new_unique_tag = tag_mapping[unique_tag]
-            new_tags = [t if t != unique_tag else new_unique_tag for t in new_tags]
-
-        if item_type == "image":
-            state = app.object_states.get(unique_tag or "")
-            pil_img = state.get('original_pil_image') if state else None
-            if not pil_img: continue
-
-            from coordinate_system import logical_to_screen
-            app.canvas.update_idletasks()
-            canvas_width = max(app.canvas.winfo_width(), 1)
-            canvas_height = max(app.canvas.winfo_height(), 1)
-
-            if state and 'start_xy' in state:
-                logical_pos = state['start_xy']
-            elif state and 'original_coords' in state and len(state['original_coords']) >= 2:
-                logical_pos = (state['original_coords'][0], state['original_coords'][1])
-            else:
-                continue
-
-            screen_pos = logical_to_screen(
-                list(logical_pos),
-                app.zoom_level,
-                app.pan_offset_x,
-                app.pan_offset_y,
-                canvas_width,
-                canvas_height
+        style_key = (unique_tag or item_id, item_type)
+        style = style_cache.get(style_key)
+        if style is None:
+            original_tags = app.canvas.gettags(item_id)
+            if unique_tag is None:
+                unique_tag = next((t for t in original_tags if t.startswith(OBJECT_TAG_PREFIXES)), None)
+            if unique_tag and unique_tag not in tag_mapping:
+                # 只保留类型前缀，副本的副本不会累积旧的时间戳
+                prefix = next((p for p in sorted(OBJECT_TAG_PREFIXES, key=len, reverse=True)
+                               if unique_tag.startswith(p)), unique_tag.split('_', 1)[0] + '_')
+                tag_mapping[unique_tag] = f"{prefix}{time.time()}_{len(tag_mapping)}"
+            new_tags = tuple(
+                new_layer_id if t == source_layer_id else tag_mapping.get(t, t)
+                for t in original_tags if t != "current"
             )
+            config = app.canvas.itemconfigure(item_id)
+            options = {key: config[key][-1] for key in _DUPLICATE_OPTION_KEYS if key in config}
+            style = (new_tags, options)
+            style_cache[style_key] = style
+        new_tags, options = style
+
+        state = app.object_states.get(unique_tag) if unique_tag else None
+        coords_map = state.get('original_coords_map') if state else None
+        logical_coords = coords_map.get(item_id) if coords_map else None
+        if logical_coords is not None:
+            coords = logical_to_screen(logical_coords, app.zoom_level, app.pan_offset_x, app.pan_offset_y,
+                                       canvas_width, canvas_height)
+        else:
+            coords = app.canvas.coords(item_id)
 
-            pil_img_copy = pil_img.copy()
-            tk_img = ImageTk.PhotoImage(pil_img_copy)
-
-            cleaned_options['tags'] = new_tags
-            new_item_id = app.canvas.create_image(screen_pos[0], screen_pos[1], image=tk_img, anchor='nw', tags=tuple(new_tags))
+        if item_type == "image":
+            tk_img = app._image_references.get(item_id)
+            if tk_img is None: continue
+            new_item_id = app.canvas.create_image(coords, image=tk_img, anchor='nw', tags=new_tags)
             app._image_references[new_item_id] = tk_img
+        else:
+            creator_func = getattr(app.canvas, f"create_{item_type}", None)
+            if not creator_func: continue
+            new_item_id = creator_func(coords, tags=new_tags, **options)
 
-            if new_unique_tag and state:
-                state_copy = copy.deepcopy(state)
-                state_copy['original_pil_image'] = pil_img_copy
-                app.object_states[new_unique_tag] = state_copy
-            continue
+        if logical_coords is not None and unique_tag in tag_mapping:
+            new_coords_maps.setdefault(tag_mapping[unique_tag], {})[new_item_id] = list(logical_coords)
 
-        cleaned_options['tags'] = new_tags
-        creator_func = getattr(app.canvas, f"create_{item_type}", None)
-        if creator_func:
-            new_item_id = creator_func(coords, **cleaned_options)
-            if unique_tag and new_unique_tag:
-                if unique_tag not in part_mapping:
-                    part_mapping[unique_tag] = []
-                part_mapping[unique_tag].append((item_id, new_item_id))
-                if unique_tag not in state_cache and unique_tag in app.object_states:
-                    state_cache[unique_tag] = copy.deepcopy(app.object_states[unique_tag])
-
-    # 复制矢量对象的状态数据
+    # 复制对象的逻辑状态
     for old_tag, new_tag in tag_mapping.items():
-        state = state_cache.get(old_tag) or app.object_states.get(old_tag)
+        state = app.object_states.get(old_tag)
         if not state:
             continue
-        new_state = copy.deepcopy(state)
+        new_state = _clone_state(state, new_layer_id)
+        if 'original_coords_map' in state:
+            new_state['original_coords_map'] = new_coords_maps.get(new_tag, {})
+        app.object_states[new_tag] = new_state
+        app.layer_registry.add_object(new_tag, new_layer_id)
 
-        if 'original_coords_map' in new_state and isinstance(new_state['original_coords_map'], dict):
-            new_map = {}
-            for old_id, new_id in part_mapping.get(old_tag, []):
-                if old_id in new_state['original_coords_map']:
-                    new_map[new_id] = new_state['original_coords_map'][old_id]
-            new_state['original_coords_map'] = new_map
+    update_layer_list_ui(app)
+    update_layer_stacking(app)
+    app._capture_and_save_state()
 
-        app.object_states[new_tag] = new_state
+
+def _ask_flatten_resolution(app, title):
+    return simpledialog.askfloat(
+        title, "栅格分辨率（每逻辑单位像素数）:",
+        initialvalue=max(1.0, round(app.zoom_level, 2)), minvalue=0.1, maxvalue=8.0
+    )
+
+
+def _bake_layers(app, target_layer, source_layers, resolution):
+    """
+    把 source_layers（自下而上）上的全部对象渲染为一张位图，
+    删除这些图层上的原有对象，并将位图作为一个光栅对象放到 target_layer 上
+    目标图层自身的不透明度保留为图层属性，其余图层的不透明度烘焙进位图
+    返回是否生成了位图；有对象渲染失败时不删除任何对象并返回 None
+    """
+    from layer_cache import build_layer_records, render_records
+    from transform import placement_matrix, show_raster
+
+    zoom = max(app.zoom_level, 1e-9)
+    groups = [(layer, build_layer_records(app, layer['id'])) for layer in source_layers]
+    bboxes = [record['bbox'] for _, records in groups for record in records]
+
+    if not bboxes:
+        return False
+
+    lx1, ly1 = min(b[0] for b in bboxes), min(b[1] for b in bboxes)
+    lx2, ly2 = max(b[2] for b in bboxes), max(b[3] for b in bboxes)
+    max_side = max(lx2 - lx1, ly2 - ly1) * resolution
+    if max_side > FLATTEN_MAX_SIDE:
+        resolution *= FLATTEN_MAX_SIDE / max_side
+    width = max(int(math.ceil((lx2 - lx1) * resolution)), 1)
+    height = max(int(math.ceil((ly2 - ly1) * resolution)), 1)
+
+    result = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    # 隐藏图层同样渲染，避免其对象被删除后丢失；结果的可见性随目标图层
+    for layer, records in groups:
+        if not records:
+            continue
+        layer_img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+        # Canvas线宽以绘制时的屏幕像素计，换算到目标分辨率
+        failed = render_records(layer_img, records, lx1, ly1, resolution, width_scale=resolution / zoom)
+        if failed:
+            # 烘焙会删除原对象，任何对象渲染失败都中止，保留原有内容
+            count = len({record['tag'] or id(record) for record in failed})
+            messagebox.showerror("烘焙失败", f"有 {count} 个对象无法渲染，图层未做修改。")
+            return None
+        opacity = 1.0 if layer is target_layer else layer.get('opacity', 1.0)
+        if opacity < 1.0:
+            layer_img.putalpha(layer_img.getchannel('A').point([int(a * opacity + 0.5) for a in range(256)]))
+        result.alpha_composite(layer_img)
+
+    # 位图渲染完成后再删除原有对象
+    for layer in source_layers:
+        for unique_tag in list(app.layer_registry.objects_on(layer['id'])):
+            app.object_states.pop(unique_tag, None)
+            app._surface_image_cache.pop(unique_tag, None)
+            app.layer_registry.discard_object(unique_tag)
+        for item_id in app.canvas.find_withtag(layer['id']):
+            app._image_references.pop(item_id, None)
+            app._raster_render_keys.pop(item_id, None)
+        app.canvas.delete(layer['id'])
+
+    lx2, ly2 = lx1 + width / resolution, ly1 + height / resolution
+    unique_tag = f"shape_{time.time()}"
+    app.object_states[unique_tag] = {
+        'tool': 'flatten', 'angle': 0,
+        'start_xy': (lx1, ly1), 'end_xy': (lx2, ly2),
+        'original_coords': [lx1, ly1, lx2, ly2],
+        'original_pil_image': result,
+        # 位图每逻辑单位 resolution 个像素
+        'matrix': placement_matrix(lx1, ly1, 1.0 / resolution),
+        'zoom_ref': resolution, 'pan_ref_x': app.pan_offset_x, 'pan_ref_y': app.pan_offset_y
+    }
+
+    img_id = app.canvas.create_image(0, 0, anchor='nw', tags=(unique_tag, target_layer['id']))
+    show_raster(app, img_id, app.object_states[unique_tag])
+    if target_layer['id'] in app._composited_layers or not target_layer.get('visible', True):
+        app.canvas.itemconfig(img_id, state='hidden')
+    app.layer_registry.add_object(unique_tag, target_layer['id'])
+    return True
+
+
+def flatten_selected_layer(app):
+    """展平当前图层：所有对象烘焙为一个光栅对象"""
+    selected_index = _get_selected_layer_index(app)
+    if selected_index is None: return
+    layer = app.layers[selected_index]
+    if not app.canvas.find_withtag(layer['id']):
+        messagebox.showinfo("展平图层", "当前图层没有可展平的对象。")
+        return
+    resolution = _ask_flatten_resolution(app, "展平图层")
+    if not resolution: return
+    if app.selection_group:
+        app._clear_resize_handles()
+        app.selection_group.clear()
+    if _bake_layers(app, layer, [layer], resolution) is None:
+        return
+    update_layer_stacking(app)
+    app._capture_and_save_state()
+
+
+def merge_layer_down(app):
+    """向下合并：当前图层与其下方图层的对象一起烘焙为下方图层上的一个光栅对象"""
+    selected_index = _get_selected_layer_index(app)
+    if selected_index is None: return
+    if selected_index == 0:
+        messagebox.showwarning("警告", "当前图层下方没有可合并的图层。")
+        return
+    upper, lower = app.layers[selected_index], app.layers[selected_index - 1]
+    if upper.get('visible', True) != lower.get('visible', True):
+        # 合并结果只有一种可见性，不能把隐藏图层的内容并入可见图层（或反之）
+        messagebox.showwarning("警告", "要合并的两个图层可见性不同，请先显示或隐藏它们。")
+        return
+    resolution = _ask_flatten_resolution(app, "向下合并")
+    if not resolution: return
+    if app.selection_group:
+        app._clear_resize_handles()
+        app.selection_group.clear()
+    if _bake_layers(app, lower, [lower, upper], resolution) is None:
+        return
+    app.layers.pop(selected_index)
+    app.layer_registry.reindex(app.layers)
+    app.active_layer_id = lower['id']
     update_layer_list_ui(app)
     update_layer_stacking(app)
     app._capture_and_save_state()
@@ -161,6 +362,7 @@ def move_layer_up(app):
     idx = _get_selected_layer_index(app)
     if idx is not None and idx < len(app.layers) - 1:
         app.layers[idx], app.layers[idx+1] = app.layers[idx+1], app.layers[idx]
+        app.layer_registry.reindex(app.layers)
         update_layer_list_ui(app)
         update_layer_stacking(app)
         app._capture_and_save_state()
@@ -170,6 +372,7 @@ def move_layer_down(app):
     idx = _get_selected_layer_index(app)
     if idx is not None and idx > 0:
         app.layers[idx], app.layers[idx-1] = app.layers[idx-1], app.layers[idx]
+        app.layer_registry.reindex(app.layers)
         update_layer_list_ui(app)
         update_layer_stacking(app)
         app._capture_and_save_state()
@@ -182,64 +385,107 @@ def select_layer(app, layer_id):
         if app.selection_group:
             app._clear_resize_handles()
             app.selection_group.clear()
+        update_layer_stacking(app)
 
 
 def toggle_layer_visibility(app, layer_id):
     layer = get_layer_by_id(app, layer_id)
     if layer:
         layer['visible'] = not layer['visible']
-        new_state = "normal" if layer['visible'] else "hidden"
-        app.canvas.itemconfig(layer_id, state=new_state)
+        # 以合成位图显示的图层，其Canvas项保持隐藏，只需重新合成
+        if layer_id not in app._composited_layers:
+            new_state = "normal" if layer['visible'] else "hidden"
+            app.canvas.itemconfig(layer_id, state=new_state)
         update_layer_list_ui(app)
+        app.refresh_layer_composites()
 
 
 def set_layer_opacity(app, layer_id, opacity_value):
     layer = get_layer_by_id(app, layer_id)
     if layer:
         layer['opacity'] = float(opacity_value)
-        stipple_pattern = ""
-        opacity = float(opacity_value)
-        if 0.75 <= opacity < 1.0: stipple_pattern = "gray75"
-        elif 0.5 <= opacity < 0.75: stipple_pattern = "gray50"
-        elif 0.25 <= opacity < 0.5: stipple_pattern = "gray25"
-        elif 0 < opacity < 0.25: stipple_pattern = "gray12"
-        for item_id in app.canvas.find_withtag(layer_id):
-            try:
-                app.canvas.itemconfig(item_id, stipple=stipple_pattern)
-            except Exception:
-                pass
+        # 滑块拖动会连续触发，合并为一次合成刷新；不透明度作用于图层的缓存合成位图，与对象数量无关
+        if app._opacity_refresh_job is not None:
+            app.after_cancel(app._opacity_refresh_job)
+        app._opacity_refresh_job = app.after(OPACITY_REFRESH_DELAY_MS, lambda: _flush_layer_opacity(app))
+
+
+def _flush_layer_opacity(app):
+    app._opacity_refresh_job = None
+    app.refresh_layer_composites()
+
+
+def _layer_row_snapshot(app, layer):
+    """图层行的显示内容，用于与上次的显示比对"""
+    return (layer['name'], layer['visible'], layer['id'] == app.active_layer_id, layer.get('opacity', 1.0))
+
+
+def _create_layer_row(app, layer):
+    layer_id = layer['id']
+    frame = ctk.CTkFrame(app.layer_list_frame)
+    frame.grid_columnconfigure(1, weight=1)
+    vis_button = ctk.CTkButton(frame, text="", width=30, command=lambda l_id=layer_id: toggle_layer_visibility(app, l_id))
+    vis_button.grid(row=0, column=0, padx=5, pady=2)
+    name_button = ctk.CTkButton(frame, text="", command=lambda l_id=layer_id: select_layer(app, l_id), anchor="w")
+    name_button.grid(row=0, column=1, sticky="ew", pady=2, columnspan=2)
+    name_button.bind("<Double-Button-1>", lambda event, l_id=layer_id: rename_layer(app, l_id))
+    opacity_label = ctk.CTkLabel(frame, text="不透明度", font=("Microsoft YaHei", 10))
+    opacity_label.grid(row=1, column=0, columnspan=2, padx=5, pady=(0, 5), sticky="w")
+    opacity_slider = ctk.CTkSlider(frame, from_=0.0, to=1.0,
+                                   command=lambda value, l_id=layer_id: set_layer_opacity(app, l_id, value))
+    opacity_slider.grid(row=1, column=1, columnspan=2, padx=(20, 5), pady=(0, 5), sticky="ew")
+    app.layer_ui_stats['created'] += 1
+    return {'frame': frame, 'vis_button': vis_button, 'name_button': name_button,
+            'opacity_slider': opacity_slider, 'snapshot': None}
+
+
+def _update_layer_row(app, row, layer):
+    """只修改与上次显示不同的控件属性"""
+    snapshot = _layer_row_snapshot(app, layer)
+    old = row['snapshot']
+    if old == snapshot:
+        return
+    name, visible, is_active, opacity = snapshot
+    if old is None or old[0] != name or old[2] != is_active:
+        fg_color = app.active_fg_color if is_active else "transparent"
+        hover_color = app.active_hover_color if is_active else ("gray70", "gray30")
+        row['name_button'].configure(text=name, fg_color=fg_color, hover_color=hover_color)
+    if old is None or old[1] != visible:
+        row['vis_button'].configure(text="👁️" if visible else "🙈")
+    if old is None or old[3] != opacity:
+        row['opacity_slider'].set(opacity)
+    row['snapshot'] = snapshot
+    app.layer_ui_stats['updated'] += 1
 
 
 def update_layer_list_ui(app):
-    for widget_dict in list(app.layer_ui_widgets.values()):
+    """
+    增量更新图层面板：与上次显示的图层列表比对，
+    只销毁已删除图层的行、为新图层创建行、刷新内容变化的行，顺序变化时重新排列
+    """
+    current_ids = [layer['id'] for layer in reversed(app.layers)]
+    current_set = set(current_ids)
+    for layer_id in [l_id for l_id in app.layer_ui_widgets if l_id not in current_set]:
         try:
-            widget_dict['frame'].destroy()
+            app.layer_ui_widgets.pop(layer_id)['frame'].destroy()
         except Exception:
             pass
-    app.layer_ui_widgets.clear()
-    for layer in reversed(app.layers):
-        layer_id = layer['id']
-        frame = ctk.CTkFrame(app.layer_list_frame)
-        frame.pack(fill="x", pady=2, padx=2)
-        frame.grid_columnconfigure(1, weight=1)
-        is_active = (layer_id == app.active_layer_id)
-        fg_color = app.active_fg_color if is_active else "transparent"
-        hover_color = app.active_hover_color if is_active else ("gray70", "gray30")
-        vis_icon = "👁️" if layer['visible'] else "🙈"
-        vis_button = ctk.CTkButton(frame, text=vis_icon, width=30, command=lambda l_id=layer_id: toggle_layer_visibility(app, l_id))
-        vis_button.grid(row=0, column=0, padx=5, pady=2)
-        name_button = ctk.CTkButton(frame, text=layer['name'], fg_color=fg_color, hover_color=hover_color,
-                                   command=lambda l_id=layer_id: select_layer(app, l_id),
-                                   anchor="w")
-        name_button.grid(row=0, column=1, sticky="ew", pady=2, columnspan=2)
-        name_button.bind("<Double-Button-1>", lambda event, l_id=layer_id: rename_layer(app, l_id))
-        opacity_label = ctk.CTkLabel(frame, text="不透明度", font=("Microsoft YaHei", 10))
-        opacity_label.grid(row=1, column=0, columnspan=2, padx=5, pady=(0, 5), sticky="w")
-        opacity_slider = ctk.CTkSlider(frame, from_=0.0, to=1.0, 
-                                       command=lambda value, l_id=layer_id: set_layer_opacity(app, l_id, value))
-        opacity_slider.set(layer.get('opacity', 1.0))
-        opacity_slider.grid(row=1, column=1, columnspan=2, padx=(20, 5), pady=(0, 5), sticky="ew")
-        app.layer_ui_widgets[layer_id] = {'frame': frame, 'vis_button': vis_button, 'name_button': name_button, 'opacity_slider': opacity_slider}
+        app.layer_ui_stats['destroyed'] += 1
+
+    for layer in app.layers:
+        row = app.layer_ui_widgets.get(layer['id'])
+        if row is None:
+            row = _create_layer_row(app, layer)
+            app.layer_ui_widgets[layer['id']] = row
+        _update_layer_row(app, row, layer)
+
+    if current_ids != app._layer_ui_order:
+        for layer_id in current_ids:
+            frame = app.layer_ui_widgets[layer_id]['frame']
+            frame.pack_forget()
+            frame.pack(fill="x", pady=2, padx=2)
+        app._layer_ui_order = current_ids
+        app.layer_ui_stats['reordered'] += 1
 
 
 def rename_layer(app, layer_id):
@@ -252,10 +498,21 @@ def rename_layer(app, layer_id):
 
 
 def update_layer_stacking(app):
+    from layer_cache import COMPOSITE_BELOW_TAG, COMPOSITE_ABOVE_TAG
+    app.refresh_layer_composites()
     try:
         app.canvas.tag_lower("grid_line")
+        app.canvas.tag_lower("canvas_bg")
     except Exception:
         pass
+    if app._composited_layers:
+        # 非编辑图层已合成为两张位图：下方合成 -> 活动图层 -> 上方合成
+        for tag in (COMPOSITE_BELOW_TAG, app.active_layer_id, COMPOSITE_ABOVE_TAG, "handle"):
+            try:
+                app.canvas.tag_raise(tag)
+            except Exception:
+                pass
+        return
     for layer in app.layers:
         try:
             app.canvas.tag_raise(layer['id'])
@@ -264,4 +521,5 @@ def update_layer_stacking(app):
 
 
 def get_layer_by_id(app, layer_id):
-    return next((l for l in app.layers if l['id'] == layer_id), None)
+    index = get_layer_index(app, layer_id)
+    return app.layers[index] if index is not None else None
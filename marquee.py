@@ -0,0 +1,295 @@
+# marquee.py
+"""
+选择工具的框选（橡皮筋选择）
+
+- 候选对象来自逻辑坐标下的均匀网格空间索引，不对全部 Tk 图元做 find_overlapping；
+- 命中判定基于 object_states 中保存的几何（折线/多边形/椭圆/点），而不是屏幕包围盒；
+- 拖动过程中每帧增量更新选区，松开时即为最终结果。
+"""
+import math
+from transform import raster_corners
+
+MARQUEE_TAG = "marquee"
+SPATIAL_CELL_SIZE = 256  # 逻辑像素
+
+
+class SpatialIndex:
+    """均匀网格空间索引：键 -> 包围盒，单元格 -> 键集合"""
+
+    def __init__(self, cell_size=SPATIAL_CELL_SIZE):
+        self.cell_size = float(cell_size)
+        self.cells = {}
+        self.bboxes = {}
+
+    def _cell_range(self, bbox):
+        size = self.cell_size
+        return (int(math.floor(bbox[0] / size)), int(math.floor(bbox[1] / size)),
+                int(math.floor(bbox[2] / size)), int(math.floor(bbox[3] / size)))
+
+    def insert(self, key, bbox):
+        self.bboxes[key] = bbox
+        cx1, cy1, cx2, cy2 = self._cell_range(bbox)
+        for cy in range(cy1, cy2 + 1):
+            for cx in range(cx1, cx2 + 1):
+                self.cells.setdefault((cx, cy), set()).add(key)
+
+    def query(self, rect):
+        """包围盒与 rect 相交的所有键"""
+        cx1, cy1, cx2, cy2 = self._cell_range(rect)
+        candidates = set()
+        cells = self.cells
+        # 框选范围比对象稀疏时遍历已占用单元格更快
+        if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > len(cells):
+            for (cx, cy), keys in cells.items():
+                if cx1 <= cx <= cx2 and cy1 <= cy <= cy2:
+                    candidates |= keys
+        else:
+            for cy in range(cy1, cy2 + 1):
+                for cx in range(cx1, cx2 + 1):
+                    keys = cells.get((cx, cy))
+                    if keys:
+                        candidates |= keys
+        x1, y1, x2, y2 = rect
+        bboxes = self.bboxes
+        return {k for k in candidates
+                if bboxes[k][0] <= x2 and bboxes[k][2] >= x1 and bboxes[k][1] <= y2 and bboxes[k][3] >= y1}
+
+
+def _rotate_flat(flat, angle_deg, cx, cy):
+    rad = math.radians(angle_deg)
+    c, s = math.cos(rad), math.sin(rad)
+    out = []
+    for i in range(0, len(flat) - 1, 2):
+        dx, dy = flat[i] - cx, flat[i + 1] - cy
+        out.extend((cx + dx * c - dy * s, cy + dx * s + dy * c))
+    return out
+
+
+def _ellipse_polygon(x1, y1, x2, y2, steps=32):
+    cx, cy = (x1 + x2) / 2.0, (y1 + y2) / 2.0
+    rx, ry = abs(x2 - x1) / 2.0, abs(y2 - y1) / 2.0
+    flat = []
+    for i in range(steps):
+        t = 2 * math.pi * i / steps
+        flat.extend((cx + rx * math.cos(t), cy + ry * math.sin(t)))
+    return flat
+
+
+def object_geometry(state):
+    """
+    从逻辑状态提取用于命中判定的几何
+
+    Returns:
+        形状列表，每项为 ('polyline', flat, closed) / ('ellipse', x1, y1, x2, y2) / ('point', x, y)；
+        无法识别时返回空列表
+    """
+    tool = state.get('tool')
+    angle = state.get('angle', 0) or 0
+    shapes = []
+
+    if 'control_grid' in state:
+        # 曲面：控制网格的每一行、每一列都作为折线
+        grid = state['control_grid']
+        for row in grid:
+            shapes.append(('polyline', [c for p in row for c in p[:2]], False))
+        for col in zip(*grid):
+            shapes.append(('polyline', [c for p in col for c in p[:2]], False))
+        return shapes
+
+    if state.get('original_pil_image') is not None:
+        # 光栅对象：源位图四角经 matrix 变换后的多边形，随粘贴、翻转、旋转与显示一致
+        c = raster_corners(state)
+        return [('polyline', [c[0], c[1], c[2], c[3], c[6], c[7], c[4], c[5]], True)]
+
+    if 'start_xy' in state and 'end_xy' in state:
+        (sx, sy), (ex, ey) = state['start_xy'], state['end_xy']
+        if tool == 'line':
+            flat, closed = [sx, sy, ex, ey], False
+        elif tool == 'circle':
+            flat, closed = _ellipse_polygon(sx, sy, ex, ey), True
+        else:
+            flat, closed = [sx, sy, ex, sy, ex, ey, sx, ey], True
+        if angle:
+            flat = _rotate_flat(flat, angle, (sx + ex) / 2.0, (sy + ey) / 2.0)
+        return [('polyline', flat, closed)]
+
+    if state.get('points'):
+        flat = [c for p in state['points'] for c in p[:2]]
+        if angle:
+            xs, ys = flat[0::2], flat[1::2]
+            flat = _rotate_flat(flat, angle, (min(xs) + max(xs)) / 2.0, (min(ys) + max(ys)) / 2.0)
+        return [('polyline', flat, True)]
+
+    if state.get('line_segments'):
+        segments = [list(seg[:4]) for seg in state['line_segments']]
+        if angle:
+            xs = [c for seg in segments for c in seg[0::2]]
+            ys = [c for seg in segments for c in seg[1::2]]
+            cx, cy = (min(xs) + max(xs)) / 2.0, (min(ys) + max(ys)) / 2.0
+            segments = [_rotate_flat(seg, angle, cx, cy) for seg in segments]
+        return [('polyline', seg, False) for seg in segments]
+
+    if state.get('original_coords_map'):
+        return [('polyline', list(coords), False) for coords in state['original_coords_map'].values() if coords]
+
+    coords = state.get('original_coords')
+    if coords:
+        if len(coords) == 2:
+            return [('point', coords[0], coords[1])]
+        if 'control_points' in state or tool == 'line':
+            # 曲线上的采样点 / 矢量直线
+            return [('polyline', list(coords), False)]
+        if len(coords) == 4:
+            x1, y1, x2, y2 = coords
+            if tool == 'circle':
+                return [('ellipse', x1, y1, x2, y2)]
+            return [('polyline', [x1, y1, x2, y1, x2, y2, x1, y2], True)]
+        return [('polyline', list(coords), True)]
+    return shapes
+
+
+def geometry_bbox(shapes):
+    xs, ys = [], []
+    for shape in shapes:
+        if shape[0] == 'polyline':
+            xs.extend(shape[1][0::2])
+            ys.extend(shape[1][1::2])
+        else:
+            xs.extend(shape[1::2])
+            ys.extend(shape[2::2])
+    if not xs or not ys:
+        return None
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def _segment_hits_rect(ax, ay, bx, by, rect):
+    """线段与轴对齐矩形是否相交（Liang-Barsky 裁剪）"""
+    x1, y1, x2, y2 = rect
+    t0, t1 = 0.0, 1.0
+    dx, dy = bx - ax, by - ay
+    for p, q in ((-dx, ax - x1), (dx, x2 - ax), (-dy, ay - y1), (dy, y2 - ay)):
+        if p == 0:
+            if q < 0:
+                return False
+        else:
+            t = q / p
+            if p < 0:
+                if t > t1:
+                    return False
+                t0 = max(t0, t)
+            else:
+                if t < t0:
+                    return False
+                t1 = min(t1, t)
+    return True
+
+
+def _point_in_polygon(px, py, flat):
+    inside = False
+    n = len(flat) // 2
+    j = n - 1
+    for i in range(n):
+        xi, yi = flat[2 * i], flat[2 * i + 1]
+        xj, yj = flat[2 * j], flat[2 * j + 1]
+        if (yi > py) != (yj > py) and px < (xj - xi) * (py - yi) / ((yj - yi) or 1e-12) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def geometry_hits_rect(shapes, rect):
+    """几何是否与逻辑矩形 rect 相交"""
+    x1, y1, x2, y2 = rect
+    for shape in shapes:
+        kind = shape[0]
+        if kind == 'point':
+            if x1 <= shape[1] <= x2 and y1 <= shape[2] <= y2:
+                return True
+        elif kind == 'ellipse':
+            ex1, ey1, ex2, ey2 = shape[1:]
+            cx, cy = (ex1 + ex2) / 2.0, (ey1 + ey2) / 2.0
+            rx, ry = max(abs(ex2 - ex1) / 2.0, 1e-9), max(abs(ey2 - ey1) / 2.0, 1e-9)
+            # 在单位圆空间中取矩形上离圆心最近的点
+            nx = (min(max(cx, x1), x2) - cx) / rx
+            ny = (min(max(cy, y1), y2) - cy) / ry
+            if nx * nx + ny * ny <= 1.0:
+                return True
+        else:
+            flat, closed = shape[1], shape[2]
+            n = len(flat) // 2
+            if n == 1 and x1 <= flat[0] <= x2 and y1 <= flat[1] <= y2:
+                return True
+            last = n if closed else n - 1
+            for i in range(last):
+                j = (i + 1) % n
+                if _segment_hits_rect(flat[2 * i], flat[2 * i + 1], flat[2 * j], flat[2 * j + 1], rect):
+                    return True
+            # 矩形完全落在闭合图形内部
+            if closed and n >= 3 and _point_in_polygon((x1 + x2) / 2.0, (y1 + y2) / 2.0, flat):
+                return True
+    return False
+
+
+def build_selection_index(app, layer_id):
+    """为图层上的对象建立空间索引，返回 (索引, 标签 -> 几何)"""
+    index = SpatialIndex()
+    geometries = {}
+    for tag in app.layer_registry.objects_on(layer_id):
+        state = app.object_states.get(tag)
+        if not state:
+            continue
+        shapes = object_geometry(state)
+        bbox = geometry_bbox(shapes)
+        if bbox is None:
+            continue
+        geometries[tag] = shapes
+        index.insert(tag, bbox)
+    return index, geometries
+
+
+def begin_marquee(app, x, y, additive):
+    """在空白处按下选择工具：开始框选"""
+    index, geometries = build_selection_index(app, app.active_layer_id)
+    app.marquee = {
+        'start': (x, y),
+        'index': index,
+        'geometries': geometries,
+        'base': set(app.selection_group) if additive else set(),
+        'hits': set(),
+        'item': app.canvas.create_rectangle(x, y, x, y, outline="#4DA3FF", dash=(4, 2), tags=MARQUEE_TAG),
+    }
+
+
+def update_marquee(app, x, y):
+    """拖动框选：查询空间索引并精确判定，增量更新选区"""
+    session = app.marquee
+    if session is None:
+        return
+    sx, sy = session['start']
+    app.canvas.coords(session['item'], sx, sy, x, y)
+    lx1, ly1, lx2, ly2 = app.viewport.to_logical([sx, sy, x, y])
+    rect = (min(lx1, lx2), min(ly1, ly2), max(lx1, lx2), max(ly1, ly2))
+
+    geometries = session['geometries']
+    hits = {tag for tag in session['index'].query(rect) if geometry_hits_rect(geometries[tag], rect)}
+    if hits == session['hits']:
+        return
+    base = session['base']
+    for tag in session['hits'] - hits:
+        if tag not in base:
+            app.selection_group.discard(tag)
+    for tag in hits - session['hits']:
+        app.selection_group.add(tag)
+    session['hits'] = hits
+    app._draw_resize_handles()
+    app.canvas.tag_raise(MARQUEE_TAG)
+
+
+def end_marquee(app):
+    """松开鼠标：移除橡皮筋矩形，选区保持为最后一次的结果"""
+    session = app.marquee
+    if session is None:
+        return
+    app.canvas.delete(session['item'])
+    app.marquee = None
+    app._draw_resize_handles()
@@ -11,13 +11,20 @@ class PixelBuffer:
         self.pixel_buffer.putpixel(x, y, rgba)
         self.pixel_buffer.draw_line(coords, rgba, width)
         self.pixel_buffer.composite_tmp(tmp_image)  # 把 tmp 合成到主缓冲并一次性绘回 Canvas
+
+    所有绘制操作只记录脏矩形；flush() 时仅把脏区域写入唯一一个常驻的 PhotoImage，
+    Canvas 上始终只有一个对应的图像项
     """
+    MAX_DIRTY_RECTS = 16  # 脏矩形超过该数量时合并为一个包围矩形
+
     def __init__(self, canvas, canvas_bg_color="#333333"):
         self.canvas = canvas
         self.canvas_bg_color = canvas_bg_color
         self.image = None
         self.draw = None
-        self._image_refs = []
+        self.dirty_rects = []  # 待推送到 PhotoImage 的区域 (x1, y1, x2, y2)，右下边界不含
+        self._photo = None     # 常驻的 PhotoImage
+        self.item_id = None    # 显示缓冲的 Canvas 图像项
 
     @staticmethod
     def hex_to_rgba(hex_color):
@@ -46,21 +53,81 @@ class PixelBuffer:
             except Exception:
                 bg_rgba = (51, 51, 51, 255)
             img = Image.new("RGBA", (width, height), bg_rgba)
+            if self.image is not None:
+                img.paste(self.image, (0, 0))  # 窗口尺寸变化时保留已有内容
             self.image = img
             self.draw = ImageDraw.Draw(self.image)
+            # 尺寸变化后原 PhotoImage 不再适用，下次 flush 时整体重建
+            self._photo = None
+            self.dirty_rects = [(0, 0, width, height)]
+
+    def mark_dirty(self, x1, y1, x2, y2):
+        """记录一个需要推送到屏幕的矩形区域（自动裁剪到缓冲范围）"""
+        if self.image is None:
+            return
+        width, height = self.image.size
+        x1, y1 = max(0, int(x1)), max(0, int(y1))
+        x2, y2 = min(width, int(x2) + 1), min(height, int(y2) + 1)
+        if x1 >= x2 or y1 >= y2:
+            return
+        self.dirty_rects.append((x1, y1, x2, y2))
+        if len(self.dirty_rects) > self.MAX_DIRTY_RECTS:
+            xs1, ys1, xs2, ys2 = zip(*self.dirty_rects)
+            self.dirty_rects = [(min(xs1), min(ys1), max(xs2), max(ys2))]
+
+    def _mark_coords_dirty(self, coords, pad=0):
+        if not coords:
+            return
+        if isinstance(coords[0], (tuple, list)):
+            coords = [c for point in coords for c in point]
+        xs, ys = coords[0::2], coords[1::2]
+        self.mark_dirty(min(xs) - pad, min(ys) - pad, max(xs) + pad, max(ys) + pad)
+
+    def flush(self, tags=None):
+        """
+        把脏区域推送到常驻的 PhotoImage：首次或尺寸变化时整体创建，
+        之后每个脏矩形裁剪成小图，通过 Tk 的 photo copy 写入目标位置
+        返回显示缓冲的 Canvas 图像项ID
+        """
+        if self.image is None:
+            self.ensure()
+        image_tag = "pixelbuffer_image"
+        if self._photo is None:
+            self._photo = ImageTk.PhotoImage(self.image)
+            if self.item_id is not None and self.canvas.type(self.item_id):
+                self.canvas.itemconfig(self.item_id, image=self._photo)
+            else:
+                self.item_id = self.canvas.create_image(0, 0, image=self._photo, anchor='nw', tags=(image_tag,))
+        else:
+            # Pillow 的 PhotoImage.paste 不支持指定区域，借助临时小图 + Tk photo copy 局部更新
+            for x1, y1, x2, y2 in self.dirty_rects:
+                patch = ImageTk.PhotoImage(self.image.crop((x1, y1, x2, y2)))
+                self.canvas.tk.call(str(self._photo), 'copy', str(patch),
+                                    '-to', x1, y1, '-compositingrule', 'set')
+            if self.item_id is None or not self.canvas.type(self.item_id):
+                self.item_id = self.canvas.create_image(0, 0, image=self._photo, anchor='nw', tags=(image_tag,))
+        self.dirty_rects = []
+
+        if tags:
+            for tag in (tags if isinstance(tags, (list, tuple)) else (tags,)):
+                self.canvas.addtag_withtag(tag, self.item_id)
+        return self.item_id
 
     def putpixel(self, x, y, rgba):
         if self.image is None:
             self.ensure()
         try:
             self.image.putpixel((int(x), int(y)), rgba)
+            self.mark_dirty(x, y, x, y)
         except Exception:
             pass
+
     def draw_line(self, coords, rgba, width=1):
         if self.draw is None:
             self.ensure()
         try:
             self.draw.line(coords, fill=rgba, width=width)
+            self._mark_coords_dirty(coords, width)
         except Exception:
             pass
 
@@ -69,44 +136,44 @@ class PixelBuffer:
             self.ensure()
         try:
             self.draw.rectangle([x1, y1, x2, y2], fill=rgba)
+            self.mark_dirty(min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
         except Exception:
             pass
 
+    def flood_fill(self, x, y, rgba, tolerance=0):
+        """在缓冲上做扫描线洪水填充，返回被填充区域的包围矩形（未填充时为 None）"""
+        from raster import SimpleRasterization
+        if self.image is None:
+            self.ensure()
+        bbox = SimpleRasterization.flood_fill(self.image, int(x), int(y), rgba, tolerance)
+        if bbox:
+            self.mark_dirty(bbox[0], bbox[1], bbox[2] - 1, bbox[3] - 1)
+        return bbox
+
     def composite_tmp(self, tmp_image, tags=None):
-        """将 tmp_image 合成到主缓冲并一次性绘回 Canvas（保持引用避免 GC）。
+        """将 tmp_image 合成到主缓冲，并只把其有内容的区域推送回 Canvas。
 
         参数:
-            tmp_image: PIL.Image (RGBA)
-            tags: 可选的 Canvas 标签序列或单个标签，用于合成后的图像项
+            tmp_image: PIL.Image (RGBA)，与缓冲同尺寸、原点对齐
+            tags: 可选的 Canvas 标签序列或单个标签，添加到显示缓冲的图像项上
         返回:
             canvas image id 或 None
         """
         if self.image is None:
             self.ensure()
         try:
-            try:
-                self.image = Image.alpha_composite(self.image, tmp_image)
-            except Exception:
-                self.image.paste(tmp_image, (0, 0), tmp_image)
-            self.draw = ImageDraw.Draw(self.image)
-
-            tk_img = ImageTk.PhotoImage(self.image)
-            image_tag = f"pixelbuffer_image"
-            canvas_tags = ()
-            if tags:
-                if isinstance(tags, (list, tuple)):
-                    canvas_tags = tuple(tags) + (image_tag,)
-                else:
-                    canvas_tags = (tags, image_tag)
-
-            # 在 Canvas 原点绘制整张图像
-            if canvas_tags:
-                img_id = self.canvas.create_image(0, 0, image=tk_img, anchor='nw', tags=canvas_tags)
-            else:
-                img_id = self.canvas.create_image(0, 0, image=tk_img, anchor='nw', tags=(image_tag,))
-
-            self._image_refs.append(tk_img)
-            return img_id
+            bbox = tmp_image.getbbox()
+            if bbox:
+                if tmp_image.mode != "RGBA":
+                    tmp_image = tmp_image.convert("RGBA")
+                # 只合成 tmp 中有内容的区域
+                width, height = self.image.size
+                x1, y1 = bbox[0], bbox[1]
+                x2, y2 = min(bbox[2], width), min(bbox[3], height)
+                if x1 < x2 and y1 < y2:
+                    self.image.alpha_composite(tmp_image, dest=(x1, y1), source=(x1, y1, x2, y2))
+                    self.mark_dirty(x1, y1, x2 - 1, y2 - 1)
+            return self.flush(tags)
         except Exception:
             return None
 
@@ -145,3 +212,5 @@ class PixelBuffer:
                     self.draw.line(coords + coords[:2], fill=outline_rgba or fill_rgba or (0,0,0,255), width=width)
         except Exception:
             pass
+        if item_type in ('oval', 'polygon'):
+            self._mark_coords_dirty(coords, width)
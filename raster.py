@@ -283,49 +283,79 @@ class SimpleRasterization:
         return fill_points
 
     @staticmethod
-    def flood_fill(canvas_data: list, start_x: int, start_y: int, fill_color, target_color) -> list:
+    def flood_fill(image, start_x: int, start_y: int, fill_color, tolerance: int = 0):
         """
-        洪水填充算法 - 从起始点开始填充相邻的相同颜色区域
-        使用栈-based实现，避免递归深度限制
-        canvas_data: 二维列表，表示画布的像素颜色数据
-        start_x, start_y: 起始点的坐标
-        fill_color: 填充颜色
-        target_color: 目标颜色（要被填充的颜色）
-        返回：填充的像素点列表 [(x1,y1), (x2,y2), ...]
+        扫描线（区间种子）洪水填充 - 直接在RGBA图像上原地填充
+        image: PIL RGBA 图像（如 PixelBuffer.image 或光栅对象的位图）
+        start_x, start_y: 起始像素坐标
+        fill_color: 填充颜色 (r, g, b, a)
+        tolerance: 颜色容差，各通道与起始点颜色之差都不超过该值的像素视为同一区域
+        返回：被填充区域的包围矩形 (x1, y1, x2, y2)（右、下边界不含），未填充时返回 None
+
+        先用 ImageChops 一次性求出“可填充”掩码（1 可填充 / 0 不可填充），
+        然后在掩码字节上按行扩展区间：每个区间的左右边界由 bytes.rfind / find 直接求出，
+        只有相邻行中新的可填充区间才入栈，避免逐像素入栈与 visited 集合
         """
-        if not canvas_data or not canvas_data[0]:
-            return []
-
-        height = len(canvas_data)
-        width = len(canvas_data[0])
-
-        if start_x < 0 or start_x >= width or start_y < 0 or start_y >= height:
-            return []
-
-        if canvas_data[start_y][start_x] != target_color:
-            return []
-
-        filled_points = []
+        from PIL import ImageChops
+
+        width, height = image.size
+        if not (0 <= start_x < width and 0 <= start_y < height):
+            return None
+        if image.mode != "RGBA":
+            raise ValueError("flood_fill 需要 RGBA 图像")
+        seed_color = image.getpixel((start_x, start_y))
+        if tolerance <= 0 and tuple(seed_color) == tuple(fill_color):
+            return None
+
+        lut = [1 if v <= tolerance else 0 for v in range(256)]
+        diff = ImageChops.difference(image, Image.new("RGBA", image.size, seed_color))
+        channels = [c.point(lut) for c in diff.split()]
+        mask_img = channels[0]
+        for channel in channels[1:]:
+            mask_img = ImageChops.darker(mask_img, channel)
+        mask = bytearray(mask_img.tobytes())
+        filled = bytearray(width * height)
+
+        x1, y1, x2, y2 = width, height, 0, 0
         stack = [(start_x, start_y)]
-        visited = set()
-
         while stack:
             x, y = stack.pop()
-            if (x, y) in visited:
+            row = y * width
+            if not mask[row + x]:
                 continue
-            visited.add((x, y))
-
-            if canvas_data[y][x] == target_color:
-                canvas_data[y][x] = fill_color
-                filled_points.append((x, y))
-
-                if x > 0:
-                    stack.append((x - 1, y))
-                if x < width - 1:
-                    stack.append((x + 1, y))
-                if y > 0:
-                    stack.append((x, y - 1))
-                if y < height - 1:
-                    stack.append((x, y + 1))
-
-        return filled_points
\ No newline at end of file
+            # 向左右扩展到区间边界
+            left = mask.rfind(b'\x00', row, row + x) + 1
+            if left == 0:
+                left = row
+            right = mask.find(b'\x00', row + x, row + width)
+            if right == -1:
+                right = row + width
+            span = right - left
+            mask[left:right] = bytes(span)
+            filled[left:right] = b'\xff' * span
+
+            x1, x2 = min(x1, left - row), max(x2, right - row)
+            y1, y2 = min(y1, y), max(y2, y + 1)
+
+            # 上下相邻行中，与当前区间重叠的每段可填充区间各压入一个种子
+            for ny in (y - 1, y + 1):
+                if not 0 <= ny < height:
+                    continue
+                offset = (ny - y) * width
+                pos = left + offset
+                end = right + offset
+                while pos < end:
+                    pos = mask.find(b'\x01', pos, end)
+                    if pos == -1:
+                        break
+                    stack.append((pos - ny * width, ny))
+                    pos = mask.find(b'\x00', pos, end)
+                    if pos == -1:
+                        break
+
+        if x1 >= x2:
+            return None
+        bbox = (x1, y1, x2, y2)
+        fill_mask = Image.frombytes("L", (width, height), bytes(filled)).crop(bbox)
+        image.paste(Image.new("RGBA", fill_mask.size, tuple(fill_color)), bbox[:2], fill_mask)
+        return bbox
\ No newline at end of file
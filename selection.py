@@ -10,21 +10,142 @@ def clear_resize_handles(app):
     app.rotation_handle_id = None
 
 
+class SelectionSet(set):
+    """
+    The set of selected object tags, with a cache of each object's bbox.
+
+    Per-object bboxes are stored in logical coordinates, so pans do not
+    invalidate them. Canvas queries only happen for tags that were added or
+    invalidated since the last lookup. The union is kept incrementally:
+    adding merges into it, removing only rebuilds it (from the cache, without
+    Tk calls) when the removed box touched its edge, and moves just shift a
+    shared offset.
+    """
+
+    def __init__(self, app, tags=()):
+        super().__init__(tags)
+        self.app = app
+        self._bboxes = {}  # tag -> logical bbox without the shared offset (None if the tag has no items)
+        self._stale = set(self)  # tags whose bbox must be fetched from the canvas
+        self._union = None  # union of cached bboxes (same frame as _bboxes); None = rebuild
+        self._offset = (0.0, 0.0)
+        self.canvas_queries = 0
+
+    # --- set interface ---
+    def add(self, tag):
+        if tag not in self:
+            super().add(tag)
+            self._stale.add(tag)
+
+    def remove(self, tag):
+        super().remove(tag)
+        self._forget(tag)
+
+    def discard(self, tag):
+        if tag in self:
+            self.remove(tag)
+
+    def clear(self):
+        super().clear()
+        self._bboxes.clear()
+        self._stale.clear()
+        self._union = None
+        self._offset = (0.0, 0.0)
+
+    def update(self, *others):
+        for other in others:
+            for tag in other:
+                self.add(tag)
+
+    def difference_update(self, *others):
+        for other in others:
+            for tag in list(other):
+                self.discard(tag)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __isub__(self, other):
+        self.difference_update(other)
+        return self
+
+    # --- bbox cache ---
+    def _forget(self, tag):
+        self._stale.discard(tag)
+        bbox = self._bboxes.pop(tag, None)
+        union = self._union
+        if bbox is not None and union is not None and (
+                bbox[0] <= union[0] or bbox[1] <= union[1] or bbox[2] >= union[2] or bbox[3] >= union[3]):
+            self._union = None
+
+    def translate(self, dx, dy):
+        """Shift every cached bbox by a logical (dx, dy)."""
+        ox, oy = self._offset
+        self._offset = (ox + dx, oy + dy)
+
+    def invalidate(self, tags=None):
+        """Drop cached bboxes (all of them by default) after a transform."""
+        tags = list(self) if tags is None else [t for t in tags if t in self]
+        for tag in tags:
+            self._bboxes.pop(tag, None)
+            self._stale.add(tag)
+        if tags:
+            self._union = None
+
+    @staticmethod
+    def _merge(a, b):
+        if a is None:
+            return b
+        if b is None:
+            return a
+        return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+    def _fetch_stale(self):
+        canvas, viewport = self.app.canvas, self.app.viewport
+        ox, oy = self._offset
+        for tag in self._stale:
+            screen = canvas.bbox(tag)
+            self.canvas_queries += 1
+            bbox = None
+            if screen:
+                x1, y1, x2, y2 = viewport.to_logical(screen)
+                bbox = (x1 - ox, y1 - oy, x2 - ox, y2 - oy)
+            self._bboxes[tag] = bbox
+            if self._union is not None:
+                self._union = self._merge(self._union, bbox)
+        self._stale.clear()
+
+    def logical_bbox(self):
+        """Union of the selected objects' bboxes in logical coordinates."""
+        if not self:
+            return None
+        if self._stale:
+            self._fetch_stale()
+        if self._union is None:
+            union = None
+            for bbox in self._bboxes.values():
+                union = self._merge(union, bbox)
+            self._union = union
+        if self._union is None:
+            return None
+        ox, oy = self._offset
+        x1, y1, x2, y2 = self._union
+        return (x1 + ox, y1 + oy, x2 + ox, y2 + oy)
+
+    def bbox(self):
+        """Union of the selected objects' bboxes in screen coordinates."""
+        logical = self.logical_bbox()
+        if logical is None:
+            return None
+        return tuple(self.app.viewport.to_screen(logical))
+
+
 def get_selection_bbox(app):
     """Get the bounding box of all selected items."""
     if not app.selection_group:
         return None
-    min_x, min_y, max_x, max_y = float('inf'), float('inf'), float('-inf'), float('-inf')
-    has_bbox = False
-    for tag in app.selection_group:
-        bbox = app.canvas.bbox(tag)
-        if bbox:
-            has_bbox = True
-            min_x = min(min_x, bbox[0])
-            min_y = min(min_y, bbox[1])
-            max_x = max(max_x, bbox[2])
-            max_y = max(max_y, bbox[3])
-    return (min_x, min_y, max_x, max_y) if has_bbox else None
+    return app.selection_group.bbox()
 
 
 def draw_resize_handles(app):
@@ -65,3 +186,59 @@ def draw_resize_handles(app):
         fill="cyan", outline="blue", tags=("handle", "rotate")
     )
     app.resize_handles.append(app.rotation_handle_id)
+
+
+# --- 移动拖拽会话 ---
+# 拖动过程中只用 canvas.move 预览，并累计逻辑位移；
+# 松开（或中途缩放）时才一次性写回 object_states。
+DRAG_TAG = "drag_selection"
+
+
+def begin_move_drag(app, x, y):
+    """开始移动选中对象：给所有选中图元打上临时标签，预览时只需一次 move"""
+    for tag in app.selection_group:
+        app.canvas.addtag_withtag(DRAG_TAG, tag)
+    app.move_drag = {'dx': 0.0, 'dy': 0.0}
+    app.last_x, app.last_y = x, y
+
+
+def update_move_drag(app, x, y):
+    """鼠标移动：仅平移 Canvas 图元并累加逻辑位移"""
+    session = app.move_drag
+    if session is None:
+        return
+    dx, dy = x - app.last_x, y - app.last_y
+    if not dx and not dy:
+        return
+    app.canvas.move(DRAG_TAG, dx, dy)
+    app.canvas.move("handle", dx, dy)
+    zoom = max(app.zoom_level, 1e-9)
+    session['dx'] += dx / zoom
+    session['dy'] += dy / zoom
+    app.selection_group.translate(dx / zoom, dy / zoom)
+    app.last_x, app.last_y = x, y
+
+
+def flush_move_drag(app):
+    """把累计的逻辑位移写回每个选中对象的状态（会话保持）"""
+    session = app.move_drag
+    if session is None:
+        return
+    dx, dy = session['dx'], session['dy']
+    session['dx'] = session['dy'] = 0.0
+    if not dx and not dy:
+        return
+    from transform import translate_object_state
+    for tag in app.selection_group:
+        state = app.object_states.get(tag)
+        if state:
+            translate_object_state(state, dx, dy)
+
+
+def end_move_drag(app):
+    """结束移动：写回逻辑状态并移除临时标签"""
+    if app.move_drag is None:
+        return
+    flush_move_drag(app)
+    app.canvas.dtag(DRAG_TAG, DRAG_TAG)
+    app.move_drag = None
@@ -3,11 +3,14 @@
 """
 Shape handling, filling, and text creation utilities for DrawingApp.
 """
+import math
 import time
+from itertools import chain
 from tkinter import messagebox
-from PIL import Image, ImageTk
 from drawing_utils import create_rasterized_image
+from raster import SimpleRasterization
 from tools import TextToolDialog
+from transform import compose_matrix, invert_matrix, placement_matrix, raster_matrix, show_raster
 
 
 def _redraw_fill(app, unique_tag, outline_points=None):
@@ -34,46 +37,23 @@ def fill_shape(app, event):
     # Branch 1: Rasterized Image Objects
     if item_type == "image":
         state = app.object_states.get(unique_tag)
-        if not state or state.get('tool') in ['pencil', 'line']: return
+        if not state: return
+        if state.get('tool') not in ['rectangle', 'circle', 'polygon']:
+            # 没有“内部填充色”属性的位图（笔迹、直线、展平结果）：按像素做油漆桶填充
+            if _bucket_fill_raster(app, item_id, state, event, color_to_use):
+                app.update_layer_stacking()
+                app._capture_and_save_state()
+            return
 
         state['fill_color'] = color_to_use
         img, (x1, y1) = create_rasterized_image(app, state)
         
         if img:
-            # Update the original PIL image in memory for future transforms
+            # 按逻辑几何重新光栅化：几何已在最终位置，矩阵回到单纯的平移
             state['original_pil_image'] = img
-            
-            # 根据当前 zoom 级别缩放图像
-            zoom_ref = state.get('zoom_ref', 1.0)
-            scale_factor = app.zoom_level / max(zoom_ref, 1e-9)
-            
-            if abs(scale_factor - 1.0) > 0.01:  # 如果缩放因子不是 1.0
-                new_width = max(int(img.width * scale_factor), 1)
-                new_height = max(int(img.height * scale_factor), 1)
-                scaled_img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                tk_img = ImageTk.PhotoImage(scaled_img)
-            else:
-                tk_img = ImageTk.PhotoImage(img)
-            
-            app.canvas.itemconfig(item_id, image=tk_img)
-            app._image_references[item_id] = tk_img
-            
-            # 将逻辑坐标转换为屏幕坐标后再设置位置
-            from coordinate_system import logical_to_screen
-            app.canvas.update_idletasks()
-            canvas_width = max(app.canvas.winfo_width(), 1)
-            canvas_height = max(app.canvas.winfo_height(), 1)
-            
-            # x1, y1 是逻辑坐标，需要转换为屏幕坐标
-            screen_coords = logical_to_screen(
-                [x1, y1],
-                app.zoom_level,
-                app.pan_offset_x,
-                app.pan_offset_y,
-                canvas_width,
-                canvas_height
-            )
-            app.canvas.coords(item_id, screen_coords[0], screen_coords[1])
+            state['original_coords'] = [x1, y1]
+            state['matrix'] = placement_matrix(x1, y1)
+            show_raster(app, item_id, state)
             modified = True
 
     # Branch 2: Vector Objects
@@ -88,6 +68,37 @@ def fill_shape(app, event):
         app._capture_and_save_state()
 
 
+def _bucket_fill_raster(app, item_id, state, event, color):
+    """在光栅对象的位图上从点击处做扫描线洪水填充，返回是否有像素被填充"""
+    from PIL import ImageColor
+    pil_img = state.get('original_pil_image')
+    tk_img = app._image_references.get(item_id)
+    if pil_img is None or tk_img is None or not color:
+        return False
+    try:
+        rgba = ImageColor.getcolor(color, "RGBA")
+    except ValueError:
+        return False
+
+    # 点击位置 -> 位图像素坐标：屏幕 -> 逻辑 -> 源位图像素
+    inverse = invert_matrix(compose_matrix(app.viewport.matrix(), raster_matrix(state)))
+    if inverse is None:
+        return False
+    ia, ib, ic, id_, ie, if_ = inverse
+    px = int(math.floor(ia * event.x + ib * event.y + ic))
+    py = int(math.floor(id_ * event.x + ie * event.y + if_))
+    if not (0 <= px < pil_img.width and 0 <= py < pil_img.height):
+        return False
+
+    # 写时复制：位图可能与复制出的图层共享
+    img = pil_img.copy() if pil_img.mode == "RGBA" else pil_img.convert("RGBA")
+    if SimpleRasterization.flood_fill(img, px, py, rgba, getattr(app, 'fill_tolerance', 0)) is None:
+        return False
+    state['original_pil_image'] = img
+    show_raster(app, item_id, state)
+    return True
+
+
 def finalize_polygon(app):
     if len(app.polygon_points) < 3:
         messagebox.showwarning("警告", "多边形至少需要3个点")
@@ -95,21 +106,18 @@ def finalize_polygon(app):
         return
     
     from coordinate_system import screen_to_logical, logical_to_screen
-    app.canvas.update_idletasks()
-    canvas_width = max(app.canvas.winfo_width(), 1)
-    canvas_height = max(app.canvas.winfo_height(), 1)
-
-    logical_points = []
-    for x, y in app.polygon_points:
-        logical_xy = screen_to_logical(
-            [x, y],
-            app.zoom_level,
-            app.pan_offset_x,
-            app.pan_offset_y,
-            canvas_width,
-            canvas_height
-        )
-        logical_points.append((logical_xy[0], logical_xy[1]))
+    canvas_width, canvas_height = app.viewport.size
+
+    # 所有顶点拼成扁平坐标后一次转换
+    logical_coords_flat = screen_to_logical(
+        list(chain.from_iterable(app.polygon_points)),
+        app.zoom_level,
+        app.pan_offset_x,
+        app.pan_offset_y,
+        canvas_width,
+        canvas_height
+    )
+    logical_points = list(zip(logical_coords_flat[0::2], logical_coords_flat[1::2]))
 
     unique_tag, tags = f"shape_{time.time()}", (f"shape_{time.time()}", app.active_layer_id)
     
@@ -123,31 +131,13 @@ def finalize_polygon(app):
         img, (x1, y1) = create_rasterized_image(app, state)
 
         if img:
-            # 根据缩放级别调整显示尺寸
-            display_img = img
-            if app.zoom_level != 1.0:
-                new_w = max(int(img.width * app.zoom_level), 1)
-                new_h = max(int(img.height * app.zoom_level), 1)
-                display_img = img.resize((new_w, new_h), Image.Resampling.LANCZOS)
-            
-            tk_img = ImageTk.PhotoImage(display_img)
-            screen_xy = logical_to_screen(
-                [x1, y1],
-                app.zoom_level,
-                app.pan_offset_x,
-                app.pan_offset_y,
-                canvas_width,
-                canvas_height
-            )
-            img_id = app.canvas.create_image(screen_xy[0], screen_xy[1], image=tk_img, anchor='nw', tags=tags)
-            app._image_references[img_id] = tk_img
-            
-            # 将光栅化图像的位置转换为逻辑坐标
             state['original_coords'] = [x1, y1]
             state['original_pil_image'] = img
+            state['matrix'] = placement_matrix(x1, y1)
+            img_id = app.canvas.create_image(0, 0, anchor='nw', tags=tags)
+            show_raster(app, img_id, state)
             app.object_states[tags[0]] = state
     else:
-        logical_coords_flat = [c for p in logical_points for c in p]
         screen_coords = logical_to_screen(
             logical_coords_flat,
             app.zoom_level,
@@ -158,7 +148,7 @@ def finalize_polygon(app):
         )
         item_id = app.canvas.create_polygon(screen_coords, outline=app.current_color, width=app.brush_size,
                                    fill=app.current_fill_color, tags=tags)
-        app.object_states[tags[0]] = {'angle': 0, 'original_coords': logical_coords_flat}
+        app.object_states[tags[0]] = {'tool': 'polygon', 'angle': 0, 'original_coords': logical_coords_flat}
     
     app.reset_polygon_drawing()
     app._capture_and_save_state()
@@ -181,9 +171,7 @@ def create_text_object(app, x, y):
         
         # 将屏幕坐标转换为逻辑坐标后保存
         from coordinate_system import screen_to_logical
-        app.canvas.update_idletasks()
-        canvas_width = max(app.canvas.winfo_width(), 1)
-        canvas_height = max(app.canvas.winfo_height(), 1)
+        canvas_width, canvas_height = app.viewport.size
         
         logical_coords = screen_to_logical(
             [x, y],
@@ -7,7 +7,44 @@
 """
 
 import math
-from curves import binomial_coefficient, bernstein_polynomial
+from array import array
+from functools import lru_cache
+from operator import mul
+from curves import binomial_coefficient
+
+
+def _normalize_params(params):
+    """把分段数或参数序列统一为参数元组（便于作为缓存键）"""
+    if isinstance(params, int):
+        segments = max(1, params)
+        return tuple(i / segments for i in range(segments + 1))
+    return tuple(max(0, min(1, t)) for t in params)
+
+
+def _bernstein_row(degree, t, coeffs=None):
+    """单个参数上的全部Bernstein基函数值 [B_{0,n}(t), ..., B_{n,n}(t)]（不缓存）"""
+    if coeffs is None:
+        coeffs = [binomial_coefficient(degree, i) for i in range(degree + 1)]
+    s = 1 - t
+    return tuple(coeffs[i] * (t ** i) * (s ** (degree - i)) for i in range(degree + 1))
+
+
+@lru_cache(maxsize=128)
+def _bernstein_basis_matrix(degree, params):
+    """
+    Bernstein基矩阵（按轴缓存）
+    返回 len(params) x (degree+1) 的元组矩阵，第s行为 [B_{0,n}(t_s), ..., B_{n,n}(t_s)]
+    """
+    coeffs = [binomial_coefficient(degree, i) for i in range(degree + 1)]
+    return tuple(_bernstein_row(degree, t, coeffs) for t in params)
+
+
+def bernstein_basis_matrix(degree, params):
+    """
+    获取指定次数在一组参数上的Bernstein基矩阵
+    params: 分段数（int，均匀采样 0..1）或参数序列
+    """
+    return _bernstein_basis_matrix(degree, _normalize_params(params))
 
 
 class BezierSurface:
@@ -23,49 +60,63 @@ class BezierSurface:
         self.control_grid = control_grid
         self.m = len(control_grid) - 1  # u方向次数
         self.n = len(control_grid[0]) - 1  # v方向次数
+        # 按坐标分量拆分的控制点矩阵 P_x, P_y, P_z（(m+1) x (n+1)）
+        self._px = [[p[0] for p in row] for row in control_grid]
+        self._py = [[p[1] for p in row] for row in control_grid]
+        self._pz = [[p[2] for p in row] for row in control_grid]
     
     def evaluate(self, u, v):
         """
         计算曲面上参数为(u,v)的点
         S(u,v) = Σ Σ B_{i,m}(u) * B_{j,n}(v) * P_{i,j}
+        单点求值直接计算基函数，不占用网格基矩阵的缓存
         """
-        u = max(0, min(1, u))
-        v = max(0, min(1, v))
-        
-        x = 0
-        y = 0
-        z = 0
-        
-        for i in range(self.m + 1):
-            for j in range(self.n + 1):
-                # 计算Bernstein基函数的乘积
-                basis = (bernstein_polynomial(self.m, i, u) * 
-                        bernstein_polynomial(self.n, j, v))
-                
-                px, py, pz = self.control_grid[i][j]
-                x += basis * px
-                y += basis * py
-                z += basis * pz
+        bu = (_bernstein_row(self.m, max(0, min(1, u))),)
+        bv = (_bernstein_row(self.n, max(0, min(1, v))),)
+        xs, ys, zs = self._evaluate_basis(bu, bv)
+        return (xs[0], ys[0], zs[0])
+    
+    def evaluate_grid(self, u_params, v_params):
+        """
+        在整个(u,v)参数网格上批量求值，矩阵形式 S = Bu · P · Bvᵀ
+        u_params, v_params: 分段数（int）或参数序列
+        返回：(xs, ys, zs) 三个连续的 array('d')，按u方向行优先排列，
+             第 a*len(v)+b 个元素对应 (u_a, v_b)
+        """
+        bu = bernstein_basis_matrix(self.m, u_params)
+        bv = bernstein_basis_matrix(self.n, v_params)
+        return self._evaluate_basis(bu, bv)
+    
+    def _evaluate_basis(self, bu, bv):
+        """按给定的u、v方向基矩阵求值 S = Bu · P · Bvᵀ"""
+        xs = array('d')
+        ys = array('d')
+        zs = array('d')
+        columns = range(self.n + 1)
+        rows = range(self.m + 1)
+        for bu_row in bu:
+            # Q = Bu · P：先沿u方向收缩得到一行中间控制点
+            qx = [sum(bu_row[i] * self._px[i][j] for i in rows) for j in columns]
+            qy = [sum(bu_row[i] * self._py[i][j] for i in rows) for j in columns]
+            qz = [sum(bu_row[i] * self._pz[i][j] for i in rows) for j in columns]
+            # S = Q · Bvᵀ
+            xs.extend([sum(map(mul, bv_row, qx)) for bv_row in bv])
+            ys.extend([sum(map(mul, bv_row, qy)) for bv_row in bv])
+            zs.extend([sum(map(mul, bv_row, qz)) for bv_row in bv])
         
-        return (x, y, z)
+        return xs, ys, zs
     
     def generate_mesh(self, u_segments=20, v_segments=20):
         """
         生成曲面网格
         返回：(点列表, 面片列表)
         """
-        points = []
-        faces = []
-        
         # 生成网格点
-        for i in range(u_segments + 1):
-            u = i / u_segments
-            for j in range(v_segments + 1):
-                v = j / v_segments
-                point = self.evaluate(u, v)
-                points.append(point)
+        xs, ys, zs = self.evaluate_grid(u_segments, v_segments)
+        points = list(zip(xs, ys, zs))
         
         # 生成面片（四边形或三角形）
+        faces = []
         for i in range(u_segments):
             for j in range(v_segments):
                 # 当前四边形的四个顶点索引
@@ -85,32 +136,43 @@ class BezierSurface:
         获取等参曲线（用于网格线显示）
         返回：(u方向曲线列表, v方向曲线列表)
         """
-        u_curves = []
-        v_curves = []
+        u_fixed = [i / (num_u_curves - 1) for i in range(num_u_curves)]
+        v_fixed = [j / (num_v_curves - 1) for j in range(num_v_curves)]
+        count = segments_per_curve + 1
         
-        # u方向等参曲线（固定u，改变v）
-        for i in range(num_u_curves):
-            u = i / (num_u_curves - 1)
-            curve = []
-            for j in range(segments_per_curve + 1):
-                v = j / segments_per_curve
-                point = self.evaluate(u, v)
-                curve.append(point)
-            u_curves.append(curve)
+        # u方向等参曲线（固定u，改变v）：网格的每一行就是一条曲线
+        xs, ys, zs = self.evaluate_grid(u_fixed, segments_per_curve)
+        points = list(zip(xs, ys, zs))
+        u_curves = [points[a * count:(a + 1) * count] for a in range(num_u_curves)]
         
-        # v方向等参曲线（固定v，改变u）
-        for j in range(num_v_curves):
-            v = j / (num_v_curves - 1)
-            curve = []
-            for i in range(segments_per_curve + 1):
-                u = i / segments_per_curve
-                point = self.evaluate(u, v)
-                curve.append(point)
-            v_curves.append(curve)
+        # v方向等参曲线（固定v，改变u）：网格的每一列就是一条曲线
+        xs, ys, zs = self.evaluate_grid(segments_per_curve, v_fixed)
+        points = list(zip(xs, ys, zs))
+        v_curves = [points[b::num_v_curves] for b in range(num_v_curves)]
         
         return u_curves, v_curves
 
 
+@lru_cache(maxsize=32)
+def triangular_face_indices(segments):
+    """
+    三角域均匀采样网格的面片索引（纯算术索引，不依赖点字典）
+    第i行（u=i/segments）有 segments+1-i 个点，行首索引为 i*(segments+1) - i*(i-1)/2
+    """
+    def row_start(i):
+        return i * (segments + 1) - i * (i - 1) // 2
+    
+    faces = []
+    for i in range(segments):
+        base = row_start(i)
+        next_base = row_start(i + 1)
+        for j in range(segments - i):
+            faces.append((base + j, next_base + j, base + j + 1))
+            if j < segments - i - 1:
+                faces.append((next_base + j, next_base + j + 1, base + j + 1))
+    return tuple(faces)
+
+
 class TriangularBezierSurface:
     """三边Bézier曲面 - 基于三角域Bernstein基"""
     
@@ -127,6 +189,16 @@ class TriangularBezierSurface:
         self.control_points = control_points
         self.degree = degree
         self._validate_control_points()
+        # 预计算多项式系数表 n!/(i!j!k!)，求值时不再重复计算阶乘
+        n = degree
+        self._coefficients = {
+            (i, j, k): factorial(n) // (factorial(i) * factorial(j) * factorial(k))
+            for (i, j, k) in control_points
+        }
+        self._terms = [
+            (self._coefficients[(i, j, k)], i, j, k, px, py, pz)
+            for (i, j, k), (px, py, pz) in control_points.items()
+        ]
     
     def _validate_control_points(self):
         """验证控制点配置是否正确"""
@@ -140,9 +212,11 @@ class TriangularBezierSurface:
         B_{i,j,k}^n(u,v,w) = (n!/(i!j!k!)) * u^i * v^j * w^k
         其中 i+j+k=n, u+v+w=1
         """
-        n = self.degree
-        coeff = (factorial(n) // 
-                (factorial(i) * factorial(j) * factorial(k)))
+        coeff = self._coefficients.get((i, j, k))
+        if coeff is None:
+            n = self.degree
+            coeff = (factorial(n) // 
+                    (factorial(i) * factorial(j) * factorial(k)))
         return coeff * (u ** i) * (v ** j) * (w ** k)
     
     def evaluate(self, u, v):
@@ -165,54 +239,56 @@ class TriangularBezierSurface:
         y = 0
         z = 0
         
-        # 遍历所有控制点
-        for (i, j, k), (px, py, pz) in self.control_points.items():
-            basis = self._triangular_bernstein(i, j, k, u, v, w)
+        # 遍历所有控制点（系数已预计算）
+        for coeff, i, j, k, px, py, pz in self._terms:
+            basis = coeff * (u ** i) * (v ** j) * (w ** k)
             x += basis * px
             y += basis * py
             z += basis * pz
         
         return (x, y, z)
     
-    def generate_mesh(self, segments=20):
+    def evaluate_grid(self, segments=20):
         """
-        生成三角形曲面网格
+        在三角域的重心采样网格上批量求值
+        采样点为 (u, v, w) = (i, j, segments-i-j) / segments，按i行、j列顺序排列
+        由于三个重心坐标都是 k/segments 的形式，幂次可以共用一张 (segments+1) x (n+1) 的表
+        返回：(xs, ys, zs) 三个连续的 array('d')
         """
-        points = []
-        faces = []
-        
-        # 在三角形域内均匀采样
-        point_map = {}
-        idx = 0
+        n = self.degree
+        powers = [
+            [(a / segments) ** e for e in range(n + 1)]
+            for a in range(segments + 1)
+        ]
         
+        xs = array('d')
+        ys = array('d')
+        zs = array('d')
+        terms = self._terms
         for i in range(segments + 1):
-            u = i / segments
+            pu = powers[i]
             for j in range(segments + 1 - i):
-                v = j / segments
-                if u + v <= 1.0 + 1e-10:
-                    point = self.evaluate(u, v)
-                    points.append(point)
-                    point_map[(i, j)] = idx
-                    idx += 1
-        
-        # 生成三角形面片
-        for i in range(segments):
-            for j in range(segments - i):
-                # 当前三角形的三个顶点
-                if (i, j) in point_map and (i+1, j) in point_map and (i, j+1) in point_map:
-                    p0 = point_map[(i, j)]
-                    p1 = point_map[(i+1, j)]
-                    p2 = point_map[(i, j+1)]
-                    faces.append((p0, p1, p2))
-                
-                # 如果存在第二个三角形
-                if j < segments - i - 1:
-                    if (i+1, j) in point_map and (i+1, j+1) in point_map and (i, j+1) in point_map:
-                        p0 = point_map[(i+1, j)]
-                        p1 = point_map[(i+1, j+1)]
-                        p2 = point_map[(i, j+1)]
-                        faces.append((p0, p1, p2))
+                pv = powers[j]
+                pw = powers[segments - i - j]
+                x = y = z = 0.0
+                for coeff, a, b, c, px, py, pz in terms:
+                    basis = coeff * pu[a] * pv[b] * pw[c]
+                    x += basis * px
+                    y += basis * py
+                    z += basis * pz
+                xs.append(x)
+                ys.append(y)
+                zs.append(z)
         
+        return xs, ys, zs
+    
+    def generate_mesh(self, segments=20):
+        """
+        生成三角形曲面网格
+        """
+        xs, ys, zs = self.evaluate_grid(segments)
+        points = list(zip(xs, ys, zs))
+        faces = list(triangular_face_indices(segments))
         return points, faces
 
 
@@ -3,293 +3,423 @@
 """
 Transform operations (flip, rotate, etc.) for selected objects in DrawingApp.
 """
+import math
 from PIL import Image, ImageTk
 
 
-def flip_horizontal(app):
-    """水平翻转（左右翻转）所有选中对象"""
-    if not app.selection_group:
-        return
-    
-    bbox = _get_selection_bbox(app)
-    if not bbox:
-        return
-    
-    x1, y1, x2, y2 = bbox
-    center_x = (x1 + x2) / 2
-    
-    for tag in app.selection_group:
-        # 遍历这个 tag 对应的所有 item
-        item_ids = list(app.canvas.find_withtag(tag))
-        for item_id in item_ids:
-            item_type = app.canvas.type(item_id)
-            
-            if item_type == "image":
-                # 对于图片，使用 PIL 的翻转功能
-                _flip_image_horizontal(app, item_id)
-            else:
-                # 对于矢量图形，翻转坐标
-                _flip_coords_horizontal(app, item_id, center_x)
-        
-        # 翻转后更新逻辑坐标到 object_states
-        _update_logical_coords_after_transform(app, tag)
-    
-    app._draw_resize_handles()
-    app._capture_and_save_state()
+def flip_matrix(center_x, center_y, horizontal):
+    """以 (center_x, center_y) 为中心左右/上下镜像的 2x3 仿射矩阵"""
+    if horizontal:
+        return (-1.0, 0.0, 2 * center_x, 0.0, 1.0, 0.0)
+    return (1.0, 0.0, 0.0, 0.0, -1.0, 2 * center_y)
 
 
-def flip_vertical(app):
-    """竖直翻转（上下翻转）所有选中对象"""
-    if not app.selection_group:
-        return
-    
-    bbox = _get_selection_bbox(app)
-    if not bbox:
+def _apply_matrix_to_points(points, matrix):
+    """变换 [(x, y, ...), ...] 形式的点列表，保留 x、y 之后的分量（如曲面的 z）"""
+    from coordinate_system import matrix_transform_flat
+    if not points:
+        return points
+    flat = matrix_transform_flat([c for p in points for c in p[:2]], matrix)
+    return [(flat[2 * i], flat[2 * i + 1]) + tuple(p[2:]) for i, p in enumerate(points)]
+
+
+def apply_affine_to_state(state, matrix):
+    """
+    把 2x3 仿射矩阵直接作用在对象的逻辑几何上（不经过屏幕坐标往返）
+
+    光栅对象的 original_coords 是位图左上角锚点，由矩阵复合后另行更新。
+    """
+    from coordinate_system import matrix_transform_flat, pack_coords, unpack_coords
+
+    if state.get('original_coords') and state.get('original_pil_image') is None:
+        state['original_coords'] = matrix_transform_flat(state['original_coords'], matrix).tolist()
+
+    coords_map = state.get('original_coords_map')
+    if coords_map:
+        flat, offsets = pack_coords(list(coords_map.values()))
+        moved = unpack_coords(matrix_transform_flat(flat, matrix), offsets)
+        state['original_coords_map'] = dict(zip(coords_map.keys(), moved))
+
+    if state.get('line_segments'):
+        flat, offsets = pack_coords(state['line_segments'])
+        state['line_segments'] = unpack_coords(matrix_transform_flat(flat, matrix), offsets)
+
+    for key in ('control_points', 'points'):
+        if state.get(key):
+            state[key] = _apply_matrix_to_points(state[key], matrix)
+    if state.get('control_grid'):
+        state['control_grid'] = [_apply_matrix_to_points(row, matrix) for row in state['control_grid']]
+
+    if 'start_xy' in state and 'end_xy' in state:
+        (sx, sy), (ex, ey) = _apply_matrix_to_points([state['start_xy'], state['end_xy']], matrix)
+        state['start_xy'], state['end_xy'] = (sx, sy), (ex, ey)
+
+    # 镜像会反转旋转方向
+    a, b, _, d, e, _ = matrix
+    if a * e - b * d < 0 and state.get('angle'):
+        state['angle'] = -state['angle']
+
+
+# --- 光栅对象的仿射矩阵 ---
+# 光栅对象保存未变换的源位图 original_pil_image 与一个 2x3 矩阵 state['matrix']
+# （位图像素 -> 逻辑坐标）。旋转、缩放、翻转只复合矩阵，不改写位图；
+# 显示与导出时把矩阵与目标变换复合后做一次 Image.transform。
+
+def compose_matrix(outer, inner):
+    """矩阵复合：先应用 inner，再应用 outer"""
+    a1, b1, c1, d1, e1, f1 = outer
+    a2, b2, c2, d2, e2, f2 = inner
+    return (a1 * a2 + b1 * d2, a1 * b2 + b1 * e2, a1 * c2 + b1 * f2 + c1,
+            d1 * a2 + e1 * d2, d1 * b2 + e1 * e2, d1 * c2 + e1 * f2 + f1)
+
+
+def invert_matrix(matrix):
+    """2x3 仿射矩阵的逆；不可逆时返回 None"""
+    a, b, c, d, e, f = matrix
+    det = a * e - b * d
+    if abs(det) < 1e-12:
+        return None
+    ia, ib = e / det, -b / det
+    id_, ie = -d / det, a / det
+    return (ia, ib, -(ia * c + ib * f), id_, ie, -(id_ * c + ie * f))
+
+
+def placement_matrix(x, y, scale=1.0):
+    """位图左上角位于逻辑坐标 (x, y)、每像素 scale 个逻辑单位的矩阵"""
+    return (scale, 0.0, x, 0.0, scale, y)
+
+
+def raster_matrix(state):
+    """光栅对象的 位图像素 -> 逻辑坐标 矩阵"""
+    matrix = state.get('matrix')
+    if matrix:
+        return tuple(matrix)
+    # 旧状态：original_coords 为左上角锚点，位图每逻辑单位 zoom_ref 个像素
+    anchor = state.get('original_coords') or [0, 0]
+    zoom_ref = max(state.get('zoom_ref', 1.0), 1e-9)
+    return placement_matrix(anchor[0], anchor[1], 1.0 / zoom_ref)
+
+
+def raster_corners(state, matrix=None):
+    """源位图四角在逻辑坐标下的位置（扁平列表）"""
+    from coordinate_system import matrix_transform_flat
+    w, h = state['original_pil_image'].size
+    return matrix_transform_flat([0, 0, w, 0, 0, h, w, h], matrix or raster_matrix(state)).tolist()
+
+
+def update_raster_anchor(state):
+    """original_coords 记为变换后位图外框的左上角（供只读取锚点的旧代码使用）"""
+    corners = raster_corners(state)
+    state['original_coords'] = [min(corners[0::2]), min(corners[1::2])]
+
+
+def _raster_extent(size, matrix):
+    """位图经 matrix 变换后覆盖的整数像素范围 (left, top, width, height)"""
+    a, b, c, d, e, f = matrix
+    w, h = size
+    xs = (c, a * w + c, b * h + c, a * w + b * h + c)
+    ys = (f, d * w + f, e * h + f, d * w + e * h + f)
+    if b == 0 and d == 0:
+        # 仅缩放 + 平移：与直接 resize 的尺寸取整方式一致
+        return (int(round(min(xs))), int(round(min(ys))),
+                max(int(w * abs(a)), 1), max(int(h * abs(e)), 1))
+    left, top = math.floor(min(xs)), math.floor(min(ys))
+    return (left, top, max(int(math.ceil(max(xs))) - left, 1), max(int(math.ceil(max(ys))) - top, 1))
+
+
+def render_raster(image, matrix, resample=Image.Resampling.BICUBIC):
+    """
+    按 2x3 矩阵（位图像素 -> 目标坐标）对源位图做一次重采样
+
+    Returns:
+        (位图, left, top)：left/top 为结果左上角在目标坐标中的整数位置；矩阵退化时位图为 None
+    """
+    left, top, out_w, out_h = _raster_extent(image.size, matrix)
+    a, b, _, d, e, _ = matrix
+    if b == 0 and d == 0 and a > 0 and e > 0:
+        if (out_w, out_h) == image.size:
+            return image, left, top
+        return image.resize((out_w, out_h), Image.Resampling.LANCZOS), left, top
+
+    inverse = invert_matrix(matrix)
+    if inverse is None:
+        return None, left, top
+    # Image.transform 需要 输出像素 -> 源像素 的映射；输出像素 (X, Y) 对应目标点 (X + left, Y + top)
+    ia, ib, ic, id_, ie, if_ = inverse
+    data = (ia, ib, ia * left + ib * top + ic, id_, ie, id_ * left + ie * top + if_)
+    if image.mode != "RGBA":
+        image = image.convert("RGBA")
+    return image.transform((out_w, out_h), Image.Transform.AFFINE, data, resample=resample), left, top
+
+
+def render_raster_region(image, matrix, region, resample=Image.Resampling.BICUBIC):
+    """
+    与 render_raster 相同的重采样，但只生成落在 region (x1, y1, x2, y2) 内的部分（用于分块导出）
+
+    Returns:
+        (位图, left, top)；与 region 不相交或矩阵退化时位图为 None
+    """
+    left, top, out_w, out_h = _raster_extent(image.size, matrix)
+    x1, y1 = max(left, int(region[0])), max(top, int(region[1]))
+    x2, y2 = min(left + out_w, int(region[2])), min(top + out_h, int(region[3]))
+    if x1 >= x2 or y1 >= y2:
+        return None, x1, y1
+    a, b, _, d, e, _ = matrix
+    if b == 0 and d == 0 and a > 0 and e > 0:
+        # 与整张 resize 相同的像素对应关系，只取其中一块
+        w, h = image.size
+        box = ((x1 - left) * w / out_w, (y1 - top) * h / out_h, (x2 - left) * w / out_w, (y2 - top) * h / out_h)
+        return image.resize((x2 - x1, y2 - y1), Image.Resampling.LANCZOS, box=box), x1, y1
+
+    inverse = invert_matrix(matrix)
+    if inverse is None:
+        return None, x1, y1
+    ia, ib, ic, id_, ie, if_ = inverse
+    data = (ia, ib, ia * x1 + ib * y1 + ic, id_, ie, id_ * x1 + ie * y1 + if_)
+    if image.mode != "RGBA":
+        image = image.convert("RGBA")
+    return image.transform((x2 - x1, y2 - y1), Image.Transform.AFFINE, data, resample=resample), x1, y1
+
+
+def show_raster(app, item_id, state, photo=None):
+    """
+    按对象矩阵与当前视口显示光栅对象
+
+    线性部分与源位图未变时只移动图像项，不重新采样。
+    photo: 调用方已按新矩阵准备好的显示位图（如翻转时直接镜像的 PhotoImage）
+    """
+    pil_img = state.get('original_pil_image')
+    if pil_img is None:
         return
-    
-    x1, y1, x2, y2 = bbox
-    center_y = (y1 + y2) / 2
-    
-    for tag in app.selection_group:
-        # 遍历这个 tag 对应的所有 item
-        item_ids = list(app.canvas.find_withtag(tag))
-        for item_id in item_ids:
-            item_type = app.canvas.type(item_id)
-            
-            if item_type == "image":
-                # 对于图片，使用 PIL 的翻转功能
-                _flip_image_vertical(app, item_id)
-            else:
-                # 对于矢量图形，翻转坐标
-                _flip_coords_vertical(app, item_id, center_y)        
-        # 翻转后更新逻辑坐标到 object_states
-        _update_logical_coords_after_transform(app, tag)    
+    matrix = compose_matrix(app.viewport.matrix(), raster_matrix(state))
+    key = (id(pil_img),) + tuple(round(v, 9) for v in (matrix[0], matrix[1], matrix[3], matrix[4]))
+    current = app._image_references.get(item_id) if photo is None else photo
+    cached = app._raster_render_keys.get(item_id)
+
+    if photo is None and (current is None or cached != (id(current), key)):
+        img, left, top = render_raster(pil_img, matrix)
+        if img is None:
+            return
+        current = ImageTk.PhotoImage(img)
+    else:
+        left, top = _raster_extent(pil_img.size, matrix)[:2]
+    if app._image_references.get(item_id) is not current:
+        app.canvas.itemconfig(item_id, image=current)
+        app._image_references[item_id] = current
+    app._raster_render_keys[item_id] = (id(current), key)
+    app.canvas.coords(item_id, left, top)
+
+
+def _flip_photo(app, item_id, horizontal):
+    """用 Tk 的负 subsample 直接镜像当前显示的 PhotoImage，无需重新缩放"""
+    photo = app._image_references.get(item_id)
+    if photo is None:
+        return None
+    flipped = ImageTk.PhotoImage("RGBA", (photo.width(), photo.height()))
+    step_x, step_y = (-1, 1) if horizontal else (1, -1)
+    app.canvas.tk.call(str(flipped), 'copy', str(photo), '-subsample', step_x, step_y)
+    return flipped
+
+
+def transform_selection(app, matrix, flip=None):
+    """
+    对选中对象应用逻辑空间的仿射变换，随后只同步这些对象到屏幕
+
+    Args:
+        matrix: 逻辑坐标下的 2x3 仿射矩阵
+        flip: 'horizontal' / 'vertical' 时显示位图直接镜像；为 None 时按新矩阵重新采样
+    """
+    from coordinate_system import sync_objects_to_screen
+    tags = [tag for tag in app.selection_group if tag in app.object_states]
+    vector_tags = []
+    for tag in tags:
+        state = app.object_states[tag]
+        apply_affine_to_state(state, matrix)
+        if state.get('original_pil_image') is None:
+            vector_tags.append(tag)
+            continue
+        # 源位图保持不变，只复合矩阵
+        state['matrix'] = compose_matrix(matrix, raster_matrix(state))
+        update_raster_anchor(state)
+        for item_id in app.canvas.find_withtag(tag):
+            if app.canvas.type(item_id) != 'image':
+                continue
+            photo = _flip_photo(app, item_id, flip == 'horizontal') if flip else None
+            show_raster(app, item_id, state, photo)
+
+    sync_objects_to_screen(app, vector_tags)
+    app.selection_group.invalidate()
     app._draw_resize_handles()
     app._capture_and_save_state()
 
 
-def _get_selection_bbox(app):
-    """获取选中对象的边界框"""
-    if not app.selection_group:
+def _selection_center(app):
+    bbox = app.selection_group.logical_bbox() if app.selection_group else None
+    if not bbox:
         return None
-    min_x, min_y, max_x, max_y = float('inf'), float('inf'), float('-inf'), float('-inf')
-    has_bbox = False
-    for tag in app.selection_group:
-        bbox = app.canvas.bbox(tag)
-        if bbox:
-            has_bbox = True
-            min_x = min(min_x, bbox[0])
-            min_y = min(min_y, bbox[1])
-            max_x = max(max_x, bbox[2])
-            max_y = max(max_y, bbox[3])
-    return (min_x, min_y, max_x, max_y) if has_bbox else None
-
-
-def _flip_coords_horizontal(app, item_id, center_x):
-    """水平翻转矢量图形的坐标"""
-    coords = app.canvas.coords(item_id)
-    if not coords:
+    return (bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2
+
+
+def flip_horizontal(app):
+    """水平翻转（左右翻转）所有选中对象"""
+    center = _selection_center(app)
+    if center is None:
         return
-    
-    # 翻转所有 x 坐标：新_x = center_x - (旧_x - center_x) = 2*center_x - 旧_x
-    new_coords = []
-    for i, coord in enumerate(coords):
-        if i % 2 == 0:  # x 坐标
-            new_coords.append(2 * center_x - coord)
-        else:  # y 坐标
-            new_coords.append(coord)
-    
-    app.canvas.coords(item_id, *new_coords)
-
-
-def _flip_coords_vertical(app, item_id, center_y):
-    """竖直翻转矢量图形的坐标"""
-    coords = app.canvas.coords(item_id)
-    if not coords:
+    transform_selection(app, flip_matrix(center[0], center[1], True), flip='horizontal')
+
+
+def flip_vertical(app):
+    """竖直翻转（上下翻转）所有选中对象"""
+    center = _selection_center(app)
+    if center is None:
         return
-    
-    # 翻转所有 y 坐标：新_y = center_y - (旧_y - center_y) = 2*center_y - 旧_y
-    new_coords = []
-    for i, coord in enumerate(coords):
-        if i % 2 == 0:  # x 坐标
-            new_coords.append(coord)
-        else:  # y 坐标
-            new_coords.append(2 * center_y - coord)
-    
-    app.canvas.coords(item_id, *new_coords)
-
-
-def _flip_image_horizontal(app, item_id):
-    """水平翻转图片对象"""
-    # 获取图片当前的坐标和大小
-    coords = app.canvas.coords(item_id)
-    if not coords:
+    transform_selection(app, flip_matrix(center[0], center[1], False), flip='vertical')
+
+
+def rotate_selection_90(app, clockwise=True):
+    """将选中对象绕选区中心旋转 90 度（屏幕坐标 y 轴向下，顺时针为正角度）"""
+    center = _selection_center(app)
+    if center is None:
         return
-    
-    # 从 canvas 直接获取当前显示的图像
-    try:
-        # 尝试从 _image_references 中获取原始 PIL 图像
-        # 由于 PhotoImage 是 Tkinter 对象，我们需要找到原始的 PIL 图像
-        # 通过遍历 object_states 来找到对应的状态
-        for tag in app.canvas.gettags(item_id):
-            if tag.startswith(("stroke_", "shape_")) and tag in app.object_states:
-                state = app.object_states[tag]
-                if 'original_pil_image' in state:
-                    original_img = state['original_pil_image']
-                    flipped_img = original_img.transpose(Image.FLIP_LEFT_RIGHT)
-                    state['original_pil_image'] = flipped_img
-                    
-                    # 应用缩放显示
-                    display_img = flipped_img
-                    if app.zoom_level != 1.0:
-                        new_w = max(int(flipped_img.width * app.zoom_level), 1)
-                        new_h = max(int(flipped_img.height * app.zoom_level), 1)
-                        display_img = flipped_img.resize((new_w, new_h), Image.Resampling.LANCZOS)
-                    
-                    tk_img = ImageTk.PhotoImage(display_img)
-                    app.canvas.itemconfig(item_id, image=tk_img)
-                    
-                    if item_id in app._image_references:
-                        del app._image_references[item_id]
-                    app._image_references[item_id] = tk_img
-                    return
-    except Exception:
-        pass
-
-
-def _flip_image_vertical(app, item_id):
-    """竖直翻转图片对象"""
-    coords = app.canvas.coords(item_id)
-    if not coords:
+    angle = math.pi / 2 if clockwise else -math.pi / 2
+    # 取整避免 cos(pi/2) 的浮点残差在多次旋转后累积
+    matrix = tuple(round(v) if abs(v - round(v)) < 1e-12 else v
+                   for v in rotate_about_matrix(center[0], center[1], angle))
+    transform_selection(app, matrix)
+
+
+def translate_object_state(state, dx, dy):
+    """
+    将对象的逻辑状态整体平移 (dx, dy)（逻辑坐标单位）
+
+    覆盖所有记录位置的字段：original_coords、original_coords_map、
+    control_points、control_grid、start_xy/end_xy、points、line_segments，以及光栅对象的 matrix。
+    """
+    if not dx and not dy:
         return
-    
-    try:
-        for tag in app.canvas.gettags(item_id):
-            if tag.startswith(("stroke_", "shape_")) and tag in app.object_states:
-                state = app.object_states[tag]
-                if 'original_pil_image' in state:
-                    original_img = state['original_pil_image']
-                    flipped_img = original_img.transpose(Image.FLIP_TOP_BOTTOM)
-                    state['original_pil_image'] = flipped_img
-                    
-                    # 翻转 points 数据（多边形）
-                    if 'points' in state and state['points']:
-                        if 'start_xy' in state and 'end_xy' in state:
-                            sx, sy = state['start_xy']
-                            ex, ey = state['end_xy']
-                            center_y = (sy + ey) / 2
-                            flipped_points = [(px, 2 * center_y - py) for px, py in state['points']]
-                            state['points'] = flipped_points
-                    
-                    # 翻转 line_segments 数据（画笔）
-                    if 'line_segments' in state and state['line_segments']:
-                        if 'start_xy' in state and 'end_xy' in state:
-                            sx, sy = state['start_xy']
-                            ex, ey = state['end_xy']
-                            center_y = (sy + ey) / 2
-                            flipped_segments = [
-                                [seg[0], 2 * center_y - seg[1], seg[2], 2 * center_y - seg[3]]
-                                for seg in state['line_segments']
-                            ]
-                            state['line_segments'] = flipped_segments
-                    
-                    # 应用缩放显示
-                    display_img = flipped_img
-                    if app.zoom_level != 1.0:
-                        new_w = max(int(flipped_img.width * app.zoom_level), 1)
-                        new_h = max(int(flipped_img.height * app.zoom_level), 1)
-                        display_img = flipped_img.resize((new_w, new_h), Image.Resampling.LANCZOS)
-                    
-                    tk_img = ImageTk.PhotoImage(display_img)
-                    app.canvas.itemconfig(item_id, image=tk_img)
-                    
-                    if item_id in app._image_references:
-                        del app._image_references[item_id]
-                    app._image_references[item_id] = tk_img
-                    return
-    except Exception:
-        pass
-
-
-def _update_logical_coords_after_transform(app, tag):
-    """翻转或变换后，将屏幕坐标转换回逻辑坐标并更新到 object_states"""
-    if tag not in app.object_states:
+    from coordinate_system import affine_transform_flat, pack_coords, unpack_coords
+
+    if state.get('original_coords'):
+        state['original_coords'] = affine_transform_flat(state['original_coords'], 1.0, dx, dy).tolist()
+
+    coords_map = state.get('original_coords_map')
+    if coords_map:
+        # 笔触的全部分段拼接后一次平移
+        flat, offsets = pack_coords(list(coords_map.values()))
+        moved = unpack_coords(affine_transform_flat(flat, 1.0, dx, dy), offsets)
+        state['original_coords_map'] = dict(zip(coords_map.keys(), moved))
+
+    if state.get('line_segments'):
+        flat, offsets = pack_coords(state['line_segments'])
+        state['line_segments'] = unpack_coords(affine_transform_flat(flat, 1.0, dx, dy), offsets)
+
+    if 'control_points' in state:
+        state['control_points'] = [(p[0] + dx, p[1] + dy) for p in state['control_points']]
+    if 'points' in state:
+        state['points'] = [(p[0] + dx, p[1] + dy) for p in state['points']]
+    if 'control_grid' in state:
+        state['control_grid'] = [
+            [(p[0] + dx, p[1] + dy, p[2]) for p in row]
+            for row in state['control_grid']
+        ]
+
+    if 'start_xy' in state:
+        state['start_xy'] = (state['start_xy'][0] + dx, state['start_xy'][1] + dy)
+    if 'end_xy' in state:
+        state['end_xy'] = (state['end_xy'][0] + dx, state['end_xy'][1] + dy)
+    if state.get('matrix'):
+        a, b, c, d, e, f = state['matrix']
+        state['matrix'] = (a, b, c + dx, d, e, f + dy)
+
+
+# --- 交互变换代理预览 ---
+# 旋转/缩放拖拽时不再逐帧从源位图重新采样，
+# 而是对拖拽开始时的显示位图做一次 BILINEAR 仿射变换作为预览；
+# 松开鼠标时再按最终矩阵从源位图采样一次。
+
+def scale_about_matrix(px, py, sx, sy, angle_rad=0.0):
+    """以 (px, py) 为中心、沿旋转 angle_rad 后的坐标轴缩放 (sx, sy) 的 2x3 仿射矩阵"""
+    c, s = math.cos(angle_rad), math.sin(angle_rad)
+    # R(θ) · S · R(-θ)
+    a = c * c * sx + s * s * sy
+    b = c * s * (sx - sy)
+    e = s * s * sx + c * c * sy
+    return (a, b, px - a * px - b * py,
+            b, e, py - b * px - e * py)
+
+
+def rotate_about_matrix(px, py, angle_rad):
+    """以 (px, py) 为中心旋转 angle_rad 的 2x3 仿射矩阵（与 utils.rotate_point 同向）"""
+    c, s = math.cos(angle_rad), math.sin(angle_rad)
+    return (c, -s, px - c * px + s * py,
+            s, c, py - s * px - c * py)
+
+
+def _proxy_source(app, tag, item_id):
+    """拖拽开始时的显示位图及其屏幕位置（每次拖拽只准备一次）"""
+    source = app._proxy_sources.get(tag)
+    if source is None:
+        state = app.original_group_states.get(tag) or app.object_states.get(tag, {})
+        pil_img = state.get('original_pil_image')
+        if pil_img is None:
+            return None
+        matrix = compose_matrix(app.viewport.matrix(), raster_matrix(state))
+        display, left, top = render_raster(pil_img, matrix, Image.Resampling.BILINEAR)
+        if display is None:
+            return None
+        if display.mode != "RGBA":
+            display = display.convert("RGBA")
+        source = app._proxy_sources[tag] = (display, left, top)
+    return source
+
+
+def show_proxy_transform(app, tag, item_id, matrix, final_state):
+    """
+    用仿射变换后的缓存位图预览对象，并记录松开时要完整光栅化的最终状态
+
+    Args:
+        matrix: 屏幕坐标下的 2x3 正向仿射矩阵 (a, b, c, d, e, f)
+        final_state: 松开时用于显示的最终状态（含复合后的 matrix）
+    """
+    app._proxy_pending[tag] = (item_id, final_state)
+    source = _proxy_source(app, tag, item_id)
+    if source is None:
         return
-    
-    from coordinate_system import screen_to_logical
-    app.canvas.update_idletasks()
-    canvas_width = max(app.canvas.winfo_width(), 1)
-    canvas_height = max(app.canvas.winfo_height(), 1)
-    
-    state = app.object_states[tag]
-    item_ids = list(app.canvas.find_withtag(tag))
-    if not item_ids:
+    image, src_x, src_y = source
+    a, b, c, d, e, f = matrix
+    w, h = image.size
+
+    # 源位图四角变换后的包围盒即预览位图的范围
+    corners = [(src_x, src_y), (src_x + w, src_y), (src_x, src_y + h), (src_x + w, src_y + h)]
+    xs = [a * x + b * y + c for x, y in corners]
+    ys = [d * x + e * y + f for x, y in corners]
+    left, top = math.floor(min(xs)), math.floor(min(ys))
+    out_w = max(int(math.ceil(max(xs))) - left, 1)
+    out_h = max(int(math.ceil(max(ys))) - top, 1)
+
+    det = a * e - b * d
+    if abs(det) < 1e-9:
         return
-    item_id = item_ids[0]
-    item_type = app.canvas.type(item_id)
-
-    # 处理单个对象的坐标
-    if 'original_coords' in state and item_type != 'image':
-        screen_coords = app.canvas.coords(item_id)
-        logical_coords = screen_to_logical(
-            screen_coords,
-            app.zoom_level,
-            app.pan_offset_x,
-            app.pan_offset_y,
-            canvas_width,
-            canvas_height
-        )
-        state['original_coords'] = logical_coords
-
-    # 处理多个对象的坐标映射（如笔触）
-    elif 'original_coords_map' in state and item_type != 'image':
-        for part_id in state['original_coords_map'].keys():
-            screen_coords = app.canvas.coords(part_id)
-            logical_coords = screen_to_logical(
-                screen_coords,
-                app.zoom_level,
-                app.pan_offset_x,
-                app.pan_offset_y,
-                canvas_width,
-                canvas_height
-            )
-            state['original_coords_map'][part_id] = logical_coords
-
-    # 处理光栅对象的逻辑坐标
-    elif item_type == 'image':
-        screen_xy = app.canvas.coords(item_id)
-        if not screen_xy:
-            return
+    # Image.transform 需要输出像素 -> 源像素的逆映射
+    ia, ib = e / det, -b / det
+    id_, ie = -d / det, a / det
+    ic = -(ia * c + ib * f)
+    if_ = -(id_ * c + ie * f)
+    # 输出像素 (X, Y) 对应屏幕点 (X + left, Y + top)，源像素坐标需减去 (src_x, src_y)
+    data = (ia, ib, ia * left + ib * top + ic - src_x,
+            id_, ie, id_ * left + ie * top + if_ - src_y)
+    proxy = image.transform((out_w, out_h), Image.Transform.AFFINE, data, resample=Image.Resampling.BILINEAR)
+
+    tk_img = ImageTk.PhotoImage(proxy)
+    app.canvas.itemconfig(item_id, image=tk_img)
+    app._image_references[item_id] = tk_img
+    app.canvas.coords(item_id, left, top)
+
 
-        img_w, img_h = 0, 0
-        try:
-            pil_img = state.get('original_pil_image')
-            if pil_img:
-                img_w, img_h = pil_img.size
-        except Exception:
-            img_w, img_h = 0, 0
-
-        if img_w == 0 or img_h == 0:
-            try:
-                bbox = app.canvas.bbox(item_id)
-                if bbox:
-                    img_w = bbox[2] - bbox[0]
-                    img_h = bbox[3] - bbox[1]
-            except Exception:
-                return
-
-        screen_bbox = [screen_xy[0], screen_xy[1], screen_xy[0] + img_w, screen_xy[1] + img_h]
-        logical_bbox = screen_to_logical(
-            screen_bbox,
-            app.zoom_level,
-            app.pan_offset_x,
-            app.pan_offset_y,
-            canvas_width,
-            canvas_height
-        )
-
-        if len(logical_bbox) >= 4:
-            lx1, ly1, lx2, ly2 = logical_bbox
-            state['start_xy'] = (lx1, ly1)
-            state['end_xy'] = (lx2, ly2)
-            state['original_coords'] = [lx1, ly1, lx2, ly2]
+def finish_proxy_transforms(app):
+    """松开鼠标：对预览过的对象按最终矩阵从源位图重新采样一次"""
+    pending = app._proxy_pending
+    app._proxy_pending = {}
+    app._proxy_sources.clear()
+    for tag, (item_id, final_state) in pending.items():
+        show_raster(app, item_id, final_state)
@@ -1,6 +1,7 @@
 import customtkinter as ctk
 from tkinter import Canvas, BOTH, YES
 from tooltip import Tooltip
+from coordinate_system import Viewport
 
 
 def setup_ui(app):
@@ -81,9 +82,14 @@ def setup_ui(app):
     app.canvas_bg_color = getattr(app, "canvas_bg_color", "#333333") # 這是画布区域的颜色
     app.viewport_bg_color = "#202020" # 这是画布外的颜色
     
-    app.canvas = Canvas(app.canvas_border_frame, bg=app.viewport_bg_color, highlightthickness=0)
+    # confine=False：拖动画布时 scan_dragto 可以不受 scrollregion 限制地平移视图
+    app.canvas = Canvas(app.canvas_border_frame, bg=app.viewport_bg_color, highlightthickness=0, confine=False)
     app.canvas.pack(fill=BOTH, expand=YES)
 
+    # 视口缓存画布尺寸，坐标转换不再需要 update_idletasks()
+    app.viewport = Viewport(app)
+    app.canvas.bind("<Configure>", app.viewport.on_configure)
+
     app.canvas.bind("<B1-Motion>", app.draw)
     app.canvas.bind("<ButtonPress-1>", app.start_drawing)
     app.canvas.bind("<ButtonRelease-1>", app.stop_drawing)
@@ -127,6 +133,10 @@ def setup_ui(app):
     # 重置缩放按钮
     ctk.CTkButton(app.zoom_toolbar, text="重置", width=60, command=app.reset_zoom).pack(side="left", padx=2)
 
+    # 变换拖拽的单帧耗时读数
+    app.frame_time_label = ctk.CTkLabel(app.zoom_toolbar, text="", width=70)
+    app.frame_time_label.pack(side="left", padx=5)
+
     # --- 右侧面板Tab视图 ---
     app.right_panel_container = ctk.CTkFrame(app, width=250, corner_radius=0)
     app.right_panel_container.grid(row=0, column=2, sticky="ns")
@@ -175,6 +185,14 @@ def setup_ui(app):
         pass
     app.brush_section.pack(fill="x", padx=10)
 
+    # 油漆桶容差模块
+    app.fill_section = ctk.CTkFrame(app.options_panel, fg_color="transparent")
+    app.fill_tolerance_label = ctk.CTkLabel(app.fill_section, text=f"填充容差: {getattr(app, 'fill_tolerance', 0)}", font=ui_font)
+    app.fill_tolerance_label.pack(pady=(20, 0))
+    app.fill_tolerance_slider = ctk.CTkSlider(app.fill_section, from_=0, to=128, command=app.set_fill_tolerance)
+    app.fill_tolerance_slider.set(getattr(app, "fill_tolerance", 0))
+    app.fill_tolerance_slider.pack(pady=10, padx=20, fill="x")
+
     # 橡皮擦模式模块
     app.eraser_section = ctk.CTkFrame(app.options_panel, fg_color="transparent")
     app.eraser_mode_label = ctk.CTkLabel(app.eraser_section, text="橡皮擦模式", font=ui_font)
@@ -320,11 +338,17 @@ def setup_ui(app):
     app.move_up_btn.grid(row=0, column=3, padx=2, pady=5)
     app.move_down_btn = ctk.CTkButton(layer_controls_frame, text="▼", command=app.move_layer_down, font=btn_font, width=40)
     app.move_down_btn.grid(row=0, column=4, padx=2, pady=5)
+    app.flatten_layer_btn = ctk.CTkButton(layer_controls_frame, text="展平", command=app.flatten_selected_layer, font=btn_font, width=40)
+    app.flatten_layer_btn.grid(row=1, column=0, columnspan=2, padx=2, pady=(0, 5), sticky="ew")
+    app.merge_down_btn = ctk.CTkButton(layer_controls_frame, text="向下合并", command=app.merge_layer_down, font=btn_font, width=40)
+    app.merge_down_btn.grid(row=1, column=2, columnspan=3, padx=2, pady=(0, 5), sticky="ew")
     Tooltip(app.add_layer_btn, "新建图层", delay=3000)
     Tooltip(app.dup_layer_btn, "复制图层", delay=3000)
     Tooltip(app.del_layer_btn, "删除图层", delay=3000)
     Tooltip(app.move_up_btn, "上移图层", delay=3000)
     Tooltip(app.move_down_btn, "下移图层", delay=3000)
+    Tooltip(app.flatten_layer_btn, "将当前图层的所有对象烘焙为一张位图", delay=3000)
+    Tooltip(app.merge_down_btn, "将当前图层与下方图层合并为一张位图", delay=3000)
 
     # 绑定快捷键等初始化操作应由 app 本身执行。
     return
\ No newline at end of file